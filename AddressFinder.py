@@ -1,57 +1,91 @@
 import openpyxl
-from geopy.geocoders import Nominatim
 from geopy.distance import distance
-from time import sleep
+from geo_client import DEFAULT_CONCURRENCY, NOMINATIM_RATE, GeoClient, default_client
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import random
 import math
 
-def FindAddresses(centerPoint: tuple, radius: float, numAddresses: int):
+def RandomPoint(centerPoint: tuple, radius: float, rng: random.Random):
+    """
+    Draw a point uniformly within a given radius of a center point.
+
+    param centerPoint: A tuple containing the latitude and longitude of the center point.
+    param radius: The radius in kilometers.
+    param rng: The random generator.
+    """
+    # Generate a random distance and bearing
+    bearing = rng.uniform(0, 360)
+    # Ensure uniform distribution within the circle
+    rand_distance = radius * math.sqrt(rng.uniform(0, 1))
+    destination = distance(kilometers=rand_distance).destination(centerPoint, bearing)
+    return destination.latitude, destination.longitude
+
+def FindAddresses(centerPoint: tuple, radius: float, numAddresses: int, client=None, seed=None,
+                  concurrency: int = DEFAULT_CONCURRENCY):
     """
     Find addresses within a given radius of a center point.
 
+    Lookups go through the shared geo client: failed requests are retried
+    with backoff, answers are cached (a run with the same seed makes no
+    network call) and requests stay under the client's rate. Up to
+    `concurrency` lookups are in flight at once so their latencies overlap;
+    results are used in the order the points were drawn, so the addresses
+    found do not depend on the concurrency.
+
     param centerPoint: A tuple containing the latitude and longitude of the center point.
     param radius: The radius in kilometers within which to find addresses.
     param numAddresses: The number of addresses to find.
+    param client: The `geo_client.GeoClient` to reverse-geocode with, the shared one by default.
+    param seed: The random seed of the generated points.
+    param concurrency: The number of lookups in flight at once.
     """
     print("Finding addresses...")
-    geolocator = Nominatim(user_agent="address_finder")
+    client = client or default_client()
+    rng = random.Random(seed)
     addresses = []
     attempts = 0
     max_attempts = numAddresses * 10  # To prevent infinite loops
+    pending = deque()
 
-    while len(addresses) < numAddresses and attempts < max_attempts:
-        attempts += 1
-        try:
-            # Generate a random distance and bearing
-            bearing = random.uniform(0, 360)
-            # Ensure uniform distribution within the circle
-            rand_distance = radius * math.sqrt(random.uniform(0, 1))
-            destination = distance(kilometers=rand_distance).destination(centerPoint, bearing)
-            new_lat, new_lon = destination.latitude, destination.longitude
-
-            # Reverse geocode to find the nearest address
-            location = geolocator.reverse((new_lat, new_lon), exactly_one=True, timeout=10)
-            if location and location.address:
-                address_parts = location.address.split(',')
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while len(addresses) < numAddresses and (pending or attempts < max_attempts):
+            # Keep lookups in flight, no more than the addresses still missing
+            while attempts < max_attempts and len(pending) < min(concurrency, numAddresses - len(addresses)):
+                attempts += 1
+                point = RandomPoint(centerPoint, radius, rng)
+                pending.append((point, executor.submit(client.reverse, *point)))
+
+            (new_lat, new_lon), lookup = pending.popleft()
+            try:
+                # Reverse geocode to find the nearest address
+                location = lookup.result()
+            except Exception as e:
+                # The client already retried with backoff, move on to another point
+                print(f"\nError retrieving address for generated point ({new_lat}, {new_lon}): {e}")
+                continue
+            if location and location.get('display_name'):
+                address_parts = location['display_name'].split(',')
                 street_address = ', '.join(address_parts[:2]) if len(address_parts) > 1 else address_parts[0]
 
                 # Get the accurate GPS coordinates of the address
-                address_lat = location.latitude
-                address_lon = location.longitude
+                address_lat = float(location['lat'])
+                address_lon = float(location['lon'])
 
                 # Check for duplicate addresses
                 if street_address not in [a[1] for a in addresses]:
                     google_maps_url = f"https://www.google.com/maps/search/?api=1&query={address_lat},{address_lon}"
                     addresses.append((len(addresses) + 1, street_address, address_lat, address_lon, google_maps_url))
                     print(f"Found {len(addresses)}/{numAddresses} addresses...", end="\r")
-        except Exception as e:
-            print(f"\nError retrieving address for generated point ({new_lat}, {new_lon}): {e}")
-            sleep(1)  # Wait for a second before retrying
+
+        for _, lookup in pending:
+            lookup.cancel()
 
     if len(addresses) < numAddresses:
         print(f"\nOnly found {len(addresses)} addresses out of the requested {numAddresses}.")
 
     print()
+    print(f"Geocoding: {client.stats()}")
     return addresses
 
 def WriteToExcel(addresses: list, filename: str):
@@ -77,8 +111,11 @@ def WriteToExcel(addresses: list, filename: str):
         input("Press Enter to retry...")
         WriteToExcel(addresses, filename)
 
-def main(centerPoint: tuple, radius: float, numAddresses: int, filename: str = "addresses_found.xlsx"):
-    addresses = FindAddresses(centerPoint, radius, numAddresses)
+def main(centerPoint: tuple, radius: float, numAddresses: int, filename: str = "addresses_found.xlsx",
+         concurrency: int = DEFAULT_CONCURRENCY, rate: float = NOMINATIM_RATE):
+    # The public Nominatim allows 1 request per second, a self-hosted one (NOMINATIM_URL) much more
+    client = GeoClient(rate=rate, pool_size=concurrency)
+    addresses = FindAddresses(centerPoint, radius, numAddresses, client, concurrency=concurrency)
     if addresses:
         WriteToExcel(addresses, filename)
     else:
@@ -0,0 +1,929 @@
+"""
+Offline benchmarks for the routing pipeline.
+
+Run one benchmark by name, e.g.:
+
+    python benchmark.py ortools-transit
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from csr_graph import CSRGraph
+from geo import haversine_matrix
+from large_instance import solve_hierarchical
+from manifest import load_manifest
+from matrix_engine import sparse_travel_times
+from vrp_solver import integer_matrix, solve_ortools
+
+DEPOT = (49.377805, 1.115311)
+ORIGIN_CITY = (49.443512, 1.098445)  # Center of the road graph, see project.py
+GRAPH_RADIUS_KM = 10
+MANIFEST = 'addresses_found.xlsx'
+# Dependencies that must only be imported by the pipeline stage using them
+HEAVY_MODULES = ('osmnx', 'networkx', 'folium', 'ortools', 'sklearn', 'scipy', 'tsp_solver', 'matplotlib', 'pandas')
+
+
+def proxy_travel_times(coords, speed_kmh=30.0, detour=1.3):
+    """
+    Estimate a travel-time matrix (s) from great-circle distances, used as an offline stand-in for road travel times.
+
+    param coords: Array of (latitude, longitude), depot first.
+    param speed_kmh: The average driving speed.
+    param detour: The ratio between road and great-circle distance.
+    """
+    return haversine_matrix(coords) * detour / (speed_kmh / 3.6)
+
+
+def grid_graph(rows, cols, spacing_m=100.0, origin=DEPOT, arterial_every=10):
+    """
+    Build a synthetic Manhattan road grid as a `CSRGraph`, used to benchmark offline at any size.
+
+    Every `arterial_every`-th street is an arterial at 50 km/h, the others are
+    residential streets at 30 km/h; all streets are two-way.
+
+    param rows: The number of nodes north-south.
+    param cols: The number of nodes east-west.
+    param spacing_m: The distance between adjacent intersections.
+    param origin: The (latitude, longitude) of the south-west corner.
+    param arterial_every: The spacing of the arterial streets, in blocks.
+    """
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    lat = origin[0] + np.arange(rows) * spacing_m / 111_320.0
+    lon = origin[1] + np.arange(cols) * spacing_m / (111_320.0 * np.cos(np.radians(origin[0])))
+
+    east = (ids[:, :-1].ravel(), ids[:, 1:].ravel(), np.repeat(np.arange(rows) % arterial_every == 0, cols - 1))
+    north = (ids[:-1, :].ravel(), ids[1:, :].ravel(), np.tile(np.arange(cols) % arterial_every == 0, rows - 1))
+    u = np.concatenate([east[0], east[1], north[0], north[1]])
+    v = np.concatenate([east[1], east[0], north[1], north[0]])
+    arterial = np.concatenate([east[2], east[2], north[2], north[2]])
+    length = np.full(len(u), spacing_m)
+    speed = np.where(arterial, 50.0, 30.0) / 3.6
+    return CSRGraph(ids.ravel(), np.tile(lon, rows), np.repeat(lat, cols), u, v, length / speed, length)
+
+
+def planar_graph(num_nodes, seed=0, origin=DEPOT, radius_m=5000.0, arterial_share=0.2):
+    """
+    Build a synthetic random-planar road network as a `CSRGraph`: the Delaunay triangulation of random intersections.
+
+    A share of the streets are arterials at 50 km/h, the others residential
+    streets at 30 km/h; all streets are two-way and the network is connected.
+
+    param num_nodes: The number of intersections.
+    param seed: The random seed.
+    param origin: The (latitude, longitude) of the center of the network.
+    param radius_m: The half-width of the square the intersections are drawn in.
+    param arterial_share: The share of arterial streets.
+    """
+    from scipy.spatial import Delaunay
+
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-radius_m, radius_m, (num_nodes, 2))
+    triangles = Delaunay(xy).simplices
+    edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [0, 2]]]), axis=1)
+    edges = np.unique(edges, axis=0)
+
+    lat = origin[0] + xy[:, 1] / 111_320.0
+    lon = origin[1] + xy[:, 0] / (111_320.0 * np.cos(np.radians(origin[0])))
+    length = np.hypot(*(xy[edges[:, 0]] - xy[edges[:, 1]]).T)
+    speed = np.where(rng.random(len(edges)) < arterial_share, 50.0, 30.0) / 3.6
+    u = np.concatenate([edges[:, 0], edges[:, 1]])
+    v = np.concatenate([edges[:, 1], edges[:, 0]])
+    return CSRGraph(np.arange(num_nodes), lon, lat, u, v, np.tile(length / speed, 2), np.tile(length, 2))
+
+
+def road_grid(south_west, north_east, spacing_m=400.0, arterial_every=5):
+    """
+    Build a synthetic, speed-annotated street grid as a networkx graph, tagged like an OSM drive network.
+
+    Every `arterial_every`-th street is a 'secondary' road at 50 km/h, the
+    others are 'tertiary' streets at 30 km/h; all streets are two-way.
+
+    param south_west: The (latitude, longitude) of the south-west corner.
+    param north_east: The (latitude, longitude) of the north-east corner.
+    param spacing_m: The distance between adjacent intersections.
+    param arterial_every: The spacing of the arterial streets, in blocks.
+    """
+    import networkx as nx
+    from speed_model import annotate_travel_times
+
+    rows = int((north_east[0] - south_west[0]) * 111_320.0 / spacing_m) + 1
+    cols = int((north_east[1] - south_west[1]) * 111_320.0 * np.cos(np.radians(south_west[0])) / spacing_m) + 1
+    grid = grid_graph(rows, cols, spacing_m, south_west, arterial_every)
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    G.add_nodes_from((node, {'x': x, 'y': y}) for node, x, y in zip(grid.node_ids.tolist(), grid.x.tolist(), grid.y.tolist()))
+    sources = np.repeat(grid.node_ids, np.diff(grid.offsets))
+    arterial = grid.length / grid.travel_time > 12
+    for u, v, length, fast in zip(sources.tolist(), grid.node_ids[grid.targets].tolist(), grid.length.tolist(),
+                                  arterial.tolist()):
+        G.add_edge(u, v, length=length, highway='secondary' if fast else 'tertiary', maxspeed='50' if fast else '30')
+    return annotate_travel_times(G)
+
+
+def write_fixture_graph(cache_dir, center=ORIGIN_CITY, radius_km=GRAPH_RADIUS_KM):
+    """
+    Write the pre-baked road graph that stands in for the Rouen download (see fixtures/graph_cache).
+
+    A pinned graph-store entry under the key of the default area: a street
+    grid covering the depot and the sample manifest, so the whole pipeline
+    runs offline with `python -m project --graph-cache fixtures/graph_cache`.
+
+    param cache_dir: The graph cache directory to write it to.
+    param center: The center of the area the entry is keyed by.
+    param radius_km: The radius of the area the entry is keyed by.
+    """
+    from graph_store import GraphStore, graph_key
+    from project import NETWORK_TYPE
+    from speed_model import profile_signature
+
+    key, params = graph_key(center, radius_km=radius_km, network_type=NETWORK_TYPE)
+    G = road_grid((49.37, 1.04), (49.49, 1.16))
+    GraphStore(cache_dir).save(key, G, params=params, speed_profile=profile_signature(), pinned=True,
+                               source='synthetic grid (benchmark.write_fixture_graph)')
+    return key
+
+
+def load_manifest_coords(file_path=MANIFEST, depot=DEPOT):
+    return np.vstack([depot, load_manifest(file_path).coords])
+
+
+def _solve_fleet(distance_matrix, num_vehicles, native, solution_limit):
+    # Same model as vrp_solver.solve_ortools, with either Python callbacks or native matrix/vector transits
+    num_points = len(distance_matrix)
+    demands = [1] * num_points
+    manager = pywrapcp.RoutingIndexManager(num_points, num_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    if native:
+        transit_index = routing.RegisterTransitMatrix(distance_matrix.tolist())
+        demand_index = routing.RegisterUnaryTransitVector(demands)
+    else:
+        costs = distance_matrix.tolist()
+
+        def distance_callback(from_index, to_index):
+            return costs[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+
+        def demand_callback(from_index):
+            return demands[manager.IndexToNode(from_index)]
+
+        transit_index = routing.RegisterTransitCallback(distance_callback)
+        demand_index = routing.RegisterUnaryTransitCallback(demand_callback)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+    capacity = int(np.ceil(num_points / num_vehicles + 1))
+    routing.AddDimensionWithVehicleCapacity(demand_index, 0, [capacity] * num_vehicles, True, 'Capacity')
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    search_parameters.solution_limit = solution_limit
+
+    start = time.perf_counter()
+    solution = routing.SolveWithParameters(search_parameters)
+    return time.perf_counter() - start, solution.ObjectiveValue()
+
+
+def bench_ortools_transit(args):
+    """
+    Compare OR-Tools solve time with Python transit callbacks (before) and native matrix transits (after).
+    """
+    vehicles = args.vehicles or 4
+    coords = load_manifest_coords(args.manifest)
+    distance_matrix = integer_matrix(proxy_travel_times(coords))
+    print(f"{len(coords) - 1} packages, {vehicles} vehicles, {args.solution_limit} solutions")
+
+    for label, native in (('python callbacks', False), ('native matrix', True)):
+        timings = [_solve_fleet(distance_matrix, vehicles, native, args.solution_limit) for _ in range(args.repeat)]
+        best_time = min(duration for duration, _ in timings)
+        print(f"{label:>17}: {best_time:.3f} s (best of {args.repeat}), objective {timings[0][1]}")
+
+
+def synthetic_stops(graph, num_stops, seed=0):
+    """
+    Pick random distinct stops on a synthetic graph, with a depot near its center first.
+
+    Returns the graph nodes and the (latitude, longitude) of the depot and stops.
+
+    param graph: The `CSRGraph` to pick the stops on.
+    param num_stops: The number of stops, depot excluded.
+    param seed: The random seed.
+    """
+    rng = np.random.default_rng(seed)
+    center = np.argmin((graph.y - graph.y.mean()) ** 2 + (graph.x - graph.x.mean()) ** 2)
+    others = np.delete(graph.node_ids, center)
+    nodes = np.concatenate([[graph.node_ids[center]], rng.choice(others, num_stops, replace=False)])
+    positions = graph.index_of(nodes)
+    return nodes, np.column_stack([graph.y[positions], graph.x[positions]])
+
+
+def plan_cost(routes, travel_times):
+    return sum(travel_times[route[:-1], route[1:]].sum() for route in map(np.asarray, routes))
+
+
+def synthetic_day(args, num_stops, num_vehicles, matrix=True):
+    """
+    Build the synthetic day most benchmarks start from: random stops on a grid graph and their data model.
+
+    The data model comes from `project.create_data_model`, as in the
+    pipeline, with the default service time at every stop.
+
+    Returns the graph, the graph node and (latitude, longitude) of every stop (depot first) and the data model.
+
+    param args: The benchmark arguments, `--grid` sizes the graph.
+    param num_stops: The number of stops, depot excluded.
+    param num_vehicles: The number of vehicles.
+    param matrix: Fill in the full travel-time matrix, False when the benchmark builds its own.
+    """
+    from project import create_data_model
+    from time_windows import DEFAULT_SERVICE_SECONDS
+
+    graph = grid_graph(args.grid, args.grid)
+    nodes, coords = synthetic_stops(graph, num_stops)
+    data = create_data_model(coords, num_vehicles)
+    data['service_times'] = np.full(len(nodes), float(DEFAULT_SERVICE_SECONDS))
+    data['service_times'][data['depot']] = 0
+    if matrix:
+        data['distance_matrix'] = graph.travel_times(nodes, nodes)
+    return graph, nodes, coords, data
+
+
+def route_legs(routes, durations):
+    """
+    Build the legs of routes like `project.trace_legs`, with durations read from a matrix and no road path.
+
+    param routes: The routes (stop indices, depot first and last).
+    param durations: The travel-time matrix.
+    """
+    return [[{'from': int(i), 'to': int(j), 'route_coords': [], 'length': 0.0, 'duration': float(durations[i, j])}
+             for i, j in zip(route[:-1], route[1:]) if i != j] for route in routes]
+
+
+def bench_candidate_arcs(args):
+    """
+    Compare the full travel-time matrix with k-nearest candidate arcs: matrix time, then plan quality on the exact costs.
+    """
+    vehicles = args.vehicles or 4
+    stops = args.stops or 1000
+    graph, nodes, coords, data = synthetic_day(args, stops, vehicles, matrix=False)
+    print(f"{stops} stops, {vehicles} vehicles, k = {args.neighbors}, grid of {len(graph)} nodes")
+
+    start = time.perf_counter()
+    full = graph.travel_times(nodes, nodes)
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sparse = sparse_travel_times(graph, nodes, coords, k=args.neighbors)
+    sparse_time = time.perf_counter() - start
+    print(f"    full matrix: {full_time:.2f} s, {len(nodes) ** 2} exact pairs")
+    print(f"candidate arcs: {sparse_time:.2f} s, {sparse.neighbors.size + 2 * len(nodes)} exact pairs")
+
+    estimated = sparse.matrix
+    candidate = np.zeros(full.shape, dtype=bool)
+    candidate[np.arange(len(nodes))[:, None], sparse.neighbors] = True
+    candidate[0, :] = candidate[:, 0] = True
+    np.fill_diagonal(candidate, True)
+    error = np.abs(estimated - full)[~candidate] / np.maximum(full[~candidate], 1.0)
+    print(f"exact on candidates: {np.allclose(estimated[candidate], full[candidate])}, "
+          f"estimate error elsewhere: median {np.median(error):.1%}, P90 {np.quantile(error, 0.9):.1%}")
+
+    costs = {}
+    for label, matrix in (('full matrix', full), ('candidate arcs', estimated)):
+        start = time.perf_counter()
+        routes = solve_ortools(dict(data, distance_matrix=matrix), metaheuristic='guided_local_search',
+                               solution_limit=args.solution_limit)
+        costs[label] = plan_cost(routes, full)
+        used = np.concatenate([np.column_stack([route[:-1], route[1:]]) for route in map(np.asarray, routes)])
+        on_candidates = candidate[used[:, 0], used[:, 1]].mean()
+        print(f"{label:>15}: solved in {time.perf_counter() - start:.1f} s, exact plan cost {costs[label]:.0f} s, "
+              f"{on_candidates:.1%} of arcs on candidates")
+    print(f"quality gap: {costs['candidate arcs'] / costs['full matrix'] - 1:+.2%}")
+
+    # Legs of the candidate plan: bounded shortest-path trees against an A* search per leg
+    used = used[used[:, 0] != used[:, 1]]
+    start = time.perf_counter()
+    durations = [sparse.leg(i, j)[2] for i, j in used.tolist()]
+    tree_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i, j in used.tolist():
+        graph.shortest_path(nodes[i].item(), nodes[j].item())
+    print(f"{len(used)} legs traced: bounded trees {tree_time:.2f} s, A* {time.perf_counter() - start:.2f} s, "
+          f"durations exact: {np.allclose(durations, full[used[:, 0], used[:, 1]])}")
+
+
+def synthetic_manifest(num_rows, seed=0):
+    """
+    Build a manifest DataFrame with the columns written by AddressFinder, around the depot.
+
+    param num_rows: The number of packages.
+    param seed: The random seed.
+    """
+    rng = np.random.default_rng(seed)
+    lat = DEPOT[0] + rng.uniform(-0.1, 0.1, num_rows)
+    lon = DEPOT[1] + rng.uniform(-0.15, 0.15, num_rows)
+    return pd.DataFrame({
+        'Package ID': np.arange(1, num_rows + 1),
+        'Address': [f"{i} Rue de la République, 76000 Rouen, France" for i in range(num_rows)],
+        'lat': lat,
+        'long': lon,
+        'Google Maps URL': [f"https://www.google.com/maps/search/?api=1&query={a:.6f},{o:.6f}" for a, o in zip(lat, lon)],
+    })
+
+
+def _load_manifest_before(file_path):
+    # The previous loader: whole sheet, list of lists, then a Python loop over every point
+    df = pd.read_excel(file_path)
+    df['lat'] = df['lat'].astype(float)
+    df['long'] = df['long'].astype(float)
+    points = df[['lat', 'long']].values.tolist()
+    names = df['Package ID'].tolist()
+    if not points or not all(isinstance(point, (list, tuple)) and len(point) == 2 for point in points):
+        raise ValueError("The points list is not correctly formatted.")
+    return points, names
+
+
+def bench_manifest_load(args):
+    """
+    Time loading a 100k-row manifest: previous Excel loader, then the columnar loader on Excel, CSV and Parquet.
+    """
+    rows = args.stops or 100_000
+    df = synthetic_manifest(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        files = {'xlsx': os.path.join(directory, 'manifest.xlsx'),
+                 'csv': os.path.join(directory, 'manifest.csv'),
+                 'parquet': os.path.join(directory, 'manifest.parquet')}
+        print(f"Writing a {rows}-row manifest...")
+        df.to_excel(files['xlsx'], index=False)
+        df.to_csv(files['csv'], index=False)
+        try:
+            df.to_parquet(files['parquet'], index=False)
+        except ImportError:
+            print("pyarrow is not installed, Parquet skipped")
+            del files['parquet']
+
+        runs = [('before (xlsx)', _load_manifest_before, files['xlsx'])]
+        runs += [(f"columnar ({name})", load_manifest, path) for name, path in files.items()]
+        for label, loader, path in runs:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                loader(path)
+                timings.append(time.perf_counter() - start)
+            print(f"{label:>18}: {min(timings):.3f} s (best of {args.repeat}), {os.path.getsize(path) / 2**20:.1f} MiB")
+
+
+def _integers(text):
+    return [int(value) for value in text.split(',')]
+
+
+def synthetic_pipeline(graph, nodes, coords, num_vehicles, strategy='ortools', neighbors=16, solution_limit=200,
+                       cache_path=None):
+    """
+    Run the routing stages of `project.plan_day` on synthetic stops, without network or files.
+
+    Returns the `StageProfiler` of the run (matrix, solve and schedule stages).
+
+    param graph: The `CSRGraph` the stops lie on.
+    param nodes: The graph node of every stop, depot first.
+    param coords: Array of (latitude, longitude) of every stop, depot first.
+    param num_vehicles: The number of vehicles.
+    param strategy: The solver strategy, see `vrp_solver.SOLVER_STRATEGIES`.
+    param neighbors: The number of candidate stops per stop, 0 for the full matrix.
+    param solution_limit: The OR-Tools local search budget, fixed so that timings do not depend on a time limit.
+    param cache_path: A travel-time cache file for the full matrix, never the user's `graph_cache/` one; None for
+        no cache.
+    """
+    from profiler import StageProfiler, stage
+    from project import build_schedule, compute_travel_times, create_data_model, trace_legs
+    from snapping import SnappedPoints
+    from vrp_solver import solve_routes
+
+    profiler = StageProfiler()
+    # The stops are graph nodes, snapping is exact
+    snapped = SnappedPoints(coords, nodes, np.zeros(len(nodes)))
+    data = create_data_model(coords, num_vehicles)
+    with stage(profiler, 'matrix'):
+        graph_version = f"synthetic-{len(graph)}-{graph.num_edges}" if cache_path else None
+        travel_times = compute_travel_times(graph, snapped, neighbors or None, graph_version, cache_path=cache_path)
+        data['distance_matrix'] = travel_times.matrix
+    with stage(profiler, 'solve'):
+        routes = solve_routes(data, strategy, metaheuristic='guided_local_search', solution_limit=solution_limit)
+    with stage(profiler, 'schedule'):
+        build_schedule(trace_legs(travel_times, routes), verbose=False)
+    return profiler
+
+
+def write_valuetab(rows, file_path):
+    """
+    Write (trucks, addresses, seconds) rows in the format of Valuetab.csv, read by plot_data.py.
+
+    param rows: The measured rows.
+    param file_path: The output file.
+    """
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write("nombre camion ;nombre adresses ;duree d'execution\n")
+        for trucks, addresses, seconds in rows:
+            file.write(f"{trucks:>13} ;{addresses:>15} ;{seconds:>17.2f}\n")
+
+
+def bench_scaling(args):
+    """
+    Time the routing pipeline over a sweep of vehicle and stop counts on a synthetic graph, written as Valuetab.csv.
+
+    With --baseline, fails when a measurement is more than --max-slowdown times the baseline's for the same size.
+    """
+    import contextlib
+    import io
+
+    graph = planar_graph(args.grid ** 2) if args.graph == 'planar' else grid_graph(args.grid, args.grid)
+    print(f"{args.graph} graph of {len(graph)} nodes / {graph.num_edges} edges, strategy {args.strategy}")
+    rows = []
+    # Full matrices go through a travel-time cache of their own, started empty for every run so each one is cold
+    with tempfile.TemporaryDirectory() as directory:
+        for stops in _integers(args.stop_counts):
+            nodes, coords = synthetic_stops(graph, stops)
+            for vehicles in _integers(args.vehicle_counts):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    durations = [synthetic_pipeline(graph, nodes, coords, vehicles, args.strategy, args.neighbors,
+                                                    args.solution_limit,
+                                                    os.path.join(directory, f"{stops}_{vehicles}_{run}.sqlite")
+                                                    ).record()['total_seconds']
+                                 for run in range(args.repeat)]
+                rows.append((vehicles, stops, min(durations)))
+                print(f"{vehicles:>3} vehicles, {stops:>5} stops: {min(durations):.2f} s (best of {args.repeat})")
+    write_valuetab(rows, args.output)
+    print(f"written to {args.output}")
+
+    if args.baseline:
+        baseline = pd.read_csv(args.baseline, sep=';')
+        baseline.columns = baseline.columns.str.strip()
+        reference = {(int(trucks), int(addresses)): float(seconds) for trucks, addresses, seconds
+                     in baseline[['nombre camion', 'nombre adresses', "duree d'execution"]].itertuples(index=False)}
+        slower = [(vehicles, stops, seconds / reference[vehicles, stops]) for vehicles, stops, seconds in rows
+                  if (vehicles, stops) in reference and seconds > args.max_slowdown * reference[vehicles, stops]]
+        for vehicles, stops, ratio in slower:
+            print(f"regression: {vehicles} vehicles, {stops} stops, {ratio:.2f}x the baseline")
+        if slower:
+            sys.exit(f"{len(slower)} measurements over {args.max_slowdown}x the baseline {args.baseline}")
+
+
+def _timed_run(command):
+    start = time.perf_counter()
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - start, output
+
+
+def bench_import_time(args):
+    """
+    Guard the startup cost: `import project` and `python -m project --help` must stay fast and import no heavy dependency.
+    """
+    probe = ("import sys, time; start = time.perf_counter(); import project; "
+             "print(time.perf_counter() - start); print(' '.join(sorted({name.split('.')[0] for name in sys.modules})))")
+    imports = [_timed_run([sys.executable, '-c', probe]) for _ in range(args.repeat)]
+    import_time = min(float(output.split()[0]) for _, output in imports)
+    loaded = sorted(set(imports[0][1].split()[1:]) & set(HEAVY_MODULES))
+    help_time = min(_timed_run([sys.executable, '-m', 'project', '--help'])[0] for _ in range(args.repeat))
+
+    print(f"      import project: {import_time:.3f} s (best of {args.repeat})")
+    print(f"python -m project -h: {help_time:.3f} s wall, interpreter startup included")
+    print(f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+    if loaded or import_time > args.max_import_time:
+        sys.exit(f"Startup budget exceeded (limit {args.max_import_time} s, no heavy module at import)")
+
+
+def bench_graph_store(args):
+    """
+    Load time and peak memory of a cached graph: the CSR arrays built from the memory-mapped columns versus through networkx.
+
+    With `--fixture-dir`, (re)writes the pre-baked test graph there instead.
+    """
+    import tracemalloc
+    from graph_store import GraphStore
+
+    if args.fixture_dir:
+        key = write_fixture_graph(args.fixture_dir)
+        print(f"Wrote {key} to {args.fixture_dir}")
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = GraphStore(cache_dir)
+        side_m = args.grid * 100.0
+        G = road_grid(DEPOT, (DEPOT[0] + side_m / 111_320.0, DEPOT[1] + side_m / (111_320.0 * np.cos(np.radians(DEPOT[0])))),
+                      spacing_m=100.0)
+        store.save('bench', G)
+        print(f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+        del G
+
+        for name, load in (('networkx', lambda: CSRGraph.from_networkx(store.load('bench'))),
+                           ('arrays', lambda: CSRGraph.from_arrays(store.load_arrays('bench')))):
+            tracemalloc.start()
+            start = time.perf_counter()
+            graph = load()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>9}: CSR graph in {elapsed:.2f} s, peak {peak / 2**20:.1f} MiB ({graph.num_edges} edges)")
+
+
+def bench_map_size(args):
+    """
+    Render a synthetic 2,000-stop plan with the full and the compact map, and check the compact one fits the budget.
+    """
+    from manifest import Manifest
+    from project import build_schedule, render_routes_map, trace_legs
+
+    vehicles = args.vehicles or 10
+    stops = args.stops or 2000
+    graph, nodes, coords, _ = synthetic_day(args, stops, vehicles, matrix=False)
+    routes, travel, _ = solve_hierarchical(graph, nodes, coords, vehicles, [int(np.ceil(stops / vehicles * 1.05))] * vehicles)
+    manifest = Manifest(np.arange(1, stops + 1).astype(str), coords[1:])
+
+    start = time.perf_counter()
+    legs = trace_legs(travel, routes)
+    schedule, _, _ = build_schedule(legs, verbose=False)
+    print(f"{stops} stops, {vehicles} vehicles, {sum(len(leg['route_coords']) for v in legs for leg in v)} route points "
+          f"traced in {time.perf_counter() - start:.1f} s")
+
+    budget = args.max_map_size * 2**20
+    with tempfile.TemporaryDirectory() as directory:
+        sizes = {}
+        for label, compact in (('full', False), ('compact', True)):
+            path = os.path.join(directory, f"{label}.html")
+            start = time.perf_counter()
+            render_routes_map(manifest, coords, legs, schedule, path, compact=compact, max_bytes=budget)
+            sizes[label] = os.path.getsize(path)
+            print(f"{label:>8} map: {sizes[label] / 2**20:.2f} MiB, rendered in {time.perf_counter() - start:.1f} s")
+        with open(path, encoding='utf-8') as f:
+            compact_html = f.read()
+    print(f"compact / full: {sizes['compact'] / sizes['full']:.1%}")
+
+    # The compact map must fit the budget without losing any delivery marker
+    delivered = sum(delivery['stop'] != 0 for deliveries in schedule for delivery in deliveries)
+    assert sizes['compact'] <= budget, f"Compact map of {sizes['compact']} bytes over the {args.max_map_size} MiB budget"
+    assert sizes['compact'] < sizes['full'], "Compact map not smaller than the full one"
+    assert compact_html.count(' - vehicle ') == delivered, "Compact map does not mark every delivery"
+
+
+def bench_eta_simulation(args):
+    """
+    Simulate 10,000 days of a synthetic 500-stop plan (service times and traffic) and check it fits the time budget.
+    """
+    from schedule import simulate_finish_times
+
+    vehicles = args.vehicles or 10
+    stops = args.stops or 500
+    rng = np.random.default_rng(0)
+    # Route legs of 1 to 10 minutes, the stops split between the vehicles, each route back to the depot
+    routes = [[0, *route, 0] for route in np.array_split(np.arange(1, stops + 1), vehicles)]
+    legs = route_legs(routes, rng.uniform(60, 600, (stops + 1, stops + 1)))
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        quantiles = simulate_finish_times(legs, args.scenarios, seed=0)
+        timings.append(time.perf_counter() - start)
+    print(f"{stops} stops, {vehicles} vehicles, {args.scenarios} scenarios: {min(timings):.2f} s (best of {args.repeat})")
+    for vehicle_id, (p50, p90) in enumerate(quantiles.tolist()):
+        print(f"vehicle {vehicle_id + 1:>2}: P50 {p50 / 60:6.1f} min, P90 {p90 / 60:6.1f} min")
+    if min(timings) > args.max_eta_time:
+        sys.exit(f"ETA simulation over the {args.max_eta_time} s budget")
+
+
+def bench_time_windows(args):
+    """
+    Solve time as the share of stops with a time window grows, with a few unreachable windows for the pre-check.
+
+    Windows are drawn around the arrival times of a plan solved without
+    windows, so every share stays feasible once the unreachable ones are left out.
+    """
+    from schedule import LegArrays, leg_times
+    from time_windows import DEFAULT_HORIZON, infeasible_stops
+
+    vehicles = args.vehicles or 4
+    stops = args.stops or 200
+    graph, nodes, coords, data = synthetic_day(args, stops, vehicles)
+    matrix, service = data['distance_matrix'], data['service_times']
+
+    # Arrival times of the plan without windows
+    routes = solve_ortools(data, metaheuristic='guided_local_search', solution_limit=args.solution_limit)
+    arrays = LegArrays(route_legs(routes, matrix))
+    _, arrivals = leg_times(arrays, arrays.durations, service[arrays.stops])
+    arrival = np.zeros(len(nodes))
+    arrival[arrays.stops[arrays.serviced]] = arrivals[arrays.serviced]
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(np.arange(1, len(nodes)))
+    before = rng.uniform(0, 3600, len(nodes))
+    after = rng.uniform(1800, 5400, len(nodes))
+    unreachable = order[:max(1, stops // 50)]
+    print(f"{stops} stops, {vehicles} vehicles, {len(unreachable)} unreachable windows, solved to the first local optimum")
+    for share in (0.0, 0.25, 0.5, 0.75, 1.0):
+        windows = np.tile([0.0, DEFAULT_HORIZON], (len(nodes), 1))
+        windowed = order[:int(round(share * stops))]
+        windows[windowed, 0] = np.maximum(arrival[windowed] - before[windowed], 0)
+        windows[windowed, 1] = arrival[windowed] + after[windowed]
+        if share:
+            windows[unreachable] = 0, 60
+
+        start = time.perf_counter()
+        skipped = np.flatnonzero(infeasible_stops(matrix, windows, service)).tolist()
+        check_time = time.perf_counter() - start
+        start = time.perf_counter()
+        solved = solve_ortools(dict(data, time_windows=windows, service_times=service, skipped=skipped))
+        solve_time = time.perf_counter() - start
+        dropped = stops - len(skipped) - sum(len(route) - 2 for route in solved)
+        print(f"{share:5.0%} with windows: pre-check {check_time * 1000:.1f} ms ({len(skipped)} rejected), "
+              f"solved in {solve_time:.2f} s ({dropped} dropped), plan cost {plan_cost(solved, matrix) / 60:.0f} min")
+
+        # The same solve left to find out about the unreachable windows by itself
+        if skipped:
+            start = time.perf_counter()
+            solve_ortools(dict(data, time_windows=windows, service_times=service))
+            print(f"{'':>19}without pre-check: solved in {time.perf_counter() - start:.2f} s")
+
+
+def bench_time_buckets(args):
+    """
+    Matrix time against the number of time buckets, and the time-dependent cost of static versus re-costed plans.
+
+    Arterials are costed as 'primary' roads and the other streets as
+    'residential' ones of the time profile; synthetic profiles split the day
+    into more buckets to check that the matrices grow linearly with them.
+    """
+    from matrix_engine import bucket_matrices
+    from project import DAY_START
+    from speed_model import DEFAULT_TIME_PROFILE, bucket_start_seconds, bucket_weights, edge_time_factors
+    from vrp_solver import solve_time_dependent, time_dependent_matrix
+
+    vehicles = args.vehicles or 4
+    stops = args.stops or 200
+    graph, nodes, coords, data = synthetic_day(args, stops, vehicles, matrix=False)
+    highway = np.where(graph.length / graph.travel_time > 12, 'primary', 'residential')
+
+    def attach(profile):
+        for name, factors in zip(bucket_weights(profile), edge_time_factors(highway, profile)):
+            # Weights are given per edge of the edge list the grid was built from
+            graph.add_weight(name, (graph.travel_time / factors)[graph.edge_positions])
+        return bucket_weights(profile)
+
+    print(f"{stops} stops, {args.neighbors} exact travel times per stop")
+    neighbors = sparse_travel_times(graph, nodes, coords, k=args.neighbors).neighbors
+    for buckets in (1, 2, 4, 8):
+        starts = np.arange(buckets) * 24 * 60 // buckets
+        profile = {'bucket_starts': [f"{start // 60:02d}:{start % 60:02d}" for start in starts], 'class_factors': [
+            ('primary', np.linspace(1.0, 0.6, buckets).tolist()),
+            ('residential', np.linspace(1.0, 0.9, buckets).tolist())], 'default_factors': [1.0] * buckets}
+        weights = attach(profile)
+        start = time.perf_counter()
+        matrices = bucket_matrices(graph, nodes, coords, weights, neighbors)
+        elapsed = time.perf_counter() - start
+        # The same matrices with one set of searches per bucket, each on the bucket's own fastest paths
+        start = time.perf_counter()
+        searched = np.stack([sparse_travel_times(graph, nodes, coords, k=args.neighbors, weight=weight).matrix
+                             for weight in weights])
+        searched_time = time.perf_counter() - start
+        exact = np.isfinite(searched) & (searched > 0)
+        print(f"{buckets} buckets: one pass {elapsed:.2f} s, searched per bucket {searched_time:.2f} s, "
+              f"mean cost over the bucket's own fastest paths {np.mean(matrices[exact] / searched[exact]) - 1:+.2%}")
+
+    matrices = bucket_matrices(graph, nodes, coords, attach(DEFAULT_TIME_PROFILE), neighbors)
+    bucket_starts = bucket_start_seconds(DEFAULT_TIME_PROFILE) - (DAY_START.hour * 3600 + DAY_START.minute * 60)
+    day_start_bucket = np.searchsorted(bucket_starts, 0, side='right') - 1
+    data.update(distance_matrix=matrices[day_start_bucket], bucket_matrices=matrices, bucket_starts=bucket_starts)
+
+    routes = solve_ortools(data, metaheuristic='guided_local_search', solution_limit=args.solution_limit)
+    static_cost = plan_cost(routes, time_dependent_matrix(data, routes))
+    start = time.perf_counter()
+    refined = solve_time_dependent(data, routes)
+    elapsed = time.perf_counter() - start
+    refined_cost = plan_cost(refined, time_dependent_matrix(data, refined))
+    print(f"Static plan: {plan_cost(routes, data['distance_matrix']) / 60:.0f} min at day-start speeds, "
+          f"{static_cost / 60:.0f} min driven at the speeds of the departure times")
+    print(f"Re-costed plan: {refined_cost / 60:.0f} min driven ({(refined_cost - static_cost) / static_cost:+.1%}) "
+          f"after {elapsed:.2f} s of refinement")
+
+
+def bench_replan(args):
+    """
+    Re-plan a synthetic day after a few packages were cancelled and added, and check it fits the latency budget.
+
+    The previous plan is solved on the first stops; the current day drops
+    `--changes` of them and adds as many new ones. The warm start is compared
+    with a cold solve of the current day.
+    """
+    from project import create_data_model
+    from vrp_solver import remap_routes, replan_routes
+
+    vehicles = args.vehicles or 4
+    stops = args.stops or 500
+    changes = args.changes
+    graph, nodes, coords, day = synthetic_day(args, stops + changes, vehicles)
+    matrix = day['distance_matrix']
+
+    def sub_day(indices):
+        data = create_data_model(coords[indices], vehicles)
+        data['distance_matrix'] = matrix[np.ix_(indices, indices)]
+        return data
+
+    previous = np.arange(stops + 1)
+    current = np.concatenate([[0], np.arange(changes + 1, stops + changes + 1)])
+    previous_routes = solve_ortools(sub_day(previous), metaheuristic='guided_local_search',
+                                    solution_limit=args.solution_limit)
+    data = sub_day(current)
+    print(f"{stops} stops, {vehicles} vehicles, {changes} cancelled and {changes} added")
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        routes = replan_routes(data, remap_routes(previous_routes, previous.tolist(), current.tolist()))
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    cold = solve_ortools(data, metaheuristic='guided_local_search', solution_limit=args.solution_limit)
+    cold_time = time.perf_counter() - start
+
+    visited = sorted(stop for route in routes for stop in route[1:-1])
+    assert visited == list(range(1, len(current))), "Every stop must be visited exactly once"
+    print(f"re-plan: {min(timings):.3f} s (best of {args.repeat}), plan cost {plan_cost(routes, data['distance_matrix']) / 60:.0f} min")
+    print(f"   cold: {cold_time:.3f} s, plan cost {plan_cost(cold, data['distance_matrix']) / 60:.0f} min")
+    assert min(timings) <= args.max_replan_time, f"Re-plan over the {args.max_replan_time} s budget"
+
+
+def mock_nominatim(latency, miss_share=0.1):
+    """
+    Start a local stand-in for Nominatim's reverse geocoding, answering every request after `latency` seconds.
+
+    Returns the server (serving from a background thread, `shutdown()` it
+    when done) and its base URL.
+
+    param latency: The simulated response time in seconds.
+    param miss_share: The share of points answered with no address.
+    """
+    import json
+    import threading
+    import zlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            lat, lon = query['lat'][0], query['lon'][0]
+            time.sleep(latency)
+            # Misses depend on the point only, like a real server
+            if zlib.crc32(f'{lat},{lon}'.encode()) % 1000 < miss_share * 1000:
+                body = {'error': 'Unable to geocode'}
+            else:
+                body = {'display_name': f"{lat} Rue {lon}, Rouen, France", 'lat': lat, 'lon': lon}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def bench_geocoding(args):
+    """
+    Addresses per second of AddressFinder against a local mock Nominatim, serial versus concurrent.
+
+    The mock stands in for a self-hosted server: `--latency` per request and
+    no usage limit but `--rate`, which every run must stay under.
+    """
+    from AddressFinder import FindAddresses
+    from geo_client import GeoClient
+
+    addresses = args.stops or 200
+    server, url = mock_nominatim(args.latency)
+    print(f"{addresses} addresses, {args.latency * 1000:.0f} ms per request, at most {args.rate:g} requests/s")
+    try:
+        for concurrency in (1, 4, 16, 32):
+            client = GeoClient(nominatim_url=url, cache_path=None, rate=args.rate, pool_size=concurrency)
+            start = time.perf_counter()
+            found = FindAddresses(DEPOT, 5.0, addresses, client, seed=0, concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            client.close()
+            request_rate = client.requests / elapsed
+            print(f"concurrency {concurrency:>2}: {len(found)} addresses in {elapsed:.2f} s "
+                  f"({len(found) / elapsed:.0f} addresses/s, {request_rate:.0f} requests/s)")
+            if request_rate > args.rate * 1.05:
+                raise SystemExit(f"{request_rate:.0f} requests/s is over the {args.rate:g} requests/s limit")
+    finally:
+        server.shutdown()
+
+
+def bench_matrix_workers(args):
+    """
+    Time the full travel-time matrix with 1, 2 and 4 worker processes, and the shortest-path trees each run keeps.
+    """
+    from matrix_engine import TravelTimeMatrix
+
+    stops = args.stops or 500
+    graph, nodes, _, _ = synthetic_day(args, stops, 1, matrix=False)
+    budget = args.tree_budget * 2**20
+    print(f"{stops} stops, grid of {len(graph)} nodes, tree budget {args.tree_budget} MiB")
+    reference = None
+    for workers in (1, 2, 4):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            travel_times = TravelTimeMatrix(graph, nodes.tolist(), max_tree_bytes=budget, workers=workers)
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = (min(timings), travel_times.matrix)
+        assert np.array_equal(travel_times.matrix, reference[1]), "The matrix depends on the number of workers"
+        assert travel_times.trees.size <= budget, "Kept trees over the budget"
+        print(f"{workers} workers: {min(timings):.2f} s (best of {args.repeat}, {reference[0] / min(timings):.2f}x), "
+              f"{len(travel_times.trees.trees)} trees kept ({travel_times.trees.size / 2**20:.0f} MiB)")
+
+
+def bench_large_instance(args):
+    """
+    Solve a synthetic 10k-stop day on a grid graph with the hierarchical mode, reporting time and memory per step.
+    """
+    vehicles = args.vehicles or 50
+    stops = args.stops or 10000
+    graph, nodes, coords, _ = synthetic_day(args, stops, vehicles, matrix=False)
+    capacity = int(np.ceil(stops / vehicles * 1.05))
+    print(f"{stops} stops, {vehicles} vehicles, grid of {len(graph)} nodes / {graph.num_edges} edges")
+
+    start = time.perf_counter()
+    routes, travel, stats = solve_hierarchical(graph, nodes, coords, vehicles, [capacity] * vehicles,
+                                               k=args.neighbors, memory_limit=args.memory_limit * 2**20,
+                                               workers=args.workers)
+    duration = time.perf_counter() - start
+
+    visited = sorted(stop for route in routes for stop in route[1:-1])
+    assert visited == list(range(1, len(nodes))), "Every stop must be visited exactly once"
+    print(f"solved in {duration:.1f} s, peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    for name, value in stats.items():
+        print(f"{name:>22}: {value:.1f}" if isinstance(value, float) else f"{name:>22}: {value}")
+
+
+BENCHMARKS = {
+    'ortools-transit': bench_ortools_transit,
+    'candidate-arcs': bench_candidate_arcs,
+    'import-time': bench_import_time,
+    'large-instance': bench_large_instance,
+    'matrix-workers': bench_matrix_workers,
+    'map-size': bench_map_size,
+    'manifest-load': bench_manifest_load,
+    'scaling': bench_scaling,
+    'eta-simulation': bench_eta_simulation,
+    'time-windows': bench_time_windows,
+    'time-buckets': bench_time_buckets,
+    'replan': bench_replan,
+    'graph-store': bench_graph_store,
+    'geocoding': bench_geocoding,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the routing pipeline.")
+    parser.add_argument('benchmark', choices=BENCHMARKS)
+    parser.add_argument('--manifest', default=MANIFEST, help="Manifest with the delivery points")
+    parser.add_argument('--vehicles', type=int, help="Number of vehicles "
+                        "(default 4, 50 for large-instance, 10 for map-size and eta-simulation)")
+    parser.add_argument('--solution-limit', type=int, default=200, help="Local search solutions explored per solve")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stops', type=int, help="Number of synthetic stops "
+                        "(default 1000, 10000 for large-instance, 500 for eta-simulation, 200 for time-windows, time-buckets and geocoding, 100000 manifest rows for manifest-load)")
+    parser.add_argument('--grid', type=int, default=200, help="Side of the synthetic grid graph, in nodes")
+    parser.add_argument('--neighbors', type=int, default=16, help="Exact travel times kept per stop")
+    parser.add_argument('--memory-limit', type=int, default=2048, help="Memory ceiling in MiB")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--changes', type=int, default=5, help="Packages cancelled and added before a re-plan")
+    parser.add_argument('--max-replan-time', type=float, default=0.5, help="Re-plan latency budget in seconds")
+    parser.add_argument('--tree-budget', type=int, default=256, help="Shortest-path tree budget in MiB")
+    parser.add_argument('--max-map-size', type=float, default=1.0, help="Budget of the compact map in MiB")
+    parser.add_argument('--max-import-time', type=float, default=0.5, help="Budget of `import project` in seconds")
+    parser.add_argument('--graph', choices=('grid', 'planar'), default='grid',
+                        help="Synthetic road network of the scaling sweep (planar: --grid² random intersections)")
+    parser.add_argument('--strategy', default='ortools', help="Solver strategy of the scaling sweep")
+    parser.add_argument('--vehicle-counts', default='1,2,3,4', help="Vehicle counts of the scaling sweep")
+    parser.add_argument('--stop-counts', default='5,10,20,40,70', help="Stop counts of the scaling sweep")
+    parser.add_argument('--output', default='Valuetab_synthetic.csv', help="Scaling results, in the Valuetab.csv format")
+    parser.add_argument('--baseline', help="Previous scaling results to check for regressions")
+    parser.add_argument('--max-slowdown', type=float, default=1.5, help="Allowed ratio to the baseline timings")
+    parser.add_argument('--scenarios', type=int, default=10000, help="Simulated days of the ETA simulation")
+    parser.add_argument('--max-eta-time', type=float, default=1.0, help="Budget of the ETA simulation in seconds")
+    parser.add_argument('--fixture-dir', help="graph-store: write the pre-baked test graph to this cache directory")
+    parser.add_argument('--latency', type=float, default=0.05, help="Response time of the mock geocoder in seconds")
+    parser.add_argument('--rate', type=float, default=200, help="Request rate limit of the geocoding benchmark")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from geo import local_xy
+
+
+def capacity_assignment(costs, demands, capacities):
+    """
+    Assign every point to a cluster without exceeding the cluster capacities.
+
+    Points are assigned by decreasing regret (gap between their best and second
+    best cluster), each to its cheapest cluster that still has room.
+
+    param costs: Array (points, clusters) of assignment costs.
+    param demands: Demand of each point.
+    param capacities: Capacity of each cluster.
+    """
+    num_points, num_clusters = costs.shape
+    preferences = np.argsort(costs, axis=1)
+    ranked = np.take_along_axis(costs, preferences, axis=1)
+    regret = ranked[:, 1] - ranked[:, 0] if num_clusters > 1 else np.zeros(num_points)
+
+    labels = np.full(num_points, -1)
+    loads = np.zeros(num_clusters)
+    for point in np.argsort(-regret, kind='stable').tolist():
+        for cluster in preferences[point].tolist():
+            if loads[cluster] + demands[point] <= capacities[cluster]:
+                labels[point] = cluster
+                loads[cluster] += demands[point]
+                break
+        else:
+            raise ValueError(f"Point {point} does not fit in any cluster")
+    return labels
+
+
+def balanced_clusters(coords, capacities, demands=None, travel_times=None, max_iter=10, random_state=0):
+    """
+    Split delivery points into one cluster per vehicle, respecting the vehicle capacities.
+
+    Clusters start from mini-batch K-means in meters, then alternate a
+    capacity-constrained assignment and a center update. With `travel_times`
+    the centers are medoids (stops) and the cost is the round-trip travel time
+    to them; otherwise the centers are centroids and the cost is the planar
+    distance, a cheap proxy for travel time.
+
+    param coords: Array of (latitude, longitude) of the stops, depot excluded.
+    param capacities: Capacity of each vehicle.
+    param demands: Demand of each stop (default 1).
+    param travel_times: Optional travel-time matrix between the stops.
+    param max_iter: Maximum number of assignment / update rounds.
+    param random_state: Seed of the K-means initialization.
+    """
+    xy = local_xy(coords)
+    num_clusters = len(capacities)
+    demands = np.ones(len(xy)) if demands is None else np.asarray(demands, dtype=float)
+    capacities = np.asarray(capacities, dtype=float)
+    if demands.sum() > capacities.sum():
+        raise ValueError(f"Total demand {demands.sum():g} exceeds the total capacity {capacities.sum():g}")
+
+    kmeans = MiniBatchKMeans(n_clusters=num_clusters, random_state=random_state, n_init=3,
+                             batch_size=max(1024, 2 * num_clusters)).fit(xy)
+    centers = kmeans.cluster_centers_
+    if travel_times is not None:
+        travel_times = np.asarray(travel_times, dtype=float)
+        round_trips = np.minimum(travel_times + travel_times.T, 1e12)  # Unreachable pairs stay comparable
+        medoids = np.argmin(((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=0)
+
+    labels = None
+    for _ in range(max_iter):
+        if travel_times is None:
+            costs = np.sqrt(((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2))
+        else:
+            costs = round_trips[:, medoids]
+        new_labels = capacity_assignment(costs, demands, capacities)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+
+        for cluster in range(num_clusters):
+            members = np.flatnonzero(labels == cluster)
+            if not len(members):
+                continue
+            if travel_times is None:
+                centers[cluster] = xy[members].mean(axis=0)
+            else:
+                medoids[cluster] = members[np.argmin(round_trips[np.ix_(members, members)].sum(axis=1))]
+    return labels
@@ -0,0 +1,171 @@
+import os
+import numpy as np
+import folium
+from folium.plugins import FastMarkerCluster
+from geo import local_xy
+
+# Compact rendering for large plans: one GeoJSON layer per vehicle, simplified and rounded
+# route lines, and stops drawn in the browser from a single clustered array.
+
+DEFAULT_TOLERANCE_M = 5.0  # Douglas-Peucker tolerance, below the width of a drawn route
+DEFAULT_PRECISION = 5  # Decimals kept in the coordinates, about 1 m
+MAX_BUDGET_ATTEMPTS = 6
+
+# Builds each stop marker in the browser from a [lat, lon, tooltip, color] row
+_STOP_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+                                {radius: 5, color: row[3], weight: 2, fillOpacity: 0.8});
+    marker.bindTooltip(row[2]);
+    return marker;
+}
+"""
+
+
+def simplify_line(xy, tolerance):
+    """
+    Return the mask of the points kept by Douglas-Peucker simplification.
+
+    The first and last points are always kept; every other point is kept only
+    if dropping it would move the line by more than `tolerance`.
+
+    param xy: Array of planar coordinates, shape (n, 2).
+    param tolerance: The maximum deviation, in the units of `xy`.
+    """
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = xy[end] - xy[start]
+        offsets = xy[start + 1:end] - xy[start]
+        norm = np.hypot(*segment)
+        if norm > 0:
+            deviations = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / norm
+        else:
+            deviations = np.hypot(offsets[:, 0], offsets[:, 1])
+        furthest = int(np.argmax(deviations))
+        if deviations[furthest] > tolerance:
+            split = start + 1 + furthest
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    return keep
+
+
+def compact_line(coords, tolerance_m=DEFAULT_TOLERANCE_M, precision=DEFAULT_PRECISION):
+    """
+    Simplify a (latitude, longitude) line and round it, returned as GeoJSON [longitude, latitude] pairs.
+
+    param coords: Array of (latitude, longitude).
+    param tolerance_m: The Douglas-Peucker tolerance in meters.
+    param precision: The number of decimals kept.
+    """
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) > 2:
+        coords = coords[simplify_line(local_xy(coords), tolerance_m)]
+    coords = np.round(coords, precision)
+    # Rounding can make neighboring points identical
+    distinct = np.ones(len(coords), dtype=bool)
+    distinct[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    return coords[distinct][:, ::-1].tolist()
+
+
+def vehicle_feature(vehicle_legs, color, name, tolerance_m=DEFAULT_TOLERANCE_M, precision=DEFAULT_PRECISION):
+    """
+    Merge the legs of one vehicle into a single GeoJSON line feature.
+
+    param vehicle_legs: The legs of the vehicle (see `project.trace_legs`).
+    param color: The line color.
+    param name: The tooltip of the line.
+    param tolerance_m: The Douglas-Peucker tolerance in meters.
+    param precision: The number of decimals kept.
+    """
+    # Consecutive legs share their junction point, keep it once
+    parts = [np.asarray(leg['route_coords'], dtype=float)[(i > 0):] for i, leg in enumerate(vehicle_legs)]
+    line = compact_line(np.concatenate(parts), tolerance_m, precision) if parts else []
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': line},
+        'properties': {'name': name, 'color': color},
+    }
+
+
+def _build_map(stop_coords, labels, legs, schedule, colors, tolerance_m, precision):
+    center = np.round(stop_coords.mean(axis=0), precision).tolist()
+    map_folium = folium.Map(location=center, zoom_start=12, prefer_canvas=True)
+
+    # Stop rows: depot first, then the deliveries colored by vehicle with their arrival time
+    rows = [[*np.round(stop_coords[0], precision).tolist(), 'Depot', '#000000']]
+    for vehicle_id, (vehicle_legs, deliveries) in enumerate(zip(legs, schedule)):
+        color = colors[vehicle_id % len(colors)]
+        feature = vehicle_feature(vehicle_legs, color, f"Vehicle {vehicle_id + 1}", tolerance_m, precision)
+        folium.GeoJson(
+            feature,
+            name=f"Vehicle {vehicle_id + 1}",
+            style_function=lambda feature: {'color': feature['properties']['color'], 'weight': 4, 'opacity': 0.7},
+            tooltip=folium.GeoJsonTooltip(['name'], labels=False),
+        ).add_to(map_folium)
+        for delivery in deliveries:
+            if delivery['stop'] == 0:
+                continue
+            lat, lon = np.round(stop_coords[delivery['stop']], precision).tolist()
+            label = f"{labels[delivery['stop']]} - vehicle {vehicle_id + 1}, {delivery['arrival'].strftime('%H:%M')}"
+            rows.append([lat, lon, label, color])
+
+    FastMarkerCluster(rows, callback=_STOP_CALLBACK, name='Stops').add_to(map_folium)
+    folium.LayerControl().add_to(map_folium)
+    return map_folium.get_root().render()
+
+
+def render_compact_stops_map(stop_coords, labels, file_path, precision=DEFAULT_PRECISION):
+    """
+    Save a lightweight HTML map of the stops as clustered markers.
+
+    param stop_coords: Array of (latitude, longitude) of the stops.
+    param labels: The label of every stop.
+    param file_path: The output HTML file.
+    param precision: The number of decimals kept in the coordinates.
+    """
+    stop_coords = np.round(np.asarray(stop_coords, dtype=float), precision)
+    map_folium = folium.Map(location=stop_coords.mean(axis=0).tolist(), zoom_start=12, prefer_canvas=True)
+    rows = [[lat, lon, label, '#3388ff'] for (lat, lon), label in zip(stop_coords.tolist(), labels)]
+    FastMarkerCluster(rows, callback=_STOP_CALLBACK, name='Stops').add_to(map_folium)
+    map_folium.save(file_path)
+
+
+def render_compact_map(stop_coords, labels, legs, schedule, file_path, colors, max_bytes=None,
+                       tolerance_m=DEFAULT_TOLERANCE_M, precision=DEFAULT_PRECISION):
+    """
+    Save a lightweight HTML map of the routes, for plans with thousands of stops.
+
+    Each vehicle is one merged GeoJSON line, simplified and rounded, and the
+    stops are clustered markers built in the browser from one array. When the
+    page is larger than `max_bytes`, it is rendered again with a doubled
+    simplification tolerance, a few times at most.
+
+    Returns the size of the written file in bytes.
+
+    param stop_coords: Array of (latitude, longitude) of the stops, depot first.
+    param labels: The label of every stop, depot first.
+    param legs: The legs of every vehicle (see `project.trace_legs`).
+    param schedule: The deliveries of every vehicle (see `project.build_schedule`).
+    param file_path: The output HTML file.
+    param colors: The vehicle colors.
+    param max_bytes: Optional size budget of the page.
+    param tolerance_m: The initial Douglas-Peucker tolerance in meters.
+    param precision: The number of decimals kept in the coordinates.
+    """
+    stop_coords = np.asarray(stop_coords, dtype=float)
+    for _ in range(MAX_BUDGET_ATTEMPTS):
+        html = _build_map(stop_coords, labels, legs, schedule, colors, tolerance_m, precision).encode('utf-8')
+        if max_bytes is None or len(html) <= max_bytes:
+            break
+        tolerance_m *= 2
+    else:
+        print(f"Warning: map {file_path} is {len(html) / 2**20:.1f} MiB, over the {max_bytes / 2**20:.1f} MiB budget")
+
+    with open(file_path, 'wb') as file:
+        file.write(html)
+    return os.path.getsize(file_path)
@@ -0,0 +1,379 @@
+import heapq
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from geo import haversine
+
+
+class NoPathError(Exception):
+    """
+    Raised when no path links two nodes, by the CSR and the networkx backends alike.
+    """
+
+
+class CSRGraph:
+    """
+    Compact integer-indexed road graph stored as CSR arrays.
+
+    Nodes are numbered 0..n-1 in increasing OSM id order, `node_ids` maps them
+    back to OSM ids. The outgoing edges of node i are `targets[offsets[i]:offsets[i + 1]]`
+    with their `travel_time` (s) and `length` (m) stored as float32. Parallel edges
+    are reduced to the fastest one, which is the edge any shortest path would use.
+    Other edge costs, such as the travel times of a time bucket, are attached
+    with `add_weight` and searched like `travel_time`; their parallel edges are
+    reduced to the cheapest one under that cost.
+    """
+
+    def __init__(self, node_ids, x, y, u, v, travel_time, length):
+        """
+        Build the CSR arrays from an edge list.
+
+        param node_ids: Array of OSM node ids.
+        param x: Array of node longitudes.
+        param y: Array of node latitudes.
+        param u: Array of edge source OSM ids.
+        param v: Array of edge target OSM ids.
+        param travel_time: Array of edge travel times in seconds.
+        param length: Array of edge lengths in meters.
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        order = np.argsort(node_ids)
+        self.node_ids = node_ids[order]
+        self.x = np.asarray(x, dtype=np.float64)[order]
+        self.y = np.asarray(y, dtype=np.float64)[order]
+
+        sources = self.index_of(u)
+        targets = self.index_of(v)
+        travel_time = np.asarray(travel_time, dtype=np.float64)
+        length = np.asarray(length, dtype=np.float64)
+
+        # Sort by source, target then travel time and keep the first edge of each (source, target) pair
+        edge_order = np.lexsort((travel_time, targets, sources))
+        sources, targets = sources[edge_order], targets[edge_order]
+        keep = np.ones(len(edge_order), dtype=bool)
+        keep[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        # CSR position of every given edge: the kept edge between the same two nodes
+        self.edge_positions = np.empty(len(edge_order), dtype=np.int64)
+        self.edge_positions[edge_order] = np.cumsum(keep) - 1
+        edge_order = edge_order[keep]
+
+        self.targets = targets[keep].astype(np.int32)
+        self.travel_time = travel_time[edge_order].astype(np.float32)
+        self.length = length[edge_order].astype(np.float32)
+        self.offsets = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[keep], minlength=len(self.node_ids)), out=self.offsets[1:])
+
+        self.weights = {}
+        self._matrices = {}
+        self._edge_keys = None
+
+    @classmethod
+    def from_networkx(cls, G, weight='travel_time', extra_weights=()):
+        """
+        Convert an annotated networkx road graph.
+
+        param G: The road graph, nodes must have `x`/`y` and edges `length` and `weight`.
+        param weight: The edge attribute stored as travel time.
+        param extra_weights: Other edge attributes to attach as costs (see `add_weight`).
+        """
+        nodes = list(G.nodes(data=True))
+        edges = [(u, v, data) for u, v, data in G.edges(data=True) if weight in data]
+        graph = cls(
+            [node for node, _ in nodes],
+            [data['x'] for _, data in nodes],
+            [data['y'] for _, data in nodes],
+            [u for u, _, _ in edges],
+            [v for _, v, _ in edges],
+            [data[weight] for _, _, data in edges],
+            [data.get('length', 0.0) for _, _, data in edges],
+        )
+        for name in extra_weights:
+            graph.add_weight(name, [data[name] for _, _, data in edges])
+        return graph
+
+    @classmethod
+    def from_arrays(cls, arrays, extra_weights=None):
+        """
+        Convert the arrays of a cached graph (see `GraphStore.load_arrays`) without going through networkx.
+
+        param arrays: A dict of node and edge arrays.
+        param extra_weights: Optional dict of other edge costs to attach (see `add_weight`), aligned with the
+            edge arrays.
+        """
+        valid = ~np.isnan(arrays['travel_time'])
+        graph = cls(arrays['node_id'], arrays['x'], arrays['y'],
+                    arrays['u'][valid], arrays['v'][valid], arrays['travel_time'][valid], arrays['length'][valid])
+        for name, values in (extra_weights or {}).items():
+            graph.add_weight(name, np.asarray(values)[valid])
+        return graph
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def add_weight(self, name, values):
+        """
+        Attach another cost to the edges, searchable as `weight=name`.
+
+        Parallel edges are reduced to the cheapest one under this cost, which
+        need not be the fastest one under `travel_time` (e.g. a motorway
+        slower than the side road during the rush hour). Route lengths still
+        come from the fastest edge.
+
+        param name: The name of the cost, e.g. a time bucket's travel time attribute.
+        param values: The cost of every edge, in the order of the edge list the graph was built from.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != self.edge_positions.shape:
+            raise ValueError(f"Expected {len(self.edge_positions)} edge values for {name!r}, got {values.shape}")
+        reduced = np.full(self.num_edges, np.inf)
+        np.minimum.at(reduced, self.edge_positions, values)
+        self.weights[name] = reduced.astype(np.float32)
+        for key in [key for key in self._matrices if key[0] == name]:
+            del self._matrices[key]
+
+    def costs(self, weight='travel_time'):
+        """
+        Return the cost of every edge, in CSR edge order.
+
+        param weight: 'travel_time', 'length' or a name given to `add_weight`.
+        """
+        return self.weights[weight] if weight in self.weights else getattr(self, weight)
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def index_of(self, nodes):
+        """
+        Map OSM node ids to CSR indices.
+
+        param nodes: An OSM node id or an array of them.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        positions = np.searchsorted(self.node_ids, nodes)
+        if np.any(positions >= len(self.node_ids)) or np.any(self.node_ids[np.minimum(positions, len(self.node_ids) - 1)] != nodes):
+            raise KeyError("Node not in graph")
+        return positions
+
+    def matrix(self, weight='travel_time', reverse=False):
+        """
+        Return the graph as a scipy sparse matrix weighted by `weight` ('travel_time', 'length' or an added weight).
+
+        param weight: The edge attribute used as cost.
+        param reverse: Return the graph with every edge reversed, to search towards a node.
+        """
+        if (weight, reverse) not in self._matrices:
+            if reverse:
+                self._matrices[weight, reverse] = self.matrix(weight).transpose().tocsr()
+            else:
+                self._matrices[weight, reverse] = csr_matrix(
+                    (self.costs(weight).astype(np.float64), self.targets, self.offsets),
+                    shape=(len(self), len(self))
+                )
+        return self._matrices[weight, reverse]
+
+    def travel_times(self, sources, targets, weight='travel_time', chunk_size=64, tree_callback=None, reverse=False):
+        """
+        Compute the cost from every source to every target (OSM ids), `inf` when unreachable.
+
+        Sources are searched in chunks so memory stays at `chunk_size` rows of the full graph.
+
+        param sources: The OSM ids of the origins.
+        param targets: The OSM ids of the destinations.
+        param weight: The edge attribute used as cost.
+        param chunk_size: The number of sources searched per batch.
+        param tree_callback: Optional function called with (source OSM id, predecessor array) for every
+            source, to keep the shortest-path trees without searching again.
+        param reverse: Search the reversed graph, giving the cost from every target to every source.
+        """
+        source_positions = self.index_of(sources)
+        target_positions = self.index_of(targets)
+        result = np.empty((len(source_positions), len(target_positions)))
+        for start in range(0, len(source_positions), chunk_size):
+            chunk = source_positions[start:start + chunk_size]
+            output = dijkstra(self.matrix(weight, reverse), directed=True, indices=chunk,
+                              return_predecessors=tree_callback is not None)
+            dist = output[0] if tree_callback is not None else output
+            result[start:start + chunk_size] = dist[:, target_positions]
+            if tree_callback is not None:
+                for source, predecessors in zip(self.node_ids[chunk].tolist(), output[1]):
+                    tree_callback(source, predecessors.astype(np.int32))
+        return result
+
+    def neighbor_travel_times(self, sources, neighbors, weight='travel_time', limits=None, chunk_size=64):
+        """
+        Compute the cost from every source to its own list of neighbors, `inf` when unreachable or beyond the limit.
+
+        Each search stops at the chunk's largest limit, so a sparse neighbor
+        list never explores the whole graph.
+
+        param sources: The OSM ids of the origins, shape (n,).
+        param neighbors: The OSM ids of each origin's neighbors, shape (n, k).
+        param weight: The edge attribute used as cost.
+        param limits: Optional search bound of each origin, shape (n,).
+        param chunk_size: The number of sources searched per batch.
+        """
+        source_positions = self.index_of(sources)
+        neighbor_positions = self.index_of(neighbors).reshape(len(source_positions), -1)
+        limits = np.full(len(source_positions), np.inf) if limits is None else np.asarray(limits, dtype=float)
+        result = np.empty(neighbor_positions.shape)
+        # Sources with similar limits are searched together, so one far-reaching source does not widen a whole chunk
+        order = np.argsort(limits, kind='stable')
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start + chunk_size]
+            dist = dijkstra(self.matrix(weight), directed=True, indices=source_positions[chunk],
+                            limit=float(limits[chunk].max()))
+            rows = np.arange(len(chunk))[:, None]
+            result[chunk] = dist[rows, neighbor_positions[chunk]]
+        return np.where(result <= limits[:, None], result, np.inf)
+
+    def path_costs(self, sources, targets, weights, weight='travel_time', limits=None, chunk_size=64, reverse=False):
+        """
+        Search the fastest path from every source to each of its targets once, then sum other costs along it.
+
+        One search per source on `weight` gives the paths; every cost of
+        `weights` is then summed over their edges by walking the predecessor
+        arrays, for all targets of a chunk at once. Extra costs add array
+        sums, not searches.
+
+        Returns an array of shape (len(weights), n, m), `inf` where the target
+        is unreachable or beyond the limit.
+
+        param sources: The OSM ids of the origins, shape (n,).
+        param targets: The OSM ids of each origin's targets, shape (n, m).
+        param weights: The edge costs summed along the paths ('travel_time', 'length' or added weights).
+        param weight: The edge cost the paths are searched on.
+        param limits: Optional search bound of each origin, in `weight`, shape (n,).
+        param chunk_size: The number of sources searched per batch.
+        param reverse: Search the reversed graph: the paths go from every target to its source.
+        """
+        source_positions = self.index_of(sources)
+        target_positions = self.index_of(targets).reshape(len(source_positions), -1)
+        limits = np.full(len(source_positions), np.inf) if limits is None else np.asarray(limits, dtype=float)
+        costs = np.stack([self.costs(name).astype(np.float64) for name in weights])
+        result = np.full((len(weights),) + target_positions.shape, np.inf)
+        order = np.argsort(limits, kind='stable')
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start + chunk_size]
+            roots = source_positions[chunk][:, None]
+            dist, predecessors = dijkstra(self.matrix(weight, reverse), directed=True, indices=roots[:, 0],
+                                          limit=float(limits[chunk].max()), return_predecessors=True)
+            node = target_positions[chunk].copy()
+            reached = dist[np.arange(len(chunk))[:, None], node] <= limits[chunk][:, None]
+            totals = np.zeros((len(weights),) + node.shape)
+            # Walk all the paths of the chunk back to their root together, one edge per step
+            rows, columns = np.nonzero(reached & (node != roots))
+            while len(rows):
+                child = node[rows, columns]
+                parent = predecessors[rows, child]
+                edges = self._edge_index(child, parent) if reverse else self._edge_index(parent, child)
+                totals[:, rows, columns] += costs[:, edges]
+                node[rows, columns] = parent
+                walking = parent != roots[rows, 0]
+                rows, columns = rows[walking], columns[walking]
+            result[:, chunk] = np.where(reached, totals, np.inf)
+        return result
+
+    def shortest_path_tree(self, source, weight='travel_time', limit=np.inf):
+        """
+        Return the predecessor array of the shortest-path tree rooted at `source` (-9999 where unreachable).
+
+        param source: The OSM id of the root.
+        param weight: The edge attribute used as cost.
+        param limit: The search stops at this cost, nodes further away are left out of the tree.
+        """
+        _, predecessors = dijkstra(self.matrix(weight), directed=True, indices=self.index_of(source),
+                                   return_predecessors=True, limit=limit)
+        return predecessors.astype(np.int32)
+
+    def tree_path(self, predecessors, source, target):
+        """
+        Walk the back-pointers of a shortest-path tree, returning the path as a list of OSM ids.
+
+        param predecessors: The predecessor array of the tree rooted at `source`.
+        param source: The OSM id of the root.
+        param target: The OSM id of the destination.
+        """
+        source, node = self.index_of([source, target]).tolist()
+        path = [node]
+        while node != source:
+            node = int(predecessors[node])
+            if node < 0:
+                raise NoPathError(f"No path between {self.node_ids[source]} and {self.node_ids[path[0]]}")
+            path.append(node)
+        return self.node_ids[path[::-1]].tolist()
+
+    def shortest_path(self, source, target, weight='travel_time'):
+        """
+        Find the fastest path between two nodes with A*, returned as a list of OSM ids.
+
+        The heuristic is the great-circle distance divided by the fastest edge
+        speed of the graph, so it never overestimates.
+
+        param source: The OSM id of the origin.
+        param target: The OSM id of the destination.
+        param weight: The edge attribute used as cost ('travel_time' or 'length').
+        """
+        source, target = self.index_of([source, target]).tolist()
+        costs = self.costs(weight)
+        if weight == 'length':
+            speed = 1.0
+        else:
+            moving = costs > 0
+            speed = float(np.max(self.length[moving] / costs[moving])) if np.any(moving) else 1.0
+        target_lat, target_lon = self.y[target], self.x[target]
+
+        def heuristic(node):
+            return haversine(self.y[node], self.x[node], target_lat, target_lon) / speed
+
+        predecessors = {source: -1}
+        best = {source: 0.0}
+        settled = set()
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, d, node = heapq.heappop(heap)
+            if node == target:
+                path = []
+                while node != -1:
+                    path.append(node)
+                    node = predecessors[node]
+                return self.node_ids[path[::-1]].tolist()
+            if node in settled:
+                continue
+            settled.add(node)
+            start, end = self.offsets[node], self.offsets[node + 1]
+            for neighbor, cost in zip(self.targets[start:end].tolist(), costs[start:end].tolist()):
+                nd = d + cost
+                if neighbor not in settled and nd < best.get(neighbor, np.inf):
+                    best[neighbor] = nd
+                    predecessors[neighbor] = node
+                    heapq.heappush(heap, (nd + heuristic(neighbor), nd, neighbor))
+
+        raise NoPathError(f"No path between {self.node_ids[source]} and {self.node_ids[target]}")
+
+    def route_edge_attributes(self, route, attribute):
+        """
+        Return the attribute of every edge along a route, like `ox.utils_graph.get_route_edge_attributes`.
+
+        param route: A list of OSM node ids.
+        param attribute: 'travel_time', 'length' or a name given to `add_weight`.
+        """
+        positions = self.index_of(route)
+        return self.costs(attribute)[self._edge_index(positions[:-1], positions[1:])].astype(np.float64)
+
+    def _edge_index(self, sources, targets):
+        # CSR position of the edge between every (source, target) pair of node indices, which must exist
+        if self._edge_keys is None:
+            # Edges are sorted by source then target, so their (source, target) keys are sorted too
+            edge_sources = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+            self._edge_keys = edge_sources * len(self) + self.targets
+        return np.searchsorted(self._edge_keys, np.asarray(sources, dtype=np.int64) * len(self) + targets)
+
+    def route_coords(self, route):
+        """
+        Return the (latitude, longitude) of every node along a route, for folium drawing.
+
+        param route: A list of OSM node ids.
+        """
+        positions = self.index_of(route)
+        return list(zip(self.y[positions].tolist(), self.x[positions].tolist()))
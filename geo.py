@@ -0,0 +1,61 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371009  # Mean earth radius, same value as osmnx
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in meters between points given in degrees (scalars or broadcastable arrays).
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def haversine_matrix(coords_from, coords_to=None):
+    """
+    Great-circle distance in meters between every pair of (latitude, longitude) points.
+
+    param coords_from: Array of shape (n, 2).
+    param coords_to: Array of shape (m, 2), defaults to `coords_from`.
+    """
+    coords_from = np.asarray(coords_from, dtype=float)
+    coords_to = coords_from if coords_to is None else np.asarray(coords_to, dtype=float)
+    return haversine(coords_from[:, None, 0], coords_from[:, None, 1], coords_to[None, :, 0], coords_to[None, :, 1])
+
+
+def local_xy(coords):
+    """
+    Project (latitude, longitude) points to local planar coordinates in meters.
+
+    An equirectangular projection around the points' mean latitude is accurate
+    enough at city scale and keeps distances in meters instead of degrees.
+
+    param coords: Array of (latitude, longitude).
+    """
+    coords = np.radians(np.asarray(coords, dtype=float))
+    x = coords[:, 1] * np.cos(coords[:, 0].mean()) * EARTH_RADIUS_M
+    y = coords[:, 0] * EARTH_RADIUS_M
+    return np.column_stack([x, y])
+
+
+def nearest_neighbors(coords, k):
+    """
+    Find the `k` nearest other points of every point by great-circle distance.
+
+    Returns the neighbor indices and their distances in meters, both of shape
+    (n, k) and sorted by distance.
+
+    param coords: Array of (latitude, longitude), shape (n, 2).
+    param k: The number of neighbors per point (capped at n - 1).
+    """
+    from sklearn.neighbors import BallTree
+
+    coords = np.radians(np.asarray(coords, dtype=float))
+    k = min(k, len(coords) - 1)
+    distances, neighbors = BallTree(coords, metric='haversine').query(coords, k=k + 1)
+
+    # Drop each point from its own list, or the furthest neighbor when duplicates pushed it out of first place
+    keep = neighbors != np.arange(len(coords))[:, None]
+    keep[keep.all(axis=1), -1] = False
+    return neighbors[keep].reshape(-1, k), distances[keep].reshape(-1, k) * EARTH_RADIUS_M
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Base URLs of the OpenStreetMap services, overridable to target a mirror, a self-hosted server or a local stand-in
+OVERPASS_URL = os.environ.get('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+USER_AGENT = 'Project-DPD/1.0 (delivery route planner)'
+# Requests per second: the public Nominatim allows 1, a self-hosted server much more
+NOMINATIM_RATE = float(os.environ.get('NOMINATIM_RATE', 1.0))
+DEFAULT_CONCURRENCY = 4  # Requests in flight at once
+
+DEFAULT_GEO_CACHE = os.path.join('graph_cache', 'geo_responses.sqlite')
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0  # seconds, doubled after every failed attempt
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def normalize_params(params):
+    """
+    Normalize query parameters so that equivalent queries share a cache entry.
+
+    Parameters are sorted, whitespace runs in strings (e.g. the layout of an
+    Overpass query) collapse to one space and coordinates are rounded to 6
+    decimals (about 10 cm).
+
+    param params: The query parameters.
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return ' '.join(value.split())
+        if isinstance(value, float):
+            return round(value, 6)
+        return value
+
+    return {str(key): normalize(value) for key, value in sorted(params.items())}
+
+
+def cache_key(url, params):
+    """
+    Build the cache key of a query: a digest of its URL and normalized parameters.
+
+    param url: The endpoint.
+    param params: The query parameters.
+    """
+    query = json.dumps({'url': url.rstrip('/'), 'params': normalize_params(params)}, sort_keys=True)
+    return hashlib.sha1(query.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of geo-service JSON responses, stored in a local SQLite file.
+
+    Entries are keyed by `cache_key` and expire after `max_age_days`, so that
+    OpenStreetMap edits eventually show up. It can be used from several threads.
+    """
+
+    def __init__(self, path=DEFAULT_GEO_CACHE, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        param path: The SQLite file holding the cache.
+        param max_age_days: The age after which a response is fetched again.
+        """
+        self.path = path
+        self.max_age = max_age_days * 86400
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                body TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key):
+        """
+        Return the cached response body of `key`, or None when missing or expired.
+
+        param key: The query key, see `cache_key`.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT fetched, body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > self.max_age:
+            return None
+        return json.loads(row[1])
+
+    def put(self, key, url, body):
+        """
+        Save a response body.
+
+        param key: The query key, see `cache_key`.
+        param url: The endpoint, kept for inspection.
+        param body: The decoded JSON response.
+        """
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                    (key, url, time.time(), json.dumps(body)))
+
+
+class RateLimiter:
+    """
+    Space calls at least `1 / rate` seconds apart, across all the threads sharing the limiter.
+    """
+
+    def __init__(self, rate=None):
+        """
+        param rate: The maximum number of calls per second, None for no limit.
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        # Book the next free slot, then sleep outside the lock until it comes
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _retry_after(response):
+    # Retry-After in seconds; the HTTP-date form is left to the backoff
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+
+
+class GeoClient:
+    """
+    HTTP client shared by the Overpass and Nominatim lookups.
+
+    Requests go through one pooled `requests.Session`, failed requests
+    (connection errors, timeouts, 429 and 5xx answers) are retried with
+    exponential backoff, and successful responses are cached on disk: a repeated
+    lookup makes no network call. The client is thread-safe; network requests
+    of all threads together stay under `rate` per second (cache hits are free).
+    """
+
+    def __init__(self, overpass_url=OVERPASS_URL, nominatim_url=NOMINATIM_URL, cache_path=DEFAULT_GEO_CACHE,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, user_agent=USER_AGENT,
+                 rate=NOMINATIM_RATE, pool_size=DEFAULT_CONCURRENCY):
+        """
+        param overpass_url: The Overpass API interpreter endpoint.
+        param nominatim_url: The base URL of the Nominatim server.
+        param cache_path: The response cache file, None to disable caching.
+        param timeout: The timeout of every request in seconds.
+        param retries: The number of retries after a failed request.
+        param backoff: The wait before the first retry in seconds, doubled after every failure.
+        param user_agent: The User-Agent header, required by the OpenStreetMap usage policies.
+        param rate: The maximum number of requests per second, None for no limit.
+        param pool_size: The number of pooled connections per server, at least the number of threads using the client.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.overpass_url = overpass_url
+        self.nominatim_url = nominatim_url.rstrip('/')
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _fetch(self, url, params):
+        import requests
+
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                with self._lock:
+                    self.requests += 1
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                # Honour the server's Retry-After when it is longer than the backoff
+                delay = max(self.backoff * 2 ** attempt, _retry_after(response))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            time.sleep(delay)
+
+    def get_json(self, url, params):
+        """
+        Return the JSON response of a GET query, from the cache when it was already made.
+
+        Raises the `requests` exception of the last attempt when every retry failed.
+
+        param url: The endpoint.
+        param params: The query parameters.
+        """
+        key = cache_key(url, params)
+        if self.cache is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                with self._lock:
+                    self.hits += 1
+                return body
+        body = self._fetch(url, params)
+        if self.cache is not None:
+            self.cache.put(key, url, body)
+        return body
+
+    def overpass(self, query):
+        """
+        Run an Overpass QL query and return its JSON result.
+
+        param query: The query, with `[out:json]`.
+        """
+        return self.get_json(self.overpass_url, {'data': query})
+
+    def reverse(self, latitude, longitude, zoom=18):
+        """
+        Reverse-geocode a point with Nominatim.
+
+        Returns the Nominatim place (dict with `display_name`, `lat`, `lon`...)
+        or None when there is no address there.
+
+        param latitude: The latitude of the point.
+        param longitude: The longitude of the point.
+        param zoom: The level of detail, 18 for buildings.
+        """
+        place = self.get_json(f"{self.nominatim_url}/reverse",
+                              {'lat': round(float(latitude), 6), 'lon': round(float(longitude), 6), 'zoom': zoom,
+                               'format': 'jsonv2'})
+        return None if 'error' in place else place
+
+    def stats(self):
+        return f"{self.requests} requests, {self.hits} cache hits"
+
+
+_default_client = None
+
+
+def default_client():
+    """
+    Return the client shared by the whole process, created on first use with the default settings.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = GeoClient()
+    return _default_client
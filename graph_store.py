@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+GRAPH_STORE_VERSION = 1  # Bump when the on-disk layout or the stored attributes change
+DEFAULT_CACHE_DIR = 'graph_cache'
+DEFAULT_MAX_AGE_DAYS = 30
+
+NODE_ARRAYS = ('node_id', 'x', 'y')
+EDGE_ARRAYS = ('u', 'v', 'key', 'length', 'travel_time', 'highway', 'maxspeed')
+
+
+def graph_key(center, radius_km, network_type, places=None):
+    """
+    Build the cache key identifying a road graph.
+
+    param center: A tuple containing the latitude and longitude of the area center.
+    param radius_km: The radius of the area in kilometers.
+    param network_type: The osmnx network type ('drive', 'walk'...).
+    param places: Optional list of place names the graph was built from.
+    """
+    params = {
+        'center': [round(float(center[0]), 6), round(float(center[1]), 6)],
+        'radius_km': float(radius_km),
+        'network_type': network_type,
+        'places': sorted(places) if places else None,
+        'version': GRAPH_STORE_VERSION,
+    }
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{network_type}_{digest}", params
+
+
+def _first(value, default=''):
+    # osmnx merges attributes of simplified edges into lists, keep the first one
+    if isinstance(value, list):
+        value = value[0] if value else default
+    return default if value is None else value
+
+
+def graph_to_arrays(G):
+    """
+    Convert a road graph into the flat arrays stored on disk.
+
+    Only what the routing pipeline uses is kept: node coordinates, edge length,
+    travel time, road class and speed limit.
+
+    param G: The annotated road graph (MultiDiGraph).
+    """
+    nodes = list(G.nodes(data=True))
+    edges = list(G.edges(keys=True, data=True))
+    return {
+        'node_id': np.array([node for node, _ in nodes], dtype=np.int64),
+        'x': np.array([data['x'] for _, data in nodes], dtype=np.float64),
+        'y': np.array([data['y'] for _, data in nodes], dtype=np.float64),
+        'u': np.array([u for u, _, _, _ in edges], dtype=np.int64),
+        'v': np.array([v for _, v, _, _ in edges], dtype=np.int64),
+        'key': np.array([k for _, _, k, _ in edges], dtype=np.int64),
+        'length': np.array([data.get('length', np.nan) for *_, data in edges], dtype=np.float64),
+        'travel_time': np.array([data.get('travel_time', np.nan) for *_, data in edges], dtype=np.float64),
+        'highway': np.array([str(_first(data.get('highway'))) for *_, data in edges], dtype=str),
+        'maxspeed': np.array([str(_first(data.get('maxspeed'))) for *_, data in edges], dtype=str),
+    }
+
+
+def arrays_to_graph(arrays, graph_attrs=None):
+    """
+    Rebuild a networkx MultiDiGraph from the stored arrays.
+
+    param arrays: A dict of node and edge arrays, as produced by `graph_to_arrays`.
+    param graph_attrs: Optional graph-level attributes (crs...).
+    """
+    import networkx as nx
+
+    G = nx.MultiDiGraph(**(graph_attrs or {}))
+    G.add_nodes_from(
+        (node, {'x': x, 'y': y})
+        for node, x, y in zip(arrays['node_id'].tolist(), arrays['x'].tolist(), arrays['y'].tolist())
+    )
+
+    edge_columns = [arrays[name].tolist() for name in EDGE_ARRAYS]
+    for u, v, key, length, travel_time, highway, maxspeed in zip(*edge_columns):
+        data = {'length': length, 'travel_time': travel_time}
+        if highway:
+            data['highway'] = highway
+        if maxspeed:
+            data['maxspeed'] = maxspeed
+        G.add_edge(u, v, key=key, **data)
+    return G
+
+
+class GraphStore:
+    """
+    Persistent on-disk cache of annotated road graphs.
+
+    Each graph is stored in its own directory as one `.npy` file per array plus a
+    `meta.json`, so arrays can be memory-mapped on load and a populated cache
+    works without any network access. Entries saved with `pinned=True` (e.g.
+    the pre-baked graphs under fixtures/) never go stale and are never rebuilt.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        param cache_dir: The directory holding the cached graphs.
+        param max_age_days: Age after which a cached graph is rebuilt (if the network is reachable).
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age_days * 24 * 3600
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def metadata(self, key):
+        """
+        Return the metadata of a cached graph, or None if it is not in the cache.
+
+        param key: The cache key, as returned by `graph_key`.
+        """
+        meta_path = os.path.join(self.path(key), 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != GRAPH_STORE_VERSION:
+            return None
+        return meta
+
+    def is_fresh(self, key):
+        meta = self.metadata(key)
+        return meta is not None and (meta.get('pinned', False) or time.time() - meta['created'] <= self.max_age)
+
+    def load_arrays(self, key, mmap_mode='r'):
+        """
+        Load the raw arrays of a cached graph, memory-mapped by default.
+
+        param key: The cache key.
+        param mmap_mode: Passed to `np.load`, None to read the arrays into memory.
+        """
+        path = self.path(key)
+        return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                for name in NODE_ARRAYS + EDGE_ARRAYS}
+
+    def load(self, key):
+        """
+        Load a cached graph as a networkx MultiDiGraph.
+
+        param key: The cache key.
+        """
+        meta = self.metadata(key)
+        if meta is None:
+            raise KeyError(f"No cached graph for key {key}")
+        return arrays_to_graph(self.load_arrays(key), meta.get('graph'))
+
+    def save(self, key, G, **metadata):
+        """
+        Save an annotated graph in the cache, replacing any previous entry.
+
+        param key: The cache key.
+        param G: The annotated road graph.
+        param metadata: Extra JSON-serializable information stored with the graph (params, places...).
+        """
+        path = self.path(key)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for name, array in graph_to_arrays(G).items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+
+        meta = {
+            'version': GRAPH_STORE_VERSION,
+            'created': time.time(),
+            'nodes': G.number_of_nodes(),
+            'edges': G.number_of_edges(),
+            'graph': {name: value for name, value in G.graph.items() if isinstance(value, (str, int, float, bool, list))},
+            **metadata,
+        }
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, default=str)
+
+        # Swap the new entry in only once it is complete
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    def ensure(self, key, build, **metadata):
+        """
+        Make sure `key` is cached, building and caching the graph first if needed.
+
+        A stale entry is rebuilt, but still used if the rebuild fails (e.g. offline).
+
+        param key: The cache key.
+        param build: A function returning the annotated graph, only called on a cache miss.
+        param metadata: Extra information stored with a newly built graph.
+        """
+        if self.is_fresh(key):
+            return
+
+        try:
+            G = build()
+        except Exception as e:
+            if self.metadata(key) is None:
+                raise
+            print(f"Failed to rebuild graph {key}, using the stale cached copy: {e}")
+            return
+
+        self.save(key, G, **metadata)
+
+    def load_or_build(self, key, build, **metadata):
+        """
+        Return the cached graph for `key` as a networkx graph, building and caching it first if needed.
+
+        param key: The cache key.
+        param build: A function returning the annotated graph, only called on a cache miss.
+        param metadata: Extra information stored with a newly built graph.
+        """
+        self.ensure(key, build, **metadata)
+        # Reload so a fresh build and a cache hit give the exact same pruned graph
+        return self.load(key)
@@ -0,0 +1,202 @@
+import math
+import numpy as np
+from clustering import balanced_clusters
+from matrix_engine import DEFAULT_NEIGHBORS, sparse_travel_times
+from parallel import shared, split, worker_pool
+from tsp_solver.greedy import solve_tsp
+
+# Hierarchical mode for very large days (5,000+ stops), where a dense matrix no longer fits:
+# sectors -> vehicles -> one TSP per vehicle, over sparse k-nearest-neighbor travel times.
+
+LARGE_INSTANCE_STOPS = 5000  # Above this number of stops the dense matrix is skipped
+DEFAULT_SECTOR_SIZE = 1000  # Target number of stops per sector
+DEFAULT_MEMORY_LIMIT = 2 * 2**30  # Bytes for the neighbor lists, searches and per-vehicle matrices
+
+
+def memory_plan(num_stops, num_graph_nodes, num_vehicles, k, workers=1, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """
+    Check that a large instance fits in `memory_limit` bytes and return the search chunk size to use.
+
+    Counts the neighbor lists, one dense matrix per vehicle being solved and
+    the distance rows of a search chunk; raises MemoryError when the fixed
+    part alone does not fit.
+
+    param num_stops: The number of stops, depot included.
+    param num_graph_nodes: The number of road graph nodes.
+    param num_vehicles: The number of vehicles.
+    param k: The number of neighbors per stop.
+    param workers: The number of vehicles solved at the same time.
+    param memory_limit: The memory ceiling in bytes.
+    """
+    neighbor_bytes = num_stops * k * 16 + num_stops * 16
+    stops_per_vehicle = math.ceil(num_stops / num_vehicles) + 1
+    # The dense matrix plus the temporaries of the great-circle estimate
+    vehicle_bytes = workers * stops_per_vehicle ** 2 * 8 * 4
+    fixed = neighbor_bytes + vehicle_bytes
+    row_bytes = 16 * num_graph_nodes  # Distance row plus the gathered neighbor costs
+    if fixed + row_bytes > memory_limit:
+        raise MemoryError(f"Instance needs at least {(fixed + row_bytes) / 2**20:.1f} MiB, "
+                          f"over the {memory_limit / 2**20:.0f} MiB limit (use more vehicles or fewer neighbors)")
+    chunk_size = int(min(256, (memory_limit - fixed) // row_bytes))
+    return chunk_size, fixed + chunk_size * row_bytes
+
+
+def _vehicle_tour(travel, depot, stops):
+    indices = [depot] + list(stops)
+    path = solve_tsp(travel.sub_matrix(indices))
+    # The solver returns an open path: close it and start it at the depot
+    start = path.index(0)
+    return [indices[i] for i in path[start:] + path[:start]] + [depot]
+
+
+def _vehicle_tour_worker(depot, stops):
+    # Runs in a worker process, the sparse travel times are shared by the pool
+    return _vehicle_tour(shared('travel'), depot, stops)
+
+
+def repair_boundaries(routes, route_sectors, travel, demands, capacities, max_passes=2):
+    """
+    Move stops lying on a sector boundary into a route of the adjacent sector when that shortens the plan.
+
+    A stop is on a boundary when one of its nearest neighbors belongs to
+    another sector. Each such stop is removed from its route and inserted at
+    the cheapest position of a neighboring sector's route with room left, if
+    the insertion costs less than the removal saves.
+
+    Returns the number of stops moved; `routes` is updated in place.
+
+    param routes: The routes (stop indices, depot first and last).
+    param route_sectors: The sector of every route.
+    param travel: The `SparseTravelTimes` of the instance.
+    param demands: Demand of each stop.
+    param capacities: Capacity of each vehicle.
+    param max_passes: The maximum number of passes over the boundary stops.
+    """
+    demands = np.asarray(demands, dtype=float)
+    route_sectors = np.asarray(route_sectors)
+    stop_route = np.full(len(travel.coords), -1)
+    for r, route in enumerate(routes):
+        stop_route[route[1:-1]] = r
+    loads = np.array([demands[route[1:-1]].sum() for route in routes])
+
+    moves = 0
+    for _ in range(max_passes):
+        moved = False
+        stop_sectors = np.where(stop_route >= 0, route_sectors[stop_route], -1)
+        neighbor_sectors = stop_sectors[travel.neighbors]
+        boundary = np.flatnonzero((stop_route >= 0) & ((neighbor_sectors != stop_sectors[:, None]) & (neighbor_sectors >= 0)).any(axis=1))
+
+        for stop in boundary.tolist():
+            r = stop_route[stop]
+            route = routes[r]
+            position = route.index(stop)
+            before, after = route[position - 1], route[position + 1]
+            saving = travel.pair_costs(before, stop) + travel.pair_costs(stop, after) - travel.pair_costs(before, after)
+
+            best = None
+            for candidate in set(stop_route[travel.neighbors[stop]].tolist()):
+                if candidate < 0 or route_sectors[candidate] == route_sectors[r]:
+                    continue
+                if loads[candidate] + demands[stop] > capacities[candidate]:
+                    continue
+                target = np.asarray(routes[candidate])
+                extra = (travel.pair_costs(target[:-1], stop) + travel.pair_costs(stop, target[1:])
+                         - travel.pair_costs(target[:-1], target[1:]))
+                slot = int(np.argmin(extra))
+                if best is None or extra[slot] < best[0]:
+                    best = (extra[slot], candidate, slot)
+
+            if best is not None and best[0] < saving - 1e-6:
+                _, candidate, slot = best
+                route.pop(position)
+                routes[candidate].insert(slot + 1, stop)
+                stop_route[stop] = candidate
+                loads[r] -= demands[stop]
+                loads[candidate] += demands[stop]
+                moves += 1
+                moved = True
+        if not moved:
+            break
+    return moves
+
+
+def solve_hierarchical(G, nodes, coords, num_vehicles, vehicle_capacities, demands=None, depot=0,
+                       sector_size=DEFAULT_SECTOR_SIZE, k=DEFAULT_NEIGHBORS, memory_limit=DEFAULT_MEMORY_LIMIT,
+                       repair_passes=2, workers=1):
+    """
+    Plan a very large day by decomposition: sectors, then vehicles inside each sector, then one TSP per vehicle.
+
+    Only sparse kNN travel times are computed (O(n * k) memory), sectors and
+    vehicles are balanced against the capacities, each vehicle's TSP is an
+    independent sub-problem (solved in a process pool with `workers` > 1) and
+    a boundary repair pass then moves stops between adjacent sectors.
+
+    Returns the routes (stop indices, depot first and last, one per vehicle),
+    the `SparseTravelTimes` and a dict of statistics.
+
+    param G: The road graph (networkx graph or `CSRGraph`).
+    param nodes: The graph node of every stop, depot included.
+    param coords: Array of (latitude, longitude) of every stop.
+    param num_vehicles: The number of vehicles.
+    param vehicle_capacities: Capacity of each vehicle.
+    param demands: Demand of each stop, depot included (default 1, 0 for the depot).
+    param depot: The index of the depot.
+    param sector_size: The target number of stops per sector.
+    param k: The number of neighbors per stop.
+    param memory_limit: The memory ceiling in bytes, see `memory_plan`.
+    param repair_passes: The maximum number of boundary repair passes (0 to skip).
+    param workers: The number of processes solving the per-vehicle TSPs.
+    """
+    coords = np.asarray(coords, dtype=float)
+    num_points = len(coords)
+    if demands is None:
+        demands = np.ones(num_points)
+        demands[depot] = 0
+    demands = np.asarray(demands, dtype=float)
+    capacities = np.asarray(vehicle_capacities, dtype=float)
+
+    chunk_size, peak_bytes = memory_plan(num_points, len(G), num_vehicles, k, workers, memory_limit)
+    travel = sparse_travel_times(G, nodes, coords, k=k, depot=depot, chunk_size=chunk_size)
+
+    # Sectors: groups of vehicles sharing a region, balanced against the group capacities
+    stops = np.delete(np.arange(num_points), depot)
+    num_sectors = max(1, min(num_vehicles, round(len(stops) / sector_size)))
+    groups = [np.array(group) for group in split(list(range(num_vehicles)), num_sectors)]
+    sector_labels = balanced_clusters(coords[stops], [capacities[group].sum() for group in groups], demands[stops])
+
+    # Vehicles inside each sector, with the planar proxy: a sector's dense matrix is what this mode avoids
+    vehicle_stops = [[] for _ in range(num_vehicles)]
+    route_sectors = np.empty(num_vehicles, dtype=int)
+    for sector, group in enumerate(groups):
+        members = stops[sector_labels == sector]
+        route_sectors[group] = sector
+        if not len(members):
+            continue
+        labels = balanced_clusters(coords[members], capacities[group], demands[members]) if len(group) > 1 \
+            else np.zeros(len(members), dtype=int)
+        for position, vehicle in enumerate(group):
+            vehicle_stops[vehicle] = members[labels == position].tolist()
+
+    tours = [vehicle for vehicle in range(num_vehicles) if vehicle_stops[vehicle]]
+    if workers > 1 and len(tours) > 1:
+        with worker_pool(min(workers, len(tours)), travel=travel) as pool:
+            solved = list(pool.map(_vehicle_tour_worker, [depot] * len(tours), [vehicle_stops[v] for v in tours]))
+    else:
+        solved = [_vehicle_tour(travel, depot, vehicle_stops[vehicle]) for vehicle in tours]
+    routes = [[depot, depot] for _ in range(num_vehicles)]
+    for vehicle, route in zip(tours, solved):
+        routes[vehicle] = route
+
+    cost_before = sum(travel.route_cost(route) for route in routes)
+    moves = repair_boundaries(routes, route_sectors, travel, demands, capacities, repair_passes) if repair_passes else 0
+    stats = {
+        'sectors': num_sectors,
+        'neighbors': travel.neighbors.shape[1],
+        'unresolved_neighbors': int(np.isinf(travel.costs).sum()),
+        'estimated_peak_bytes': peak_bytes,
+        'chunk_size': chunk_size,
+        'repaired_stops': moves,
+        'cost_before_repair': cost_before,
+        'cost': sum(travel.route_cost(route) for route in routes),
+    }
+    return routes, travel, stats
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Manifest columns read by the planner, everything else in the file (address, URL...) is skipped
+ID_COLUMN = 'Package ID'
+LAT_COLUMN = 'lat'
+LON_COLUMN = 'long'
+MANIFEST_DTYPES = {ID_COLUMN: 'string', LAT_COLUMN: 'float64', LON_COLUMN: 'float64'}
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+
+class Manifest:
+    """
+    The packages of a delivery day, stored column-wise.
+
+    `coords` is a float64 array of (latitude, longitude) that is handed as is
+    to the snapping, matrix and solver stages; `columns` holds the optional
+    columns that were present in the file.
+    """
+
+    def __init__(self, ids, coords, columns=None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64)
+        self.columns = columns or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _excel_engine():
+    # The Rust-based calamine reader is many times faster than openpyxl, use it when installed
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return None
+
+
+def read_columns(file_path, dtypes, optional=None):
+    """
+    Read only the given columns of a CSV, Parquet or Excel file, with explicit dtypes.
+
+    param file_path: The manifest file, the format is picked from its extension.
+    param dtypes: Dict of required column -> dtype.
+    param optional: Dict of optional column -> dtype, read when present in the file.
+    """
+    wanted = {**(optional or {}), **dtypes}
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == '.csv':
+        # Column names are only known once the header is read, hence the callable
+        df = pd.read_csv(file_path, usecols=lambda column: column in wanted, dtype=wanted)
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        present = [column for column in wanted if column in pq.read_schema(file_path).names]
+        df = pd.read_parquet(file_path, columns=present)
+    elif extension in EXCEL_EXTENSIONS:
+        df = pd.read_excel(file_path, usecols=lambda column: column in wanted, dtype=wanted, engine=_excel_engine())
+    else:
+        raise ValueError(f"Unsupported manifest format {extension!r}, expected .csv, .parquet or an Excel file")
+
+    missing = [column for column in dtypes if column not in df.columns]
+    if missing:
+        raise ValueError(f"Manifest {file_path} is missing the columns {missing}")
+    return df.astype({column: dtype for column, dtype in wanted.items() if column in df.columns})
+
+
+def invalid_coordinates(coords):
+    """
+    Return a boolean mask of the rows whose coordinates are missing or out of range.
+
+    (0, 0) is flagged too: it is what a failed geocode usually leaves behind.
+
+    param coords: Array of (latitude, longitude).
+    """
+    lat, lon = coords[:, 0], coords[:, 1]
+    valid = np.isfinite(coords).all(axis=1) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180) & ((lat != 0) | (lon != 0))
+    return ~valid
+
+
+def load_manifest(file_path, optional=None, drop_invalid=False):
+    """
+    Load a delivery manifest (CSV, Parquet or Excel) and validate it.
+
+    Only the id and coordinate columns (plus `optional` ones) are read.
+    Validation is vectorized: rows with missing or out-of-range coordinates
+    and duplicated package ids raise a ValueError, or are dropped with a
+    warning when `drop_invalid` is set.
+
+    param file_path: The manifest file.
+    param optional: Dict of optional column -> dtype to load when present.
+    param drop_invalid: Drop invalid rows instead of failing.
+    """
+    df = read_columns(file_path, MANIFEST_DTYPES, optional)
+    coords = df[[LAT_COLUMN, LON_COLUMN]].to_numpy(dtype=np.float64)
+
+    invalid = invalid_coordinates(coords) | df[ID_COLUMN].isna().to_numpy() | df[ID_COLUMN].duplicated().to_numpy()
+    if invalid.any():
+        sample = df.loc[invalid, ID_COLUMN].head(5).tolist()
+        message = f"{invalid.sum()} invalid rows in {file_path} (bad coordinates or duplicated id), e.g. {sample}"
+        if not drop_invalid:
+            raise ValueError(message)
+        print(f"Warning: {message}, dropped")
+        df, coords = df[~invalid], coords[~invalid]
+
+    columns = {column: df[column].to_numpy() for column in (optional or {}) if column in df.columns}
+    return Manifest(df[ID_COLUMN].to_numpy(dtype=object), coords, columns)
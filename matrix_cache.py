@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import time
+import numpy as np
+
+DEFAULT_MATRIX_CACHE = os.path.join('graph_cache', 'travel_times.sqlite')
+DEFAULT_MAX_VERSIONS = 8  # Graph versions kept, the least recently used ones are dropped beyond it
+DEFAULT_MAX_AGE_DAYS = 90  # Graph versions unused for longer are dropped
+
+
+class MatrixCache:
+    """
+    Persistent travel-time cache shared across runs, stored in a local SQLite file.
+
+    Entries are keyed by (graph version, source node, target node). The graph
+    version identifies the cached graph and the speed model it was annotated
+    with, so several graphs (another area, the test fixture...) share the
+    file without seeing each other's costs. Whole versions are dropped when
+    unused for `max_age_days`, or beyond the `max_versions` most recently used.
+    """
+
+    def __init__(self, graph_version, path=DEFAULT_MATRIX_CACHE, max_versions=DEFAULT_MAX_VERSIONS,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        param graph_version: A string identifying the road graph and speed model the costs come from.
+        param path: The SQLite file holding the cache.
+        param max_versions: The number of graph versions kept.
+        param max_age_days: The age after which an unused graph version is dropped.
+        """
+        self.graph_version = graph_version
+        self.path = path
+        self.max_versions = max_versions
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS travel_times (
+                graph_version TEXT NOT NULL,
+                source INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                PRIMARY KEY (graph_version, source, target)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS versions (
+                graph_version TEXT PRIMARY KEY,
+                used REAL NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self._prune()
+
+    def _prune(self):
+        # Mark this version as used, then drop the versions too old or beyond the most recent `max_versions`
+        now = time.time()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)", (self.graph_version, now))
+            self.connection.execute("""
+                DELETE FROM versions WHERE used < ? OR graph_version NOT IN (
+                    SELECT graph_version FROM versions ORDER BY used DESC LIMIT ?)
+            """, (now - self.max_age, self.max_versions))
+            self.connection.execute(
+                "DELETE FROM travel_times WHERE graph_version NOT IN (SELECT graph_version FROM versions)")
+
+    def close(self):
+        self.connection.close()
+
+    def known_sources(self, nodes):
+        """
+        Return a boolean mask telling which nodes already have at least one cached row entry.
+
+        param nodes: A list of graph nodes.
+        """
+        known = {row[0] for row in self.connection.execute(
+            "SELECT DISTINCT source FROM travel_times WHERE graph_version = ?", (self.graph_version,))}
+        return np.array([node in known for node in nodes], dtype=bool)
+
+    def lookup(self, nodes):
+        """
+        Return the cached matrix between `nodes`, with NaN for the pairs that are not cached.
+
+        param nodes: A list of distinct graph nodes.
+        """
+        position = {node: i for i, node in enumerate(nodes)}
+        matrix = np.full((len(nodes), len(nodes)), np.nan)
+
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (node INTEGER PRIMARY KEY)")
+            self.connection.execute("DELETE FROM wanted")
+            self.connection.executemany("INSERT INTO wanted VALUES (?)", ((int(node),) for node in nodes))
+            rows = self.connection.execute("""
+                SELECT t.source, t.target, t.cost FROM travel_times t
+                JOIN wanted s ON t.source = s.node
+                JOIN wanted d ON t.target = d.node
+                WHERE t.graph_version = ?
+            """, (self.graph_version,)).fetchall()
+
+        for source, target, cost in rows:
+            matrix[position[source], position[target]] = cost
+
+        off_diagonal = ~np.eye(len(nodes), dtype=bool)
+        cached = ~np.isnan(matrix) & off_diagonal
+        self.hits += int(cached.sum())
+        self.misses += int(off_diagonal.sum() - cached.sum())
+        return matrix
+
+    def store(self, nodes, matrix, mask):
+        """
+        Save the entries of `matrix` selected by `mask`.
+
+        param nodes: The list of distinct graph nodes indexing the matrix.
+        param matrix: The travel-time matrix between `nodes`.
+        param mask: Boolean array selecting the entries to save (usually the newly computed ones).
+        """
+        sources, targets = np.nonzero(mask)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO travel_times VALUES (?, ?, ?, ?)",
+                ((self.graph_version, int(nodes[i]), int(nodes[j]), float(matrix[i, j]))
+                 for i, j in zip(sources.tolist(), targets.tolist()))
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate)"
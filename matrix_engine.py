@@ -0,0 +1,597 @@
+import heapq
+from collections import OrderedDict
+from itertools import repeat
+import numpy as np
+from csr_graph import CSRGraph, NoPathError
+from geo import haversine, haversine_matrix, nearest_neighbors
+from parallel import shared, split, worker_pool
+
+DEFAULT_MAX_TREE_BYTES = 256 * 2**20  # Memory budget for the stored shortest-path trees
+_DICT_ENTRY_BYTES = 100  # Rough size of one node -> predecessor entry of a networkx tree
+DEFAULT_NEIGHBORS = 16  # Exact travel times kept per stop by the sparse structures
+DEFAULT_SEARCH_SLACK = 2.0  # Neighbor searches stop at this multiple of the straight-line drive time
+
+
+def _edge_weight(G, weight):
+    """
+    Return a function giving the cost of the cheapest edge between two adjacent nodes.
+
+    param G: The road graph (Graph, DiGraph or MultiDiGraph).
+    param weight: The edge attribute used as cost.
+    """
+    if G.is_multigraph():
+        return lambda edges: min(data.get(weight, 1) for data in edges.values())
+    return lambda data: data.get(weight, 1)
+
+
+def single_source_travel_times(G, source, targets=None, weight='travel_time', predecessors=None):
+    """
+    Run a single Dijkstra search from a source node.
+
+    The search stops as soon as every target has been settled, so asking for a
+    handful of delivery nodes does not explore the whole metropolitan graph.
+
+    param G: The road graph.
+    param source: The node to start the search from.
+    param targets: Optional iterable of nodes that must be reached before stopping.
+    param weight: The edge attribute used as cost.
+    param predecessors: Optional dict filled with the back-pointer of every reached node.
+    """
+    edge_weight = _edge_weight(G, weight)
+    remaining = set(targets) if targets is not None else None
+    dist = {}
+    seen = {source: 0.0}
+    heap = [(0.0, source)]
+
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node in dist:
+            continue
+        dist[node] = d
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                break
+        for neighbor, edges in G.adj[node].items():
+            if neighbor in dist:
+                continue
+            nd = d + edge_weight(edges)
+            if nd < seen.get(neighbor, np.inf):
+                seen[neighbor] = nd
+                if predecessors is not None:
+                    predecessors[neighbor] = node
+                heapq.heappush(heap, (nd, neighbor))
+
+    return dist
+
+
+def search_rows(G, sources, targets, weight='travel_time', tree_callback=None, reverse=False):
+    """
+    Compute the cost from every source to every target with one search per source.
+
+    param G: The road graph (networkx graph or `CSRGraph`).
+    param sources: The origin nodes.
+    param targets: The destination nodes.
+    param weight: The edge attribute used as cost.
+    param tree_callback: Optional function called with (source, shortest-path tree) after each search.
+    param reverse: Search the reversed graph, giving the cost from every target to every source.
+    """
+    if isinstance(G, CSRGraph):
+        return G.travel_times(sources, targets, weight=weight, tree_callback=tree_callback, reverse=reverse)
+
+    graph = G.reverse(copy=False) if reverse else G
+    rows = np.full((len(sources), len(targets)), np.inf)
+    for i, source in enumerate(sources):
+        predecessors = {} if tree_callback is not None else None
+        dist = single_source_travel_times(graph, source, targets=targets, weight=weight, predecessors=predecessors)
+        rows[i] = [dist.get(target, np.inf) for target in targets]
+        if tree_callback is not None:
+            tree_callback(source, predecessors)
+    return rows
+
+
+def _search_limits(G, distances, weight, slack=DEFAULT_SEARCH_SLACK):
+    # Bound of each stop's neighbor search: `slack` times the straight-line time to its furthest neighbor,
+    # at the 10th percentile edge speed (slow enough that most real neighbors fall inside the bound)
+    speed = np.percentile(G.length / np.maximum(G.costs(weight), 1e-6), 10) if weight != 'length' else 1.0
+    return slack * distances.max(axis=1) / max(speed, 1e-6) + 60.0  # A minute of margin for stops on the same block
+
+
+def knn_travel_times(G, nodes, coords, k=DEFAULT_NEIGHBORS, weight='travel_time', slack=DEFAULT_SEARCH_SLACK, chunk_size=64):
+    """
+    Compute the exact cost from every stop to its `k` nearest stops (great-circle), without any dense matrix.
+
+    On a `CSRGraph` each search is bounded by `slack` times the straight-line
+    time to the furthest neighbor at the graph's slow speed, so memory and
+    time stay O(n * k). Neighbors beyond the bound come back as `inf` and are
+    left to the caller's fallback estimate.
+
+    Returns the neighbor stop indices and their costs, both of shape (n, k).
+
+    param G: The road graph (networkx graph or `CSRGraph`).
+    param nodes: The graph node of every stop.
+    param coords: Array of (latitude, longitude) of every stop.
+    param k: The number of neighbors per stop.
+    param weight: The edge attribute used as cost.
+    param slack: The search bound, as a multiple of the straight-line drive time.
+    param chunk_size: The number of sources searched per batch (CSR graphs).
+    """
+    nodes = np.asarray(nodes)
+    neighbors, distances = nearest_neighbors(coords, k)
+
+    if isinstance(G, CSRGraph):
+        limits = _search_limits(G, distances, weight, slack)
+        return neighbors, G.neighbor_travel_times(nodes, nodes[neighbors], weight, limits, chunk_size)
+
+    costs = np.empty(neighbors.shape)
+    for i, row in enumerate(neighbors):
+        targets = nodes[row].tolist()
+        dist = single_source_travel_times(G, nodes[i].item(), targets=targets, weight=weight)
+        costs[i] = [dist.get(target, np.inf) for target in targets]
+    return neighbors, costs
+
+
+def _tree_bytes(tree):
+    # Predecessor arrays (CSR) know their size, networkx trees are dicts of about _DICT_ENTRY_BYTES per node
+    return tree.nbytes if isinstance(tree, np.ndarray) else len(tree) * _DICT_ENTRY_BYTES
+
+
+def _search_rows_worker(sources, targets, weight, tree_bytes, reverse):
+    # Runs in a worker process, the graph is shared by the pool instead of being sent with each task.
+    # Only the trees fitting the worker's share of the budget are sent back, the others are searched again if needed
+    trees = {}
+    used = 0
+
+    def keep(source, tree):
+        nonlocal used
+        if used + _tree_bytes(tree) <= tree_bytes:
+            trees[source] = tree
+            used += _tree_bytes(tree)
+
+    rows = search_rows(shared('graph'), sources, targets, weight, keep if tree_bytes > 0 else None, reverse)
+    return rows, trees
+
+
+class PathTreeCache:
+    """
+    Least-recently-used store of shortest-path trees, bounded by an approximate memory budget.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_TREE_BYTES):
+        """
+        param max_bytes: The memory budget in bytes, the oldest trees are evicted beyond it.
+        """
+        self.max_bytes = max_bytes
+        self.trees = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+
+    def __contains__(self, source):
+        return source in self.trees
+
+    def get(self, source):
+        tree, _ = self.trees[source]
+        self.trees.move_to_end(source)
+        return tree
+
+    def put(self, source, tree, nbytes):
+        if source in self.trees:
+            self.size -= self.trees.pop(source)[1]
+        if nbytes > self.max_bytes:
+            return
+        self.trees[source] = (tree, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, (_, evicted_bytes) = self.trees.popitem(last=False)
+            self.size -= evicted_bytes
+            self.evictions += 1
+
+
+class TravelTimeMatrix:
+    """
+    One-to-many travel-time matrix between the graph nodes of a list of stops.
+
+    Each distinct origin node is searched once and fills its whole row, instead
+    of one point-to-point search per ordered pair. Unreachable pairs are `inf`.
+    With a `CSRGraph` the searches run in batches over the compact arrays.
+
+    The shortest-path tree of every search is kept (within `max_tree_bytes`), so
+    the geometry, length and duration of any leg are rebuilt by walking
+    back-pointers instead of searching again.
+
+    With a `MatrixCache`, pairs computed by previous runs are reused: new stops
+    get one forward search (their row) and one search on the reversed graph
+    (their column), and only the missing entries are computed and saved.
+
+    With `workers` > 1 the searches are split across a process pool that shares
+    the graph with its workers; each worker sends back only the trees fitting
+    its share of `max_tree_bytes`, the others are searched again by `leg`.
+    """
+
+    def __init__(self, G, nodes, weight='travel_time', max_tree_bytes=DEFAULT_MAX_TREE_BYTES, cache=None, workers=1):
+        """
+        param G: The road graph (networkx graph or `CSRGraph`), annotated with the `weight` attribute.
+        param nodes: The graph node of every stop, in stop order (depot first).
+        param weight: The edge attribute used as cost.
+        param max_tree_bytes: Memory budget for the stored shortest-path trees, 0 to keep none.
+        param cache: Optional `MatrixCache` shared across runs.
+        param workers: The number of processes running the searches.
+        """
+        self.G = G
+        self.nodes = list(nodes)
+        self.weight = weight
+        self.trees = PathTreeCache(max_tree_bytes)
+        self.cache = cache
+        self.workers = workers
+        self.matrix = self._compute()
+
+    def _store_tree(self, source, tree):
+        self.trees.put(source, tree, _tree_bytes(tree))
+
+    def _search(self, sources, targets, reverse=False):
+        # Forward searches keep their shortest-path trees, reversed ones cannot be used for legs
+        keep_trees = self.trees.max_bytes > 0 and not reverse
+        if self.workers <= 1 or len(sources) < 2:
+            return search_rows(self.G, sources, targets, self.weight,
+                               self._store_tree if keep_trees else None, reverse)
+
+        # Each worker keeps trees within its share of the budget, so the parent never holds more than the budget.
+        # Results come back in submission order, so the matrix does not depend on scheduling
+        tree_bytes = self.trees.max_bytes // self.workers if keep_trees else 0
+        with worker_pool(self.workers, graph=self.G) as pool:
+            results = list(pool.map(_search_rows_worker, split(list(sources), self.workers), repeat(targets),
+                                    repeat(self.weight), repeat(tree_bytes), repeat(reverse)))
+        for _, trees in results:
+            for source, tree in trees.items():
+                self._store_tree(source, tree)
+        return np.vstack([rows for rows, _ in results])
+
+    def _search_rows(self, sources, targets):
+        # One forward search per source
+        return self._search(sources, targets)
+
+    def _search_columns(self, sources, targets):
+        # One search per target on the reversed graph gives the cost from every source to it
+        return self._search(targets, sources, reverse=True).T
+
+    def _compute(self):
+        unique_nodes = list(dict.fromkeys(self.nodes))
+        position = {node: i for i, node in enumerate(unique_nodes)}
+
+        if self.cache is None:
+            unique_matrix = self._search_rows(unique_nodes, unique_nodes)
+        else:
+            unique_matrix = self.cache.lookup(unique_nodes)
+            np.fill_diagonal(unique_matrix, 0.0)
+            missing = np.isnan(unique_matrix)
+
+            # Stops never seen before: their row and their column
+            new = np.flatnonzero(~self.cache.known_sources(unique_nodes))
+            if len(new):
+                new_nodes = [unique_nodes[i] for i in new]
+                unique_matrix[new, :] = self._search_rows(new_nodes, unique_nodes)
+                unique_matrix[:, new] = self._search_columns(unique_nodes, new_nodes)
+
+            # Known stops that were never in the same run: complete their rows
+            incomplete = np.flatnonzero(np.isnan(unique_matrix).any(axis=1))
+            if len(incomplete):
+                unique_matrix[incomplete, :] = self._search_rows([unique_nodes[i] for i in incomplete], unique_nodes)
+
+            self.cache.store(unique_nodes, unique_matrix, missing)
+
+        # Stops snapped to the same node share a row and a column
+        stop_positions = np.array([position[node] for node in self.nodes], dtype=np.intp)
+        return unique_matrix[np.ix_(stop_positions, stop_positions)]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def sub_matrix(self, indices):
+        """
+        Return the matrix restricted to a subset of stops, in the given order.
+
+        param indices: Stop indices into the full matrix (repetitions allowed, e.g. depot at both ends).
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        return self.matrix[np.ix_(indices, indices)]
+
+    def _tree(self, source):
+        if source in self.trees:
+            return self.trees.get(source)
+
+        # Evicted (or never kept): search again from this source only
+        if isinstance(self.G, CSRGraph):
+            tree = self.G.shortest_path_tree(source, weight=self.weight)
+        else:
+            tree = {}
+            single_source_travel_times(self.G, source, targets=self.nodes, weight=self.weight, predecessors=tree)
+        self._store_tree(source, tree)
+        return tree
+
+    def route(self, i, j):
+        """
+        Return the fastest route between two stops as a list of graph nodes.
+
+        param i: The index of the origin stop.
+        param j: The index of the destination stop.
+        """
+        source, target = self.nodes[i], self.nodes[j]
+        if np.isinf(self.matrix[i, j]):
+            raise NoPathError(f"No path between {source} and {target}")
+
+        tree = self._tree(source)
+        if isinstance(self.G, CSRGraph):
+            return self.G.tree_path(tree, source, target)
+
+        route = [target]
+        while route[-1] != source:
+            route.append(tree[route[-1]])
+        return route[::-1]
+
+    def route_coords(self, route):
+        """
+        Return the (latitude, longitude) of every node along a route.
+
+        param route: A list of graph nodes.
+        """
+        if isinstance(self.G, CSRGraph):
+            return self.G.route_coords(route)
+        return [(self.G.nodes[node]['y'], self.G.nodes[node]['x']) for node in route]
+
+    def route_length(self, route):
+        """
+        Return the length in meters of a route, following the edges the search used.
+
+        param route: A list of graph nodes.
+        """
+        return self.route_weight(route, 'length')
+
+    def route_weight(self, route, attribute):
+        """
+        Return the sum of an edge attribute along a route, following the edges the search used.
+
+        param route: A list of graph nodes.
+        param attribute: The edge attribute, e.g. 'length' or a time bucket's travel time.
+        """
+        if isinstance(self.G, CSRGraph):
+            return float(self.G.route_edge_attributes(route, attribute).sum())
+
+        total = 0.0
+        for u, v in zip(route[:-1], route[1:]):
+            data = self.G.adj[u][v]
+            if self.G.is_multigraph():
+                data = min(data.values(), key=lambda edge: edge.get(self.weight, 1))
+            total += data.get(attribute, 0.0)
+        return total
+
+    def leg(self, i, j):
+        """
+        Rebuild the leg between two stops from the stored shortest-path tree.
+
+        Returns the route (graph nodes), its length in meters and its duration in seconds.
+
+        param i: The index of the origin stop.
+        param j: The index of the destination stop.
+        """
+        route = self.route(i, j)
+        return route, self.route_length(route), float(self.matrix[i, j])
+
+
+class SparseTravelTimes:
+    """
+    Travel times known only between each stop and its k nearest stops, plus to and from the depot.
+
+    Any other pair is estimated from the great-circle distance, scaled by a
+    quantile of the ratio observed on the exact neighbor pairs: above the
+    median, so the solver does not favor unmeasured arcs over measured ones.
+    """
+
+    def __init__(self, coords, neighbors, costs, depot_row, depot_column, depot=0, G=None, nodes=None,
+                 weight='travel_time', fallback_quantile=0.75):
+        """
+        param coords: Array of (latitude, longitude) of every stop, depot included.
+        param neighbors: The neighbor stop indices of every stop, shape (n, k).
+        param costs: The exact cost to each neighbor, `inf` when unknown, shape (n, k).
+        param depot_row: The exact cost from the depot to every stop.
+        param depot_column: The exact cost from every stop to the depot.
+        param depot: The index of the depot.
+        param G: Optional road graph, needed to rebuild the legs.
+        param nodes: The graph node of every stop, needed to rebuild the legs.
+        param weight: The edge attribute used as cost.
+        param fallback_quantile: The quantile of the exact cost / great-circle ratio used for the estimates.
+        """
+        self.G = G
+        self.nodes = None if nodes is None else np.asarray(nodes)
+        self.weight = weight
+        self.coords = np.asarray(coords, dtype=float)
+        self.neighbors = neighbors
+        self.costs = costs
+        self.depot_row = np.asarray(depot_row, dtype=float)
+        self.depot_column = np.asarray(depot_column, dtype=float)
+        self.depot = depot
+
+        # Seconds per straight-line meter, measured on the exact pairs
+        straight = self._straight(np.repeat(np.arange(len(neighbors)), neighbors.shape[1]), neighbors.ravel())
+        known = np.isfinite(costs.ravel()) & (straight > 0)
+        self.seconds_per_meter = (float(np.quantile(costs.ravel()[known] / straight[known], fallback_quantile))
+                                  if known.any() else 0.12)
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def matrix(self):
+        """
+        Dense matrix over all stops, exact on the candidate arcs and depot rows and estimated elsewhere.
+
+        Only the solver needs it; building it is O(n²) memory but costs no graph search.
+        """
+        return self.sub_matrix(np.arange(len(self.coords)))
+
+    def _straight(self, i, j):
+        return haversine(self.coords[i, 0], self.coords[i, 1], self.coords[j, 0], self.coords[j, 1])
+
+    def pair_costs(self, i, j):
+        """
+        Return the cost from stops `i` to stops `j`: exact when known, estimated otherwise.
+
+        param i: The origin stop indices.
+        param j: The destination stop indices, broadcastable with `i`.
+        """
+        i, j = np.broadcast_arrays(np.asarray(i), np.asarray(j))
+        result = self._straight(i, j) * self.seconds_per_meter
+
+        matches = self.neighbors[i] == j[..., None]
+        exact = np.where(matches, self.costs[i], np.inf).min(axis=-1)
+        result = np.where(np.isfinite(exact), exact, result)
+
+        result = np.where(i == self.depot, self.depot_row[j], result)
+        result = np.where(j == self.depot, self.depot_column[i], result)
+        return np.where(i == j, 0.0, result)
+
+    def sub_matrix(self, indices):
+        """
+        Return the dense cost matrix between a small set of stops (a vehicle's stops).
+
+        param indices: The stop indices.
+        """
+        indices = np.asarray(indices)
+        matrix = haversine_matrix(self.coords[indices]) * self.seconds_per_meter
+
+        # Scatter the exact neighbor costs over the estimates
+        position = np.full(len(self.coords), -1)
+        position[indices] = np.arange(len(indices))
+        columns = position[self.neighbors[indices]]
+        rows = np.broadcast_to(np.arange(len(indices))[:, None], columns.shape)
+        costs = self.costs[indices]
+        known = (columns >= 0) & np.isfinite(costs)
+        matrix[rows[known], columns[known]] = costs[known]
+
+        if position[self.depot] >= 0:
+            matrix[position[self.depot], :] = self.depot_row[indices]
+            matrix[:, position[self.depot]] = self.depot_column[indices]
+        np.fill_diagonal(matrix, 0.0)
+        return matrix
+
+    def route_cost(self, route):
+        route = np.asarray(route)
+        return float(self.pair_costs(route[:-1], route[1:]).sum())
+
+    def leg(self, i, j):
+        """
+        Search the leg between two stops on the road graph (no tree is kept for large instances).
+
+        On a `CSRGraph` the shortest-path tree of the origin is grown only up to
+        `DEFAULT_SEARCH_SLACK` times the known or estimated cost of the leg, and
+        over the whole graph when the destination lies beyond that bound.
+
+        Returns the route (graph nodes), its length in meters and its duration in seconds.
+
+        param i: The index of the origin stop.
+        param j: The index of the destination stop.
+        """
+        source, target = self.nodes[i].item(), self.nodes[j].item()
+        if isinstance(self.G, CSRGraph):
+            limit = DEFAULT_SEARCH_SLACK * float(self.pair_costs(i, j)) + 60.0
+            try:
+                route = self.G.tree_path(self.G.shortest_path_tree(source, self.weight, limit), source, target)
+            except NoPathError:
+                route = self.G.tree_path(self.G.shortest_path_tree(source, self.weight), source, target)
+            return (route, float(self.G.route_edge_attributes(route, 'length').sum()),
+                    float(self.G.route_edge_attributes(route, self.weight).sum()))
+
+        import networkx as nx
+
+        try:
+            route = nx.shortest_path(self.G, source, target, weight=self.weight)
+        except nx.NetworkXNoPath as e:
+            raise NoPathError(str(e)) from e
+        return route, nx.path_weight(self.G, route, 'length'), nx.path_weight(self.G, route, self.weight)
+
+    def route_weight(self, route, attribute):
+        """
+        Return the sum of an edge attribute along a route.
+
+        param route: A list of graph nodes.
+        param attribute: The edge attribute, e.g. 'length' or a time bucket's travel time.
+        """
+        if isinstance(self.G, CSRGraph):
+            return float(self.G.route_edge_attributes(route, attribute).sum())
+
+        import networkx as nx
+        return nx.path_weight(self.G, route, attribute)
+
+    def route_coords(self, route):
+        """
+        Return the (latitude, longitude) of every node along a route.
+
+        param route: A list of graph nodes.
+        """
+        if isinstance(self.G, CSRGraph):
+            return self.G.route_coords(route)
+        return [(self.G.nodes[node]['y'], self.G.nodes[node]['x']) for node in route]
+
+
+def sparse_travel_times(G, nodes, coords, k=DEFAULT_NEIGHBORS, depot=0, weight='travel_time', chunk_size=64):
+    """
+    Build the sparse travel times of a large instance: bounded kNN searches plus one search from and to the depot.
+
+    param G: The road graph (networkx graph or `CSRGraph`).
+    param nodes: The graph node of every stop, depot included.
+    param coords: Array of (latitude, longitude) of every stop.
+    param k: The number of neighbors per stop.
+    param depot: The index of the depot.
+    param weight: The edge attribute used as cost.
+    param chunk_size: The number of sources searched per batch (CSR graphs).
+    """
+    nodes = np.asarray(nodes)
+    neighbors, costs = knn_travel_times(G, nodes, coords, k=k, weight=weight, chunk_size=chunk_size)
+    depot_row = search_rows(G, nodes[[depot]], nodes, weight=weight)[0]
+    depot_column = search_rows(G, nodes[[depot]], nodes, weight=weight, reverse=True)[0]
+    return SparseTravelTimes(coords, neighbors, costs, depot_row, depot_column, depot, G, nodes, weight)
+
+
+def bucket_matrices(G, nodes, coords, weights, neighbors=None, depot=0, chunk_size=64):
+    """
+    Compute one travel-time matrix per time bucket, shape (buckets, n, n).
+
+    On a `CSRGraph` all buckets come from one pass: every stop is searched
+    once on the static `travel_time` and each bucket's travel time is summed
+    along the fastest paths found (see `CSRGraph.path_costs`), so a bucket
+    costs array sums rather than graph searches. These are also the paths
+    the legs are traced on. With `neighbors`, only the candidate arcs and the
+    depot rows are exact, the other pairs are estimated per bucket (see
+    `SparseTravelTimes`). A networkx graph is searched once per bucket.
+
+    param G: The road graph (networkx graph or `CSRGraph`), with one edge cost per bucket.
+    param nodes: The graph node of every stop, depot first.
+    param coords: Array of (latitude, longitude) of every stop.
+    param weights: The edge attribute of every bucket, see `speed_model.bucket_weights`.
+    param neighbors: The candidate stops of every stop, shape (n, k) (e.g. `SparseTravelTimes.neighbors`), None
+        for full rows.
+    param depot: The index of the depot.
+    param chunk_size: The number of sources searched per batch (CSR graphs).
+    """
+    nodes = np.asarray(nodes)
+    if not isinstance(G, CSRGraph):
+        matrices = np.empty((len(weights), len(nodes), len(nodes)))
+        for bucket, weight in enumerate(weights):
+            if neighbors is not None:
+                matrices[bucket] = sparse_travel_times(G, nodes, coords, k=neighbors.shape[1], depot=depot,
+                                                       weight=weight).matrix
+            else:
+                matrices[bucket] = search_rows(G, nodes.tolist(), nodes.tolist(), weight=weight)
+        return matrices
+
+    if neighbors is None:
+        return G.path_costs(nodes, np.broadcast_to(nodes, (len(nodes), len(nodes))), weights, chunk_size=chunk_size)
+
+    coords = np.asarray(coords, dtype=float)
+    distances = haversine(coords[:, None, 0], coords[:, None, 1], coords[neighbors, 0], coords[neighbors, 1])
+    costs = G.path_costs(nodes, nodes[neighbors], weights, limits=_search_limits(G, distances, 'travel_time'),
+                         chunk_size=chunk_size)
+    depot_rows = G.path_costs(nodes[[depot]], nodes[None], weights)[:, 0]
+    depot_columns = G.path_costs(nodes[[depot]], nodes[None], weights, reverse=True)[:, 0]
+    return np.stack([SparseTravelTimes(coords, neighbors, costs[bucket], depot_rows[bucket], depot_columns[bucket],
+                                       depot).matrix
+                     for bucket in range(len(weights))])
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Objects shared with the worker processes (road graph, matrix...), set once per worker
+_shared = {}
+
+
+def _init_worker(shared):
+    global _shared
+    _shared = shared
+
+
+def shared(name):
+    """
+    Return an object shared with the worker processes by `worker_pool`.
+
+    param name: The keyword it was passed to `worker_pool` with.
+    """
+    return _shared[name]
+
+
+def default_workers():
+    # CPUs this process may run on (respects affinity / container limits where the OS exposes them)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_pool(workers, **objects):
+    """
+    Create a process pool whose workers can read `objects` through `shared(name)`.
+
+    With the 'fork' start method (Linux) the objects are inherited by the
+    workers without being copied or pickled; elsewhere they are pickled once
+    per worker, never once per task.
+
+    param workers: The number of worker processes.
+    param objects: The objects to share (graph, matrix...).
+    """
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(objects,))
+
+
+def split(items, parts):
+    """
+    Split a list into at most `parts` contiguous chunks of similar size, keeping the order.
+
+    param items: The list to split.
+    param parts: The number of chunks.
+    """
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (i < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
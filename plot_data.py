@@ -4,6 +4,8 @@ from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.cm as cm
 import numpy as np
 import matplotlib.gridspec as gridspec
+import os
+from profiler import DEFAULT_RESULTS_FILE, STAGES, load_results
 
 # Load the CSV file
 df = pd.read_csv('Valuetab.csv', sep=';')
@@ -22,6 +24,16 @@ df['execution duration'] = pd.to_numeric(df['duree d\'execution'], errors='coerc
 # Drop rows with NaN after conversion
 df = df.dropna()
 
+# Add the runs recorded by project.py (one JSON record per run with per-stage timings)
+runs = load_results(DEFAULT_RESULTS_FILE) if os.path.exists(DEFAULT_RESULTS_FILE) else []
+if runs:
+    recorded = pd.DataFrame({
+        'number of trucks': [run['trucks'] for run in runs],
+        'number of addresses': [run['addresses'] for run in runs],
+        'execution duration': [run['total_seconds'] for run in runs],
+    })
+    df = pd.concat([df, recorded], ignore_index=True)
+
 # Get unique truck numbers
 trucks = df['number of trucks'].unique()
 colors = cm.get_cmap('tab10', len(trucks))
@@ -96,5 +108,24 @@ for bar in bar1 + bar2:
                 textcoords="offset points",
                 ha='center', va='bottom')
 
+# Per-stage breakdown of the last recorded runs
+if runs:
+    ax3 = fig.add_subplot(gs[1, :])
+    recent = runs[-10:]
+    # The time (and revision) of each run keeps runs of the same size on separate bars
+    names = [f"{run['trucks']} trucks / {run['addresses']} addresses\n"
+             f"{run.get('timestamp', '').replace('T', ' ')} {(run.get('revision') or '')[:7]}".rstrip()
+             for run in recent]
+    left = np.zeros(len(recent))
+    stage_colors = cm.get_cmap('tab10', len(STAGES))
+    for i, stage in enumerate(STAGES):
+        seconds = np.array([run['stages'].get(stage, {}).get('seconds', 0) for run in recent])
+        if seconds.any():
+            ax3.barh(names, seconds, left=left, label=stage, color=stage_colors(i))
+            left += seconds
+    ax3.set_xlabel('Execution Duration (s)')
+    ax3.set_title('Stage Breakdown of Recent Runs')
+    ax3.legend(loc='upper left', bbox_to_anchor=(1, 1), fontsize='small')
+
 plt.tight_layout()
 plt.show()
\ No newline at end of file
@@ -0,0 +1,147 @@
+import datetime
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_RESULTS_FILE = 'run_results.jsonl'
+
+# Pipeline stages, in the order they run
+STAGES = ('load', 'graph fetch', 'speed annotation', 'snapping', 'matrix', 'solve', 'schedule', 'map render')
+
+
+def _reset_peak_rss():
+    # Linux resets the peak resident set size (VmHWM) of the process when '5' is written to clear_refs
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class StageProfiler:
+    """
+    Record the wall time and peak memory of every pipeline stage.
+
+    Peak memory is the peak resident set size of the process where Linux lets
+    it be reset between stages, and the peak of Python allocations
+    (tracemalloc, NumPy included) elsewhere. Worker processes are not counted.
+    Nested stages are timed exclusively: a parent's time excludes its children.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+        self.memory = 'rss' if _reset_peak_rss() else 'tracemalloc'
+        if self.memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _reset_peak(self):
+        if self.memory == 'rss':
+            _reset_peak_rss()
+        else:
+            tracemalloc.reset_peak()
+
+    def _peak(self):
+        return _peak_rss() if self.memory == 'rss' else tracemalloc.get_traced_memory()[1]
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block as the stage `name`, adding up when a stage runs several times.
+
+        param name: The stage name, see STAGES.
+        """
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], self._peak())
+        self._reset_peak()
+        entry = {'start': time.perf_counter(), 'children': 0.0, 'peak': 0}
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry['start']
+            peak = max(entry['peak'], self._peak())
+            record = self.stages.setdefault(name, {'seconds': 0.0, 'peak_mb': 0.0})
+            record['seconds'] += elapsed - entry['children']
+            record['peak_mb'] = max(record['peak_mb'], peak / 2**20)
+            if self._stack:
+                self._stack[-1]['children'] += elapsed
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+    def _ordered(self):
+        # Known stages in pipeline order, then any other stage
+        return sorted(self.stages.items(), key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES))
+
+    def report(self):
+        for name, record in self._ordered():
+            print(f"{name:>16}: {record['seconds']:8.2f} s, peak {record['peak_mb']:8.1f} MiB")
+        print(f"{'total':>16}: {sum(record['seconds'] for record in self.stages.values()):8.2f} s")
+
+    def record(self, **fields):
+        """
+        Build the result record of the run: the given fields, the stages, the total time and the git revision.
+
+        param fields: Run description, e.g. trucks=4, addresses=70.
+        """
+        return {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            **fields,
+            'total_seconds': round(sum(record['seconds'] for record in self.stages.values()), 3),
+            'memory': self.memory,
+            'stages': {name: {'seconds': round(record['seconds'], 3), 'peak_mb': round(record['peak_mb'], 1)}
+                       for name, record in self._ordered()},
+        }
+
+
+def stage(profiler, name):
+    """
+    Return `profiler.stage(name)`, or a no-op context when there is no profiler.
+
+    param profiler: A `StageProfiler` or None.
+    param name: The stage name.
+    """
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+def git_revision():
+    # Short commit hash of the working tree, '-dirty' when it has local changes; None outside a git checkout
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_result(record, file_path=DEFAULT_RESULTS_FILE):
+    """
+    Append a run record to the results file, one JSON object per line (read by plot_data.py).
+
+    param record: The record, see `StageProfiler.record`.
+    param file_path: The results file.
+    """
+    with open(file_path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + '\n')
+
+
+def load_results(file_path=DEFAULT_RESULTS_FILE):
+    """
+    Read the run records of a results file.
+
+    param file_path: The results file.
+    """
+    with open(file_path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -1,51 +1,67 @@
-import osmnx as ox
-import networkx as nx
-import folium
-import pandas as pd
-from geopy.distance import geodesic
-import requests
-from folium.plugins import PolyLineTextPath
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
-import matplotlib.cm as cm
-import numpy as np
-import warnings
-from tsp_solver.greedy import solve_tsp
-from sklearn.cluster import KMeans
-import random
-import datetime
+"""
+Delivery route planner: manifest -> road graph -> travel times -> routes -> schedule and map.
 
-start_date = datetime.datetime.now()
+Run it from the command line, e.g.:
 
-# Suppress FutureWarnings
-warnings.simplefilter(action='ignore', category=FutureWarning)
+    python -m project addresses_found.xlsx --vehicles 4 --strategy ortools
+
+or import the stage functions from other code. Heavy dependencies (osmnx,
+networkx, folium, OR-Tools, scikit-learn...) are imported inside the stage
+that needs them, so importing this module or asking for --help is instant.
+"""
+import argparse
+import datetime
+import os
+import warnings
+import numpy as np
+from profiler import DEFAULT_RESULTS_FILE, StageProfiler, append_result, stage
+from schedule import DEFAULT_SCENARIOS, DEFAULT_SERVICE_MINUTES
+
+DEFAULT_MANIFEST = 'addresses_found.xlsx'
+DEPOT = (49.377805, 1.115311)  # Replace with actual depot coordinates
+ORIGIN_CITY = (49.443512, 1.098445)  # Center of the downloaded road graph
+GRAPH_RADIUS_KM = 10
+NETWORK_TYPE = 'drive'
+MAX_SNAP_DISTANCE = 250  # meters, points further from any road are usually a bad geocode
+CANDIDATE_NEIGHBORS = 30
+CANDIDATE_MIN_STOPS = 1000  # Below this number of stops the full matrix is cheap enough and slightly better
+DAY_START = datetime.time(8, 0)
+VEHICLE_COLORS = ['#FF0000', '#00FF00', '#0000FF', '#ff8000']  # Red, Green, Blue, Orange
+COMPACT_MAP_STOPS = 500  # Above this number of packages the 'auto' map mode renders compact maps
+MAP_SIZE_BUDGET = 5 * 2**20  # bytes, compact maps are simplified further until they fit
+
+
+def load_stops(file_path, depot=DEPOT):
+    """
+    Load the manifest and build the stop coordinates, depot first.
 
+    Returns the `Manifest` (with the time-window columns when present) and a
+    float64 array of (latitude, longitude) of the depot and every package.
 
-# Example file path
-file_path = 'addresses_found.xlsx'
+    param file_path: The manifest (.xlsx, .csv or .parquet).
+    param depot: The (latitude, longitude) of the depot.
+    """
+    from manifest import load_manifest
+    from time_windows import WINDOW_DTYPES
 
-def load_points_from_excel(file_path):
-    df = pd.read_excel(file_path)
-    df['lat'] = df['lat'].astype(float)    # Add this line
-    df['long'] = df['long'].astype(float)  # Add this line
-    points = df[['lat', 'long']].values.tolist()
-    names = df['Package ID'].tolist()
-    return points, names
+    manifest = load_manifest(file_path, optional=WINDOW_DTYPES)
+    if not len(manifest):
+        raise ValueError(f"No package in {file_path}")
+    return manifest, np.vstack([depot, manifest.coords])
 
-# Load points
-points, names = load_points_from_excel(file_path)
 
-def get_nearest_node(G, point):
-    lat, lon = point
-    lat = float(lat)  # Ensure lat is a float
-    lon = float(lon)  # Ensure lon is a float
-    return ox.distance.nearest_nodes(G, X=lon, Y=lat)
+def find_nearby_cities(center_coords, radius_km=10, client=None):
+    """
+    List the cities, towns and villages within `radius_km` of a point, from Overpass (cached between runs).
 
-# Use the first point as the origin for the TSP
-origin = points[0]
-origin_city = (49.443512, 1.098445)
+    param center_coords: The (latitude, longitude) of the center.
+    param radius_km: The search radius in kilometers.
+    param client: The `geo_client.GeoClient` to query with, the shared one by default.
+    """
+    from geopy.distance import geodesic
+    from geo_client import default_client
 
-def find_nearby_cities(center_coords, radius_km=10):
-    overpass_url = "http://overpass-api.de/api/interpreter"
+    client = client or default_client()
     overpass_query = f"""
     [out:json];
     (
@@ -55,339 +71,463 @@ def find_nearby_cities(center_coords, radius_km=10):
     );
     out body;
     """
-    response = requests.get(overpass_url, params={'data': overpass_query})
-    data = response.json()
-    
+    data = client.overpass(overpass_query)
+
     nearby_cities = []
     for element in data['elements']:
         city_name = element['tags'].get('name')
         city_coords = (element['lat'], element['lon'])
         if geodesic(center_coords, city_coords).km <= radius_km:
             nearby_cities.append(city_name)
-    
+
     return nearby_cities
 
-# Ensure points is a list of tuples (latitude, longitude)
-if not points or not all(isinstance(point, (list, tuple)) and len(point) == 2 for point in points):
-    raise ValueError("The points list is not correctly formatted.")
-
-# Create graph
-G = ox.graph_from_point(
-    center_point=origin_city,
-    dist=5000,
-    dist_type='bbox',
-    network_type='drive'
-)
-
-# Get nearest nodes for all points
-nodes = []
-for point in points:
-    node = get_nearest_node(G, point)
-    nodes.append(node)
-
-try:
-    # First try to get graph from nearby cities
-    places = find_nearby_cities(origin_city)
-    if places:
-        G = ox.graph_from_place(places, network_type='drive')
-    else:
-        # Fallback to getting graph from point if no cities found
-        G = ox.graph_from_point(origin_city, dist=5000, network_type='drive')
-except Exception as e:
-    print(f"Failed to get graph from places, falling back to point: {e}")
-    G = ox.graph_from_point(origin_city, dist=5000, network_type='drive')
-
-
-# Add travel time to each edge in the graph
-for u, v, k, data in G.edges(data=True, keys=True):
-    if 'length' in data:
-        # Get speed from OSM data or use defaults based on road type
-        if 'maxspeed' in data:
-            maxspeed_str = data['maxspeed'][0] if isinstance(data['maxspeed'], list) else data['maxspeed']
-            try:
-                if 'rural' in str(maxspeed_str).lower():
-                    maxspeed = 80.0
-                # Handle highway type that might be a list
-                highway_type = data.get('highway', '')
-                if isinstance(highway_type, list):
-                    highway_type = highway_type[0]
-                highway_type = str(highway_type).lower()
-                
-                if 'motorway' in highway_type:
-                    maxspeed = 130.0
-                elif 'trunk' in highway_type:
-                    maxspeed = 110.0
-                elif 'primary' in highway_type:
-                    maxspeed = 90.0
-                elif 'residential' in highway_type:
-                    maxspeed = 30.0
-                else:
-                    try:
-                        maxspeed = float(maxspeed_str)
-                        maxspeed = min(maxspeed, 130.0)  # Cap at 130 km/h
-                    except (ValueError, TypeError):
-                        maxspeed = 50.0  # Default urban speed
-            except (ValueError, TypeError):
-                maxspeed = 50.0
+
+def download_graph(center_coords, radius_km=10, network_type='drive'):
+    import osmnx as ox
+
+    try:
+        # First try to get graph from nearby cities
+        places = find_nearby_cities(center_coords, radius_km)
+        if places:
+            G = ox.graph_from_place(places, network_type=network_type)
+            G.graph['places'] = places
         else:
-            maxspeed = 50.0  # Default speed if no maxspeed data
-            
-        # Calculate travel time in seconds and add it to the edge data
-        data['travel_time'] = data['length'] / (maxspeed * 1000 / 3600)
-
-
-# Visualize the graph (optional)
-# ox.plot_graph(G)
-
-# Create the map centered on the origin
-map_folium = folium.Map(location=origin, zoom_start=12)
-
-# Create the map with package information
-map_folium_final = folium.Map(location=origin, zoom_start=12)
-
-# Define the starting point (point of collection)
-delivery_points = [
-    (point, name, f"PKG{i:04d}") # Generate package IDs like PKG0001
-    for i, (point, name) in enumerate(zip(points, names), 1)
-]
-
-# Add points to the map with package IDs in tooltips
-for point, name, pkg_id in delivery_points:
-    tooltip_text = f"{name} (Tracking ID: {pkg_id})"
-    folium.Marker(location=point, tooltip=tooltip_text).add_to(map_folium)
-
-# Add points to the map with package IDs in tooltips
-for point, name, pkg_id in delivery_points:
-    tooltip_text = f"{name} (Tracking ID: {pkg_id})"
-    folium.Marker(location=point, tooltip=tooltip_text).add_to(map_folium_final)
-
-# Save the map to an HTML file
-map_folium.save('map.html')
-
-# -------------------------------
-# 5. Calculer et afficher le chemin le plus rapide pour la livraison
-# -------------------------------
-
-# Add the depot address to the delivery points
-depot_address = (49.377805, 1.115311)  # Replace with actual depot coordinates
-delivery_points.insert(0, [depot_address])
-
-# Create a distance matrix
-num_points = len(delivery_points)
-distance_matrix = [[0] * num_points for _ in range(num_points)]
-
-
-for i in range(num_points):
-    for j in range(num_points):
-        if i != j:
-            start_point = delivery_points[i][0]
-            end_point = delivery_points[j][0]
-            start_lat, start_lon = float(start_point[0]), float(start_point[1])
-            end_lat, end_lon = float(end_point[0]), float(end_point[1])
-            start_node = get_nearest_node(G, (start_lat, start_lon))
-            end_node = get_nearest_node(G, (end_lat, end_lon))
-            try:
-                route_length = nx.shortest_path_length(G, start_node, end_node, weight='travel_time')
-                distance_matrix[i][j] = route_length
-            except nx.NetworkXNoPath:
-                distance_matrix[i][j] = float('inf')
+            # Fallback to getting graph from point if no cities found
+            G = ox.graph_from_point(center_coords, dist=5000, network_type=network_type)
+    except Exception as e:
+        print(f"Failed to get graph from places, falling back to point: {e}")
+        G = ox.graph_from_point(center_coords, dist=5000, network_type=network_type)
+    return G
 
 
-# Solve the TSP using OR-Tools
-def create_data_model():
+def load_road_graph(center=ORIGIN_CITY, radius_km=GRAPH_RADIUS_KM, network_type=NETWORK_TYPE, speed_profile=None,
+                    profiler=None, backend='csr', time_profile=None, cache_dir=None):
+    """
+    Load the annotated road graph from the local cache, only downloading it on the first run.
+
+    Returns the graph the searches run on and its version string (graph key,
+    build date and speed model), which keys the travel-time cache. The 'csr'
+    backend builds compact arrays straight from the memory-mapped cache
+    columns, without ever holding the networkx graph; 'networkx' returns the
+    graph itself.
+
+    param center: The (latitude, longitude) the graph is centered on.
+    param radius_km: The radius of the downloaded area.
+    param network_type: The osmnx network type.
+    param speed_profile: The speed model, see `speed_model.DEFAULT_SPEED_PROFILE`.
+    param profiler: Optional `StageProfiler`, times the 'graph fetch' and 'speed annotation' stages.
+    param backend: 'csr' or 'networkx'.
+    param time_profile: Optional time-of-day speed profile: the travel times of its buckets are added to the edges
+        (see `speed_model.bucket_weights`).
+    param cache_dir: The graph cache directory (default: graph_cache), e.g. fixtures/graph_cache to run offline on
+        the pre-baked test graph.
+    """
+    from graph_store import DEFAULT_CACHE_DIR, GraphStore, graph_key
+    from speed_model import (DEFAULT_SPEED_PROFILE, annotate_time_buckets, annotate_travel_times, bucket_travel_times,
+                             bucket_weights, profile_signature)
+
+    speed_profile = speed_profile or DEFAULT_SPEED_PROFILE
+    signature = profile_signature(speed_profile)
+    graph_store = GraphStore(cache_dir or DEFAULT_CACHE_DIR)
+    key, params = graph_key(center, radius_km=radius_km, network_type=network_type)
+
+    def build():
+        G = download_graph(center, radius_km=radius_km, network_type=network_type)
+        with stage(profiler, 'speed annotation'):
+            return annotate_travel_times(G, speed_profile)
+
+    with stage(profiler, 'graph fetch'):
+        graph_store.ensure(key, build, params=params, speed_profile=signature)
+
+    # The speed model changed since the graph was cached: re-annotate from the stored columns
+    if graph_store.metadata(key).get('speed_profile') != signature:
+        with stage(profiler, 'graph fetch'):
+            G = graph_store.load(key)
+        with stage(profiler, 'speed annotation'):
+            annotate_travel_times(G, speed_profile)
+        with stage(profiler, 'graph fetch'):
+            graph_store.save(key, G, params=params, speed_profile=signature,
+                             pinned=graph_store.metadata(key).get('pinned', False))
+    version = f"{key}:{graph_store.metadata(key)['created']}:{signature}"
+
+    if backend == 'csr':
+        from csr_graph import CSRGraph
+
+        arrays = graph_store.load_arrays(key)
+        buckets = {}
+        if time_profile is not None:
+            with stage(profiler, 'speed annotation'):
+                buckets = dict(zip(bucket_weights(time_profile),
+                                   bucket_travel_times(arrays['travel_time'], arrays['highway'], time_profile)))
+        with stage(profiler, 'graph fetch'):
+            return CSRGraph.from_arrays(arrays, buckets), version
+
+    with stage(profiler, 'graph fetch'):
+        G = graph_store.load(key)
+    if time_profile is not None:
+        with stage(profiler, 'speed annotation'):
+            annotate_time_buckets(G, time_profile)
+    return G, version
+
+
+def snap_stops(G, stop_coords, max_snap_distance=MAX_SNAP_DISTANCE):
+    """
+    Snap every stop (depot included) to the road graph once, warning about the ones far from any road.
+
+    param G: The road graph (networkx graph or `CSRGraph`).
+    param stop_coords: Array of (latitude, longitude), depot first.
+    param max_snap_distance: The warning threshold in meters.
+    """
+    from snapping import PointSnapper
+
+    snapped = PointSnapper(G).snap(stop_coords)
+    for idx in snapped.far_points(max_snap_distance):
+        print(f"Warning: point {idx} ({stop_coords[idx]}) is {snapped.distances[idx]:.0f} m away from the road network")
+    return snapped
+
+
+def compute_travel_times(road_graph, snapped, candidate_neighbors=CANDIDATE_NEIGHBORS, graph_version=None, workers=1,
+                         cache_path=None):
+    """
+    Compute the travel times between the stops.
+
+    With `candidate_neighbors`, exact travel times are only searched towards
+    each stop's nearest stops (and from / to the depot) and estimated
+    elsewhere: a good tour never links far-apart stops, so this cuts the
+    searches from O(n²) to O(n·k). Otherwise one search per origin fills a
+    whole row of the full matrix, reusing the pairs cached by previous runs
+    on the same `graph_version` (no cache without a version).
+
+    param road_graph: The routing graph.
+    param snapped: The `SnappedPoints` of the stops.
+    param candidate_neighbors: The number of candidate stops per stop, None for the full matrix.
+    param graph_version: The version of the graph, keys the travel-time cache; None to not use the cache.
+    param workers: The number of processes running the searches.
+    param cache_path: The travel-time cache file (default: `matrix_cache.DEFAULT_MATRIX_CACHE`).
+    """
+    if candidate_neighbors:
+        from matrix_engine import sparse_travel_times
+
+        print(f"Candidate arcs: {candidate_neighbors} nearest stops per stop")
+        return sparse_travel_times(road_graph, snapped.nodes, snapped.points, k=candidate_neighbors)
+
+    from matrix_engine import TravelTimeMatrix
+
+    if graph_version is None:
+        # Costs of an unversioned graph could not be told apart from another graph's in the cache
+        return TravelTimeMatrix(road_graph, snapped.nodes.tolist(), weight='travel_time', workers=workers)
+
+    from matrix_cache import DEFAULT_MATRIX_CACHE, MatrixCache
+
+    matrix_cache = MatrixCache(graph_version, cache_path or DEFAULT_MATRIX_CACHE)
+    travel_times = TravelTimeMatrix(road_graph, snapped.nodes.tolist(), weight='travel_time', cache=matrix_cache,
+                                    workers=workers)
+    print(f"Travel-time cache: {matrix_cache.stats()}")
+    return travel_times
+
+
+# Build the data model shared by all routing strategies
+def create_data_model(stop_coords, num_vehicles=4, travel_times=None, time_windows=None, service_times=None):
+    num_points = len(stop_coords)
     data = {}
-    data['distance_matrix'] = distance_matrix
-    data['num_vehicles'] = 4
+    data['distance_matrix'] = None if travel_times is None else travel_times.matrix
+    data['num_vehicles'] = num_vehicles
     data['depot'] = 0
-    data['demands'] = [1] * num_points  # Example demands for each location  
+    data['demands'] = [1] * num_points  # Example demands for each location
     vehicle_capacity = int(np.ceil((num_points / data['num_vehicles']) + 1))  # Convert to integer
     data['vehicle_capacities'] = [vehicle_capacity] * data['num_vehicles']
+    data['coords'] = stop_coords
+    if time_windows is not None:
+        data['time_windows'] = time_windows
+        data['service_times'] = service_times
     return data
 
-data = create_data_model()
-manager = pywrapcp.RoutingIndexManager(len(data['distance_matrix']), data['num_vehicles'], data['depot'])
-routing = pywrapcp.RoutingModel(manager)
-
-def distance_callback(from_index, to_index):
-    from_node = manager.IndexToNode(from_index)
-    to_node = manager.IndexToNode(to_index)
-    return data['distance_matrix'][from_node][to_node]
-
-transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-
-# Define cost of each arc
-routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-# Add capacity constraint
-def demand_callback(from_index):
-    from_node = manager.IndexToNode(from_index)
-    return data['demands'][from_node]
-
-demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
-routing.AddDimensionWithVehicleCapacity(
-    demand_callback_index,
-    0,  # null capacity slack
-    data['vehicle_capacities'],  # vehicle maximum capacities
-    True,  # start cumul to zero
-    'Capacity')
-
-# Setting first solution heuristic
-search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-print("Solving TSP with OR-Tools (this may take some time)...")
-# Solve the problem
-solution = routing.SolveWithParameters(search_parameters)
-print("TSP solved!")
-
-def get_tsp_paths(manager, routing, solution):
-    tsp_paths = []
-    for vehicle_id in range(data['num_vehicles']):
-        index = routing.Start(vehicle_id)
-        route = []
-        while not routing.IsEnd(index):
-            route.append(manager.IndexToNode(index))
-            index = solution.Value(routing.NextVar(index))
-        route.append(manager.IndexToNode(index))
-        tsp_paths.append(route)
+
+def check_time_windows(data, stop_ids):
+    """
+    Leave out of the plan the stops whose time window no route can meet, before the search.
+
+    The rejected stops are reported and listed in `data['skipped']`.
+
+    param data: The data model, with its travel-time matrix and time windows.
+    param stop_ids: The id of every stop, depot first.
+    """
+    from time_windows import infeasible_stops
+
+    rejected = np.flatnonzero(infeasible_stops(data['distance_matrix'], data['time_windows'], data['service_times'],
+                                               data['depot']))
+    data['skipped'] = rejected.tolist()
+    if len(rejected):
+        print(f"Warning: {len(rejected)} packages cannot be delivered within their time window and are not planned: "
+              f"{[stop_ids[i] for i in rejected[:10]]}{' ...' if len(rejected) > 10 else ''}")
+    return rejected
+
+
+def solve_day(data, stop_ids, strategy='ortools', time_limit=30, metaheuristic='guided_local_search',
+              plan_file='last_plan.json', replan=True, workers=1):
+    """
+    Solve the routes, re-planning from the previous run's routes when only a few packages were added or cancelled.
+
+    The previous plan is only reused with the 'ortools' strategy, the same
+    number of vehicles and at least `REPLAN_MIN_SHARED` of its stops still in
+    the day; the warm-started search then stops at the first local optimum or
+    after `REPLAN_TIME_LIMIT` (or `time_limit` if shorter). Otherwise the day
+    is solved from scratch.
+    The plan is saved to `plan_file` for the next run. With time buckets in
+    the data model, the 'ortools' routes are then re-optimized with every
+    leg costed at its departure time (see `vrp_solver.solve_time_dependent`).
+
+    param data: The data model.
+    param stop_ids: The id of every stop, depot first, used to match the previous plan.
+    param strategy: 'ortools' (capacitated VRP), 'cluster_tsp' (clusters then one TSP per vehicle) or 'greedy'.
+    param time_limit: The OR-Tools search budget in seconds.
+    param metaheuristic: The OR-Tools local search metaheuristic.
+    param plan_file: The plan saved by the previous run, None to neither read nor write one.
+    param replan: Start from the previous plan when there is one.
+    param workers: The number of processes solving the per-vehicle TSPs ('cluster_tsp').
+    """
+    from vrp_solver import (REPLAN_MIN_SHARED, REPLAN_TIME_LIMIT, SearchProgress, load_plan, remap_routes,
+                            replan_routes, save_plan, shared_stops, solve_routes, solve_time_dependent)
+
+    progress = SearchProgress()
+    previous_plan = None
+    if replan and strategy == 'ortools' and plan_file and os.path.exists(plan_file):
+        previous_plan = load_plan(plan_file)
+    tsp_paths = None
+    if previous_plan is not None and len(previous_plan[1]) == data['num_vehicles']:
+        shared = shared_stops(previous_plan[0], stop_ids)
+        if shared >= REPLAN_MIN_SHARED:
+            print(f"Re-planning from the previous routes ({shared:.0%} of the stops unchanged)...")
+            previous_routes = remap_routes(previous_plan[1], previous_plan[0], stop_ids)
+            try:
+                tsp_paths = replan_routes(data, previous_routes, time_limit=min(time_limit, REPLAN_TIME_LIMIT),
+                                          progress=progress)
+            except RuntimeError as e:
+                # E.g. a plan saved for other capacities: solve from scratch instead
+                print(f"Cannot re-plan from {plan_file}: {e}")
+        else:
+            print(f"Only {shared:.0%} of the stops are in the previous plan, solving from scratch")
+    if tsp_paths is None:
+        print(f"Solving routes with {strategy} (time budget {time_limit} s)...")
+        tsp_paths = solve_routes(data, strategy, time_limit=time_limit, metaheuristic=metaheuristic,
+                                 progress=progress, workers=workers)
+    if 'bucket_matrices' in data and strategy == 'ortools':
+        print("Re-costing the legs in the time bucket they depart in...")
+        tsp_paths = solve_time_dependent(data, tsp_paths, metaheuristic=metaheuristic, progress=progress)
+    if plan_file:
+        save_plan(plan_file, stop_ids, tsp_paths)
     return tsp_paths
 
-if solution:
-    tsp_paths = get_tsp_paths(manager, routing, solution)
-
-# Define a list of colors for the vehicles
-vehicle_colors = ['#FF0000', '#00FF00', '#0000FF', '#ff8000']  # Red, Green, Blue, Orange
-
-num_vehicles = data['num_vehicles']
-
-# Convert delivery points to numpy array for clustering
-delivery_coords = np.array([point[0] for point in delivery_points])
-
-# Perform K-means clustering
-kmeans = KMeans(n_clusters=num_vehicles, random_state=0).fit(delivery_coords)
-clusters = kmeans.labels_
-
-# Create a list of delivery points for each vehicle
-vehicle_delivery_points = [[] for _ in range(num_vehicles)]
-for idx, cluster_id in enumerate(clusters):
-    vehicle_delivery_points[cluster_id].append(delivery_points[idx])
-
-# Initialize total distance and duration
-total_delivery_distance = 0
-total_delivery_duration = 0
-
-# Define the depot point
-depot_address = (49.377805, 1.115311)
-
-# Solve TSP for each vehicle
-tsp_paths = []
-for vehicle_points in vehicle_delivery_points:
-    if not vehicle_points:
-        continue
 
-    # Add the depot point to the vehicle's delivery points
-    vehicle_points.insert(0, (depot_address, 0))
-    vehicle_points.append((depot_address, 0))
+def solve_large_day(road_graph, snapped, data, workers=1):
+    """
+    Solve a depot-wide day by sectors with sparse travel times (see `large_instance`).
 
-    # Create a distance matrix for the vehicle's delivery points
-    num_points = len(vehicle_points)
-    distance_matrix = np.zeros((num_points, num_points))
-    for i in range(num_points):
-        for j in range(num_points):
-            if i != j:
-                start_point = vehicle_points[i][0]
-                end_point = vehicle_points[j][0]
-                start_node = get_nearest_node(G, start_point)
-                end_node = get_nearest_node(G, end_point)
-                try:
-                    route_length = nx.shortest_path_length(G, start_node, end_node, weight='travel_time')
-                    distance_matrix[i][j] = route_length
-                except nx.NetworkXNoPath:
-                    distance_matrix[i][j] = float('inf')
+    Returns the routes and the sparse travel times, which rebuild the legs.
 
-    # Solve the TSP problem for the vehicle
-    tsp_path = solve_tsp(distance_matrix)
+    param road_graph: The routing graph.
+    param snapped: The `SnappedPoints` of the stops.
+    param data: The data model, without distance matrix.
+    param workers: The number of processes solving the per-vehicle TSPs.
+    """
+    from large_instance import solve_hierarchical
+
+    print(f"Solving {len(data['coords'])} stops by sectors (hierarchical mode)...")
+    tsp_paths, travel_times, large_stats = solve_hierarchical(
+        road_graph, snapped.nodes, data['coords'], data['num_vehicles'], data['vehicle_capacities'],
+        data['demands'], data['depot'], workers=workers
+    )
+    print(f"Hierarchical mode: {large_stats}")
+    return tsp_paths, travel_times
+
+
+def trace_legs(travel_times, tsp_paths, bucket_weights=None):
+    """
+    Rebuild the road path of every leg of every route.
+
+    Returns one list per vehicle of legs, each a dict with the `from` and `to`
+    stop indices, the `route_coords`, the `length` (m) and `duration` (s).
+    With `bucket_weights`, legs also get their `bucket_durations`: the
+    travel time of their path in every time bucket. Legs without any path
+    are reported and skipped.
+
+    param travel_times: The travel times the routes were solved on.
+    param tsp_paths: The routes (stop indices, depot first and last).
+    param bucket_weights: Optional edge attribute of every time bucket, see `speed_model.bucket_weights`.
+    """
+    from csr_graph import NoPathError
+
+    legs = []
+    for tsp_path in tsp_paths:
+        vehicle_legs = []
+        for start_idx, end_idx in zip(tsp_path[:-1], tsp_path[1:]):
+            # Nothing to drive when the route stays at the same stop (e.g. unused vehicle)
+            if start_idx == end_idx:
+                continue
+            try:
+                route, length, duration = travel_times.leg(start_idx, end_idx)
+            except NoPathError:
+                print(f"No path between stops {start_idx} and {end_idx}")
+                continue
+            leg = {'from': start_idx, 'to': end_idx, 'route_coords': travel_times.route_coords(route),
+                   'length': length, 'duration': duration}
+            if bucket_weights is not None:
+                leg['bucket_durations'] = np.array([travel_times.route_weight(route, weight)
+                                                    for weight in bucket_weights])
+            vehicle_legs.append(leg)
+        legs.append(vehicle_legs)
+    return legs
+
+
+def build_schedule(legs, day_start=DAY_START, service_minutes=DEFAULT_SERVICE_MINUTES, verbose=True, seed=None,
+                   time_windows=None, bucket_starts=None):
+    """
+    Compute the departure and arrival times of every delivery.
+
+    Every vehicle leaves the depot at `day_start`; each delivery takes a
+    random whole number of minutes between the `service_minutes` bounds. The
+    times of all vehicles are computed at once (see `schedule.leg_times`).
+    With `time_windows`, a vehicle arriving early waits for the window to open.
+    With `bucket_starts`, every leg takes its duration in the time bucket it
+    departs in (the legs then need `bucket_durations`).
+
+    Returns one list per vehicle of deliveries (dicts with `stop`, `depart`,
+    `arrival` and `service` minutes) and the total distance (m) and duration
+    (s) of every vehicle.
+
+    param legs: The legs of every vehicle, see `trace_legs`.
+    param day_start: The departure time from the depot.
+    param service_minutes: The (min, max) delivery duration in minutes.
+    param verbose: Print every delivery and the totals.
+    param seed: The random seed of the service times.
+    param time_windows: Optional [open, close] of every stop in seconds after `day_start`.
+    param bucket_starts: Optional start of every time bucket in seconds after `day_start`.
+    """
+    from schedule import LegArrays, draw_service_seconds, finish_times, leg_times
+
+    arrays = LegArrays(legs)
+    service = draw_service_seconds(arrays, service_minutes=service_minutes, rng=np.random.default_rng(seed))
+    opens = None if time_windows is None else time_windows[:, 0]
+    leg_durations = arrays.durations if bucket_starts is None else arrays.bucket_durations
+    departs, arrivals = leg_times(arrays, leg_durations, service, opens, bucket_starts)
+    distances = np.bincount(arrays.vehicles, weights=arrays.lengths, minlength=arrays.num_vehicles)
+    durations = finish_times(arrays, leg_durations, service, opens, bucket_starts)
+
+    start = datetime.datetime.combine(datetime.date.today(), day_start)
+    schedule = [[] for _ in legs]
+    for vehicle_id, stop, depart, arrival, service_seconds in zip(arrays.vehicles.tolist(), arrays.stops.tolist(),
+                                                                   departs.tolist(), arrivals.tolist(), service.tolist()):
+        schedule[vehicle_id].append({'stop': stop, 'depart': start + datetime.timedelta(seconds=depart),
+                                     'arrival': start + datetime.timedelta(seconds=arrival),
+                                     'service': int(service_seconds // 60)})
+
+    distances, durations = distances.tolist(), durations.tolist()
+    if verbose:
+        for vehicle_id, deliveries in enumerate(schedule):
+            for delivery_number, delivery in enumerate(deliveries, 1):
+                print(f"Vehicle {vehicle_id + 1}, delivery {delivery_number} depart {delivery['depart'].strftime('%H:%M')} arrival {delivery['arrival'].strftime('%H:%M')}, time to deliver {delivery['service']} minutes")
+            print(f"Vehicle {vehicle_id + 1} total distance: {distances[vehicle_id]:.2f} meters")
+            print(f"Vehicle {vehicle_id + 1} total duration: {durations[vehicle_id] / 60:.2f} minutes")
+        print(f"Total delivery distance for all vehicles: {sum(distances):.2f} meters")
+        print(f"Total delivery duration for all vehicles: {sum(durations) / 60:.2f} minutes")
+        for vehicle_id, duration in enumerate(durations):
+            print(f"Vehicle {vehicle_id + 1} delivery duration: {duration / 60:.2f} minutes")
+    return schedule, distances, durations
+
+
+def report_finish_times(legs, scenarios=DEFAULT_SCENARIOS, day_start=DAY_START, seed=None, time_windows=None,
+                        bucket_starts=None):
+    """
+    Simulate the day `scenarios` times (service times and traffic) and print the P50 / P90 finish time of every vehicle.
 
-    # Ensure the depot is the start and end point
-    if tsp_path[0] != 0:
-        tsp_path.insert(0, 0)
-    if tsp_path[-1] != 0:
-        tsp_path.append(0)
+    Returns the (P50, P90) finish times in seconds after `day_start`, one row per vehicle.
 
-    tsp_paths.append(tsp_path)
+    param legs: The legs of every vehicle, see `trace_legs`.
+    param scenarios: The number of simulated days.
+    param day_start: The departure time from the depot.
+    param seed: The random seed.
+    param time_windows: Optional [open, close] of every stop in seconds after `day_start`.
+    param bucket_starts: Optional start of every time bucket in seconds after `day_start`.
+    """
+    from schedule import simulate_finish_times
 
-# Lists to store per-vehicle distances and durations
-vehicle_durations = []
-vehicle_distances = []
+    quantiles = simulate_finish_times(legs, scenarios, seed=seed,
+                                      opens=None if time_windows is None else time_windows[:, 0],
+                                      bucket_starts=bucket_starts)
+    start = datetime.datetime.combine(datetime.date.today(), day_start)
+    print(f"Finish times over {scenarios} simulated days:")
+    for vehicle_id, (p50, p90) in enumerate(quantiles.tolist()):
+        print(f"Vehicle {vehicle_id + 1} back at {(start + datetime.timedelta(seconds=p50)).strftime('%H:%M')} (P50), "
+              f"{(start + datetime.timedelta(seconds=p90)).strftime('%H:%M')} (P90)")
+    return quantiles
 
-delivery_number = 1
 
-# Initialize start time at 8:00 AM
-current_time = datetime.datetime.combine(datetime.date.today(), datetime.time(8, 0))
+def _package_labels(manifest):
+    # Package IDs with tracking IDs like PKG0001
+    return [f"{name} (Tracking ID: PKG{i:04d})" for i, name in enumerate(manifest.ids, 1)]
 
-# Iterate over the TSP paths and calculate the shortest path for each vehicle
-for vehicle_id, tsp_path in enumerate(tsp_paths):
-    vehicle_color = vehicle_colors[vehicle_id % len(vehicle_colors)]  # Assign a color to each vehicle
-    vehicle_duration = 0  # Initialize the duration for this vehicle in seconds
-    vehicle_distance = 0  # Initialize the distance for this vehicle in meters
 
-    # Initialize current_time for each vehicle at 8:00 AM
-    current_time = datetime.datetime.combine(datetime.date.today(), datetime.time(8, 0))
+def _package_markers(map_folium, manifest):
+    import folium
 
-    # Initialize delivery number for each vehicle
-    delivery_number = 1
+    # Add points to the map with package IDs in tooltips
+    for point, tooltip_text in zip(manifest.coords, _package_labels(manifest)):
+        folium.Marker(location=point, tooltip=tooltip_text).add_to(map_folium)
 
-    # Iterate over the delivery points in tsp_path for this vehicle
-    for i in range(len(tsp_path) - 1):
-        start_idx = tsp_path[i]
-        end_idx = tsp_path[i + 1]
 
-        # Get the start and end points from vehicle_delivery_points
-        start_point = vehicle_delivery_points[vehicle_id][start_idx][0]
-        end_point = vehicle_delivery_points[vehicle_id][end_idx][0]
+def render_stops_map(manifest, file_path='map.html', compact=False):
+    """
+    Save a map of the packages, centered on the first one.
 
-        # Unpack the coordinates
-        start_lat, start_lon = float(start_point[0]), float(start_point[1])
-        end_lat, end_lon = float(end_point[0]), float(end_point[1])
+    param manifest: The `Manifest` of the day.
+    param file_path: The output HTML file.
+    param compact: Draw the packages as clustered markers, see `compact_map`.
+    """
+    if compact:
+        from compact_map import render_compact_stops_map
+        render_compact_stops_map(manifest.coords, _package_labels(manifest), file_path)
+        return
 
-        # Get the nearest nodes
-        start_node = get_nearest_node(G, (start_lat, start_lon))
-        end_node = get_nearest_node(G, (end_lat, end_lon))
+    import folium
 
-        # Find the shortest path between the nodes using travel_time as the weight
-        try:
-            # Get the route coordinates
-            route = nx.shortest_path(G, start_node, end_node, weight='travel_time')
-            route_coords = [(G.nodes[node]['y'], G.nodes[node]['x']) for node in route]
+    map_folium = folium.Map(location=manifest.coords[0], zoom_start=12)
+    _package_markers(map_folium, manifest)
+    map_folium.save(file_path)
 
-            # Calculate route length and duration
-            length = sum(ox.utils_graph.get_route_edge_attributes(G, route, 'length'))  # in meters
-            duration = sum(ox.utils_graph.get_route_edge_attributes(G, route, 'travel_time'))  # in seconds
-
-            # **Update vehicle's total distance and duration**
-            vehicle_distance += length
-            vehicle_duration += duration
-
-            # Calculate arrival time
-            arrival_time = current_time + datetime.timedelta(seconds=duration)
-
-            # Set the delivery duration as a random value between 2 and 6 minutes
-            delivery_duration = random.randint(2, 6)  # Time in minutes
-
-            # Print the formatted output
-            print(f"Vehicle {vehicle_id + 1}, delivery {delivery_number} depart {current_time.strftime('%H:%M')} arrival {arrival_time.strftime('%H:%M')}, time to deliver {delivery_duration} minutes")
-
-            # **Update vehicle's duration with delivery time**
-            vehicle_duration += delivery_duration * 60  # Convert minutes to seconds
-
-            # Update current_time after delivery duration
-            current_time = arrival_time + datetime.timedelta(minutes=delivery_duration)
-
-            # Increment the delivery number for the next iteration
-            delivery_number += 1
 
+def render_routes_map(manifest, stop_coords, legs, schedule, file_path='rouen_deliveries_map.html', compact=False,
+                      max_bytes=MAP_SIZE_BUDGET):
+    """
+    Save the map of the routes: packages, one colored path per vehicle with arrows, and the arrival times.
+
+    The compact mode draws one simplified line per vehicle and clustered
+    stops instead, and keeps the page under `max_bytes` (see `compact_map`).
+
+    param manifest: The `Manifest` of the day.
+    param stop_coords: Array of (latitude, longitude) of the stops, depot first.
+    param legs: The legs of every vehicle, see `trace_legs`.
+    param schedule: The deliveries of every vehicle, see `build_schedule`.
+    param file_path: The output HTML file.
+    param compact: Render the compact map.
+    param max_bytes: The size budget of the compact map.
+    """
+    if compact:
+        from compact_map import render_compact_map
+        render_compact_map(stop_coords, ['Depot'] + _package_labels(manifest), legs, schedule, file_path,
+                           VEHICLE_COLORS, max_bytes)
+        return
+
+    import folium
+    from folium.plugins import PolyLineTextPath
+
+    map_folium_final = folium.Map(location=manifest.coords[0], zoom_start=12)
+    _package_markers(map_folium_final, manifest)
+    for vehicle_id, (vehicle_legs, deliveries) in enumerate(zip(legs, schedule)):
+        vehicle_color = VEHICLE_COLORS[vehicle_id % len(VEHICLE_COLORS)]
+        for leg, delivery in zip(vehicle_legs, deliveries):
             # Add the route to the map
-            polyline = folium.PolyLine(route_coords, color=vehicle_color, weight=5, opacity=0.7)
+            polyline = folium.PolyLine(leg['route_coords'], color=vehicle_color, weight=5, opacity=0.7)
             map_folium_final.add_child(polyline)
 
             # Add arrows to the path
@@ -402,49 +542,180 @@ for vehicle_id, tsp_path in enumerate(tsp_paths):
 
             # Add marker for the end point with arrival time
             folium.Marker(
-                location=[end_lat, end_lon],
+                location=stop_coords[leg['to']],
                 icon=folium.Icon(color='white', icon_color=vehicle_color, icon='flag', prefix='fa'),
-                popup=f"Arrival Time: {arrival_time.strftime('%H:%M')}"
+                popup=f"Arrival Time: {delivery['arrival'].strftime('%H:%M')}"
             ).add_to(map_folium_final)
+    map_folium_final.save(file_path)
 
-        except nx.NetworkXNoPath:
-            print(f"No path between ({start_lat}, {start_lon}) and ({end_lat}, {end_lon})")
-
-    # **After all deliveries for this vehicle, add to totals**
-    total_delivery_distance += vehicle_distance
-    total_delivery_duration += vehicle_duration
-
-    # **Store per-vehicle distance and duration**
-    vehicle_distances.append(vehicle_distance)
-    vehicle_durations.append(vehicle_duration)
-
-    # **Print total distance and duration for this vehicle**
-    print(f"Vehicle {vehicle_id + 1} total distance: {vehicle_distance:.2f} meters")
-    print(f"Vehicle {vehicle_id + 1} total duration: {vehicle_duration / 60:.2f} minutes")  # Convert to minutes
 
-# -------------------------------
-# 6. Sauvegarder la carte finale avec les routes et les points de livraison
-# -------------------------------
-
-map_folium_final.save('rouen_deliveries_map.html')
-
-# **Print total delivery distance and duration for all vehicles**
-print(f"Total delivery distance for all vehicles: {total_delivery_distance:.2f} meters")
-print(f"Total delivery duration for all vehicles: {total_delivery_duration / 60:.2f} minutes")  # Convert to minutes
-
-# Print the delivery duration for each vehicle
-for vehicle_id, duration in enumerate(vehicle_durations):
-    print(f"Vehicle {vehicle_id + 1} delivery duration: {duration / 60:.2f} minutes")  # Convert seconds to minutes
-
-
-# When displaying the optimal path in terminal:
-def print_route_with_packages(route):
-    print("\nDelivery Route with Package IDs:")
-    print("--------------------------------")
-    for i, node in enumerate(route, 1):
-        point_index = points.index((node[1], node[0]))  # Convert node coords to point index
-        pkg_id = delivery_points[point_index][2]
-        location_name = delivery_points[point_index][1]
-        print(f"Stop {i}: {location_name} - Package ID: {pkg_id}")
-
-print("temps de compilation :", datetime.datetime.now() - start_date)
\ No newline at end of file
+def plan_day(manifest_path=DEFAULT_MANIFEST, num_vehicles=4, depot=DEPOT, strategy='ortools', time_limit=30,
+             candidate_neighbors=CANDIDATE_NEIGHBORS, center=ORIGIN_CITY, radius_km=GRAPH_RADIUS_KM,
+             plan_file='last_plan.json', replan=True, stops_map='map.html', routes_map='rouen_deliveries_map.html',
+             workers=None, backend='csr', map_mode='auto', eta_scenarios=DEFAULT_SCENARIOS, profiler=None,
+             time_profile=None, graph_cache=None):
+    """
+    Run the whole pipeline on a manifest and write the maps.
+
+    Returns the routes (stop indices, depot first and last) and the schedule of every vehicle.
+
+    param manifest_path: The manifest (.xlsx, .csv or .parquet).
+    param num_vehicles: The number of vehicles.
+    param depot: The (latitude, longitude) of the depot.
+    param strategy: The routing strategy, see `solve_day`.
+    param time_limit: The OR-Tools search budget in seconds.
+    param candidate_neighbors: The number of candidate stops per stop above CANDIDATE_MIN_STOPS stops, None for
+        the full matrix.
+    param center: The (latitude, longitude) the road graph is centered on.
+    param radius_km: The radius of the road graph.
+    param plan_file: The plan file used to re-plan, None to disable it.
+    param replan: Start from the previous plan when there is one.
+    param stops_map: The output map of the packages, None to skip it.
+    param routes_map: The output map of the routes, None to skip it.
+    param workers: The number of processes for the searches and per-vehicle TSPs (default: all CPUs).
+    param backend: The routing backend, 'csr' or 'networkx'.
+    param map_mode: 'full', 'compact', or 'auto' for compact maps above COMPACT_MAP_STOPS packages.
+    param eta_scenarios: The number of simulated days behind the P50 / P90 finish times, 0 to skip them.
+    param profiler: Optional `StageProfiler` timing every stage (the hierarchical mode counts its
+        travel times in 'solve').
+    param time_profile: Optional time-of-day speed profile (see `speed_model.DEFAULT_TIME_PROFILE`): legs are
+        then costed in the time bucket they depart in.
+    param graph_cache: The road graph cache directory, see `load_road_graph`.
+    """
+    from large_instance import LARGE_INSTANCE_STOPS
+    from parallel import default_workers
+    from time_windows import DEFAULT_SERVICE_SECONDS, manifest_time_windows
+
+    workers = default_workers() if workers is None else workers
+    with stage(profiler, 'load'):
+        manifest, stop_coords = load_stops(manifest_path, depot)
+    compact = map_mode == 'compact' or (map_mode == 'auto' and len(manifest) > COMPACT_MAP_STOPS)
+    if stops_map:
+        with stage(profiler, 'map render'):
+            render_stops_map(manifest, stops_map, compact)
+
+    day_start_seconds = DAY_START.hour * 3600 + DAY_START.minute * 60
+    if time_profile is not None and len(stop_coords) > LARGE_INSTANCE_STOPS:
+        print("Warning: time-dependent travel times are not supported in hierarchical mode, they are ignored")
+        time_profile = None
+    road_graph, graph_version = load_road_graph(center, radius_km, profiler=profiler, backend=backend,
+                                                time_profile=time_profile, cache_dir=graph_cache)
+    with stage(profiler, 'snapping'):
+        snapped = snap_stops(road_graph, stop_coords)
+
+    time_windows, service_times = manifest_time_windows(manifest.columns, len(manifest), day_start_seconds)
+    if time_windows is not None and len(stop_coords) > LARGE_INSTANCE_STOPS:
+        print("Warning: time windows are not supported in hierarchical mode, they are ignored")
+        time_windows = None
+    data = create_data_model(stop_coords, num_vehicles, time_windows=time_windows, service_times=service_times)
+    # Depot-wide days are too large for a dense matrix: they are decomposed into sectors with sparse travel times
+    if len(stop_coords) > LARGE_INSTANCE_STOPS:
+        with stage(profiler, 'solve'):
+            tsp_paths, travel_times = solve_large_day(road_graph, snapped, data, workers)
+    else:
+        if len(stop_coords) <= CANDIDATE_MIN_STOPS:
+            candidate_neighbors = None
+        with stage(profiler, 'matrix'):
+            travel_times = compute_travel_times(road_graph, snapped, candidate_neighbors, graph_version, workers)
+            data['distance_matrix'] = travel_times.matrix
+            if time_profile is not None:
+                from matrix_engine import bucket_matrices
+                from speed_model import bucket_start_seconds, bucket_weights
+                data['bucket_matrices'] = bucket_matrices(
+                    road_graph, snapped.nodes, snapped.points, bucket_weights(time_profile),
+                    travel_times.neighbors if candidate_neighbors else None)
+                data['bucket_starts'] = bucket_start_seconds(time_profile) - day_start_seconds
+                if data.get('service_times') is None:
+                    data['service_times'] = np.full(len(stop_coords), float(DEFAULT_SERVICE_SECONDS))
+                    data['service_times'][0] = 0
+        with stage(profiler, 'solve'):
+            if time_windows is not None:
+                check_time_windows(data, ['depot'] + manifest.ids.tolist())
+            tsp_paths = solve_day(data, ['depot'] + manifest.ids.tolist(), strategy, time_limit,
+                                  plan_file=plan_file, replan=replan, workers=workers)
+            if time_windows is not None:
+                planned = np.zeros(len(stop_coords), dtype=bool)
+                planned[[0, *data['skipped']]] = True
+                planned[np.concatenate(tsp_paths)] = True
+                if not planned.all():
+                    print(f"Warning: {(~planned).sum()} packages do not fit in the routes with their time windows: "
+                          f"{manifest.ids[np.flatnonzero(~planned) - 1].tolist()}")
+    print("Routes solved!")
+
+    with stage(profiler, 'schedule'):
+        bucket_starts = data.get('bucket_starts')
+        weights = None
+        if bucket_starts is not None:
+            from speed_model import bucket_weights
+            weights = bucket_weights(time_profile)
+        legs = trace_legs(travel_times, tsp_paths, weights)
+        schedule, _, _ = build_schedule(legs, time_windows=time_windows, bucket_starts=bucket_starts)
+        if eta_scenarios:
+            report_finish_times(legs, eta_scenarios, time_windows=time_windows, bucket_starts=bucket_starts)
+    if routes_map:
+        with stage(profiler, 'map render'):
+            render_routes_map(manifest, stop_coords, legs, schedule, routes_map, compact)
+    return tsp_paths, schedule
+
+
+def _coordinates(text):
+    latitude, longitude = (float(value) for value in text.split(','))
+    return latitude, longitude
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m project', description="Plan the delivery routes of a manifest.")
+    parser.add_argument('manifest', nargs='?', default=DEFAULT_MANIFEST, help="Manifest file (.xlsx, .csv or .parquet)")
+    parser.add_argument('--vehicles', type=int, default=4)
+    parser.add_argument('--depot', type=_coordinates, default=DEPOT, help="Depot as 'lat,lon'")
+    parser.add_argument('--strategy', choices=['ortools', 'cluster_tsp', 'greedy'], default='ortools')
+    parser.add_argument('--time-limit', type=float, default=30, help="OR-Tools search budget in seconds")
+    parser.add_argument('--candidates', type=int, default=CANDIDATE_NEIGHBORS,
+                        help=f"Exact travel times per stop (nearest stops) above {CANDIDATE_MIN_STOPS} stops, "
+                             f"0 for the full matrix")
+    parser.add_argument('--center', type=_coordinates, default=ORIGIN_CITY, help="Road graph center as 'lat,lon'")
+    parser.add_argument('--radius', type=float, default=GRAPH_RADIUS_KM, help="Road graph radius in km")
+    parser.add_argument('--plan', default='last_plan.json', help="Plan file kept between runs")
+    parser.add_argument('--no-replan', action='store_true', help="Solve from scratch even if a previous plan exists")
+    parser.add_argument('--stops-map', default='map.html', help="Output map of the packages")
+    parser.add_argument('--routes-map', default='rouen_deliveries_map.html', help="Output map of the routes")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all CPUs)")
+    parser.add_argument('--backend', choices=['csr', 'networkx'], default='csr')
+    parser.add_argument('--map-mode', choices=['auto', 'full', 'compact'], default='auto',
+                        help=f"Compact maps (merged, simplified routes and clustered stops) for large plans; "
+                             f"'auto' above {COMPACT_MAP_STOPS} packages")
+    parser.add_argument('--eta-scenarios', type=int, default=DEFAULT_SCENARIOS,
+                        help="Simulated days (service times and traffic) for the P50 / P90 finish times, 0 to skip")
+    parser.add_argument('--graph-cache', help="Road graph cache directory (default: graph_cache); "
+                                              "fixtures/graph_cache holds a small pre-baked graph to run offline")
+    parser.add_argument('--time-dependent', action='store_true',
+                        help="Cost every leg with the time-of-day speeds of its departure time (rush hours)")
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE,
+                        help="File the per-stage timings of the run are appended to (read by plot_data.py), '' to skip")
+    args = parser.parse_args(argv)
+
+    # Suppress FutureWarnings
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+
+    time_profile = None
+    if args.time_dependent:
+        from speed_model import DEFAULT_TIME_PROFILE
+        time_profile = DEFAULT_TIME_PROFILE
+
+    start_date = datetime.datetime.now()
+    profiler = StageProfiler()
+    tsp_paths, _ = plan_day(args.manifest, args.vehicles, args.depot, args.strategy, args.time_limit,
+                            args.candidates or None, args.center, args.radius, args.plan, not args.no_replan,
+                            args.stops_map, args.routes_map, args.workers, args.backend, args.map_mode, args.eta_scenarios,
+                            profiler, time_profile, args.graph_cache)
+    print("temps de compilation :", datetime.datetime.now() - start_date)
+
+    profiler.report()
+    if args.results:
+        addresses = sum(len(route) - 2 for route in tsp_paths)
+        append_result(profiler.record(trucks=args.vehicles, addresses=addresses, strategy=args.strategy,
+                                      manifest=os.path.basename(args.manifest)), args.results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import numpy as np
+
+# Delivery schedules as arrays: every leg of every vehicle is one entry of flat arrays, vehicle after
+# vehicle, so the times of a whole plan (or of thousands of simulated days) are cumulative sums.
+
+DEFAULT_SERVICE_MINUTES = (2, 6)
+DEFAULT_SCENARIOS = 10000
+DEFAULT_TRAFFIC_SIGMA = 0.2  # Spread of the lognormal factor applied to every leg duration
+DEFAULT_QUANTILES = (0.5, 0.9)
+
+
+class LegArrays:
+    """
+    The legs of every vehicle as flat arrays.
+
+    `offsets[v]:offsets[v + 1]` are the legs of vehicle `v`, in driving order;
+    `origins` and `stops` are the stop each leg leaves from and arrives at.
+    Legs ending at the depot have no service time. With time-dependent travel
+    times, `bucket_durations` holds the duration of every leg in every time
+    bucket, shape (buckets, legs).
+    """
+
+    def __init__(self, legs, depot=0):
+        """
+        param legs: The legs of every vehicle, see `project.trace_legs`.
+        param depot: The index of the depot.
+        """
+        flat = [leg for vehicle_legs in legs for leg in vehicle_legs]
+        self.stops = np.array([leg['to'] for leg in flat], dtype=int)
+        self.durations = np.array([leg['duration'] for leg in flat], dtype=float)
+        self.lengths = np.array([leg['length'] for leg in flat], dtype=float)
+        self.counts = np.array([len(vehicle_legs) for vehicle_legs in legs], dtype=int)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        if all('from' in leg for leg in flat):
+            self.origins = np.array([leg['from'] for leg in flat], dtype=int)
+        else:
+            # Without `from`, legs are chained: each vehicle leaves the depot, then the stop it last reached
+            self.origins = np.concatenate([[depot], self.stops[:-1]]).astype(int)
+            self.origins[self.offsets[:-1][self.counts > 0]] = depot
+        self.vehicles = np.repeat(np.arange(len(legs)), self.counts)
+        self.serviced = self.stops != depot
+        self.bucket_durations = np.array([leg['bucket_durations'] for leg in flat], dtype=float).T \
+            if flat and 'bucket_durations' in flat[0] else None
+
+    def __len__(self):
+        return len(self.stops)
+
+    @property
+    def num_vehicles(self):
+        return len(self.counts)
+
+
+def bucket_index(seconds, bucket_starts):
+    """
+    Return the time bucket of every time, the last bucket started at or before it.
+
+    param seconds: Times in seconds after the day start.
+    param bucket_starts: The start of every bucket in seconds after the day start, increasing.
+    """
+    return np.maximum(np.searchsorted(bucket_starts, seconds, side='right') - 1, 0)
+
+
+def segment_cumsum(values, offsets):
+    """
+    Cumulative sums restarting at every segment, along the last axis.
+
+    param values: Array of shape (..., n).
+    param offsets: The segment bounds, from 0 to n.
+    """
+    totals = np.concatenate([np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1)], axis=-1)
+    # Subtract, in every segment, the running total reached before it
+    before = totals[..., offsets[:-1]]
+    return totals[..., 1:] - np.repeat(before, np.diff(offsets), axis=-1)
+
+
+def draw_service_seconds(arrays, size=None, service_minutes=DEFAULT_SERVICE_MINUTES, rng=None):
+    """
+    Draw a whole number of service minutes per delivery, uniformly between the bounds, in seconds.
+
+    param arrays: The `LegArrays` of the plan.
+    param size: The number of scenarios, None for a single draw.
+    param service_minutes: The (min, max) delivery duration in minutes, inclusive.
+    param rng: The NumPy random generator.
+    """
+    rng = rng or np.random.default_rng()
+    shape = (len(arrays),) if size is None else (size, len(arrays))
+    return rng.integers(service_minutes[0], service_minutes[1] + 1, shape) * 60.0 * arrays.serviced
+
+
+def leg_times(arrays, durations, service_seconds, opens=None, bucket_starts=None):
+    """
+    Compute the departure and arrival time of every leg, in seconds after the vehicles leave the depot.
+
+    The arrival at a stop is the sum of the previous legs and services of the
+    vehicle plus the leg itself: one segmented cumulative sum. With time
+    windows, a vehicle arriving early waits for the window to open (the
+    arrival is then the opening time) and the legs are stepped through by
+    position, all vehicles and scenarios at once. The same stepping picks,
+    with time buckets, the duration of every leg in the bucket it starts in.
+
+    param arrays: The `LegArrays` of the plan.
+    param durations: The leg durations, shape (..., legs), or (buckets, ..., legs) with `bucket_starts`.
+    param service_seconds: The service time at the end of every leg, shape (..., legs).
+    param opens: Optional opening time of every stop, indexed by stop.
+    param bucket_starts: Optional start of every time bucket in seconds after the day start.
+    """
+    if opens is None and bucket_starts is None:
+        finished = segment_cumsum(durations + service_seconds, arrays.offsets)
+        arrivals = finished - service_seconds
+        return arrivals - durations, arrivals
+
+    scenario_shape = durations.shape[1:-1] if bucket_starts is not None else durations.shape[:-1]
+    departs = np.empty(np.broadcast_shapes(scenario_shape + durations.shape[-1:], service_seconds.shape))
+    arrivals = np.empty_like(departs)
+    clock = np.zeros(departs.shape[:-1] + (arrays.num_vehicles,))
+    stop_opens = np.zeros(len(arrays)) if opens is None else np.asarray(opens, dtype=float)[arrays.stops]
+    if bucket_starts is not None:
+        # Flat scenario index, to pick (bucket, scenario, leg) triples
+        scenarios = np.arange(int(np.prod(scenario_shape))).reshape(scenario_shape + (1,))
+        durations = durations.reshape((len(durations), -1, durations.shape[-1]))
+    for position in range(arrays.counts.max(initial=0)):
+        vehicles = np.flatnonzero(arrays.counts > position)
+        legs = arrays.offsets[vehicles] + position
+        departs[..., legs] = clock[..., vehicles]
+        if bucket_starts is None:
+            leg_durations = durations[..., legs]
+        else:
+            leg_durations = durations[bucket_index(clock[..., vehicles], bucket_starts), scenarios, legs]
+        arrivals[..., legs] = np.maximum(clock[..., vehicles] + leg_durations, stop_opens[legs])
+        clock[..., vehicles] = arrivals[..., legs] + np.broadcast_to(service_seconds, departs.shape)[..., legs]
+    return departs, arrivals
+
+
+def finish_times(arrays, durations, service_seconds, opens=None, bucket_starts=None):
+    """
+    Return the time every vehicle is back and done, in seconds after leaving the depot, shape (..., vehicles).
+
+    param arrays: The `LegArrays` of the plan.
+    param durations: The leg durations, shape (..., legs).
+    param service_seconds: The service time at the end of every leg, same shape.
+    param opens: Optional opening time of every stop, indexed by stop (see `leg_times`).
+    param bucket_starts: Optional start of every time bucket, `durations` then has a leading bucket axis.
+    """
+    leg_shape = durations.shape[1:] if bucket_starts is not None else durations.shape
+    totals = np.zeros(np.broadcast_shapes(leg_shape, service_seconds.shape)[:-1] + (arrays.num_vehicles,))
+    used = arrays.counts > 0
+    if not len(arrays):
+        return totals
+    if opens is not None or bucket_starts is not None:
+        _, arrivals = leg_times(arrays, durations, service_seconds, opens, bucket_starts)
+        last = arrays.offsets[1:][used] - 1
+        totals[..., used] = arrivals[..., last] + np.broadcast_to(service_seconds, arrivals.shape)[..., last]
+    else:
+        # reduceat sums each segment; unused vehicles have an empty one and stay at 0
+        totals[..., used] = np.add.reduceat(durations + service_seconds, arrays.offsets[:-1][used], axis=-1)
+    return totals
+
+
+def simulate_finish_times(legs, scenarios=DEFAULT_SCENARIOS, service_minutes=DEFAULT_SERVICE_MINUTES,
+                          traffic_sigma=DEFAULT_TRAFFIC_SIGMA, quantiles=DEFAULT_QUANTILES, depot=0, seed=None,
+                          chunk_size=2000, opens=None, bucket_starts=None):
+    """
+    Simulate many delivery days and return the quantiles of every vehicle's finish time.
+
+    Each scenario draws the service time of every delivery and a lognormal
+    traffic factor (mean 1) for every leg duration. Scenarios are simulated
+    `chunk_size` at a time as (scenarios, legs) arrays.
+
+    Returns an array of shape (vehicles, len(quantiles)), in seconds after
+    the vehicles leave the depot.
+
+    param legs: The legs of every vehicle, see `project.trace_legs`.
+    param scenarios: The number of simulated days.
+    param service_minutes: The (min, max) delivery duration in minutes.
+    param traffic_sigma: The standard deviation of the log traffic factor, 0 for the nominal durations.
+    param quantiles: The quantiles to report.
+    param depot: The index of the depot.
+    param seed: The random seed.
+    param chunk_size: The number of scenarios simulated at once, bounds memory.
+    param opens: Optional opening time of every stop, vehicles wait for it (see `leg_times`).
+    param bucket_starts: Optional start of every time bucket: legs then take the duration of the bucket they
+        start in (`LegArrays.bucket_durations`).
+    """
+    arrays = legs if isinstance(legs, LegArrays) else LegArrays(legs, depot)
+    rng = np.random.default_rng(seed)
+    finishes = np.empty((scenarios, arrays.num_vehicles))
+    for start in range(0, scenarios, chunk_size):
+        size = min(chunk_size, scenarios - start)
+        traffic = rng.lognormal(-traffic_sigma ** 2 / 2, traffic_sigma, (size, len(arrays))) if traffic_sigma \
+            else np.ones((size, len(arrays)))
+        service = draw_service_seconds(arrays, size, service_minutes, rng)
+        durations = arrays.durations * traffic if bucket_starts is None \
+            else arrays.bucket_durations[:, None, :] * traffic
+        finishes[start:start + size] = finish_times(arrays, durations, service, opens, bucket_starts)
+    return np.quantile(finishes, quantiles, axis=0).T
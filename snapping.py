@@ -0,0 +1,70 @@
+import numpy as np
+from sklearn.neighbors import BallTree
+from csr_graph import CSRGraph
+from geo import EARTH_RADIUS_M
+
+
+class SnappedPoints:
+    """
+    Result of snapping a list of points to the road graph.
+
+    Holds the graph node and the snap distance (in meters) of every point, in
+    the same order as the points were given.
+    """
+
+    def __init__(self, points, nodes, distances):
+        self.points = np.asarray(points, dtype=float)
+        self.nodes = np.asarray(nodes)
+        self.distances = np.asarray(distances, dtype=float)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, index):
+        """
+        Return the graph node a point was snapped to.
+
+        param index: The index of the point in the snapped list.
+        """
+        return self.nodes[index].item()
+
+    def far_points(self, max_distance):
+        """
+        Return the indices of points snapped further than `max_distance` meters from the road graph.
+
+        These are usually bad geocodes (address outside the downloaded area, wrong coordinates...).
+
+        param max_distance: The snap distance threshold in meters.
+        """
+        return np.flatnonzero(self.distances > max_distance)
+
+
+class PointSnapper:
+    """
+    Nearest road-graph node lookup backed by a haversine BallTree.
+
+    The tree is built once per graph, and a whole list of points is resolved in
+    a single vectorized query.
+    """
+
+    def __init__(self, G):
+        """
+        param G: The (unprojected) road graph, nodes must have `x` (longitude) and `y` (latitude), or a `CSRGraph`.
+        """
+        if isinstance(G, CSRGraph):
+            self.node_ids = G.node_ids
+            coords = np.column_stack([G.y, G.x])
+        else:
+            self.node_ids = np.array(list(G.nodes))
+            coords = np.array([(data['y'], data['x']) for _, data in G.nodes(data=True)], dtype=float)
+        self.tree = BallTree(np.radians(coords), metric='haversine')
+
+    def snap(self, points):
+        """
+        Snap every point to its nearest graph node.
+
+        param points: An array-like of (latitude, longitude) pairs.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        distances, positions = self.tree.query(np.radians(points), k=1)
+        return SnappedPoints(points, self.node_ids[positions[:, 0]], distances[:, 0] * EARTH_RADIUS_M)
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import numpy as np
+
+# Speeds are in km/h. `highway_speeds` is matched in order against the edge road
+# class (substring match, so 'motorway_link' uses the motorway speed) and only
+# applies to edges that carry a maxspeed tag, like the original per-edge loop.
+DEFAULT_SPEED_PROFILE = {
+    'highway_speeds': [
+        ('motorway', 130.0),
+        ('trunk', 110.0),
+        ('primary', 90.0),
+        ('residential', 30.0),
+    ],
+    'max_speed': 130.0,      # Cap applied to numeric maxspeed tags
+    'default_speed': 50.0,   # Used when maxspeed is missing or cannot be parsed
+}
+
+
+def profile_signature(profile=DEFAULT_SPEED_PROFILE):
+    """
+    Return a short hash identifying a speed profile, used to invalidate cached travel times.
+
+    param profile: The speed profile.
+    """
+    return hashlib.sha1(json.dumps(profile, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _first(value):
+    # osmnx merges attributes of simplified edges into lists, keep the first one
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return '' if value is None else str(value)
+
+
+def _parse_maxspeed(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _lookup(values, function):
+    # Evaluate `function` once per distinct string and broadcast the result back
+    unique_values, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return np.array([function(value) for value in unique_values], dtype=float)[inverse.reshape(-1)]
+
+
+def edge_speeds(highway, maxspeed, profile=DEFAULT_SPEED_PROFILE):
+    """
+    Compute the speed (km/h) of every edge from its road class and maxspeed columns.
+
+    param highway: Array of road classes, one per edge ('' if missing).
+    param maxspeed: Array of maxspeed tags, one per edge ('' if missing).
+    param profile: The speed profile, see `DEFAULT_SPEED_PROFILE`.
+    """
+    def class_speed(highway_type):
+        highway_type = highway_type.lower()
+        for road_class, speed in profile['highway_speeds']:
+            if road_class in highway_type:
+                return speed
+        return np.nan
+
+    maxspeed = np.asarray(maxspeed, dtype=str)
+    class_speeds = _lookup(highway, class_speed)
+    tagged_speeds = np.minimum(_lookup(maxspeed, _parse_maxspeed), profile['max_speed'])
+
+    speeds = np.where(np.isnan(class_speeds), tagged_speeds, class_speeds)
+    speeds = np.where(np.isnan(speeds) | (maxspeed == ''), profile['default_speed'], speeds)
+    return speeds
+
+
+def edge_travel_times(length, highway, maxspeed, profile=DEFAULT_SPEED_PROFILE):
+    """
+    Compute the travel time (s) of every edge as one array operation.
+
+    param length: Array of edge lengths in meters.
+    param highway: Array of road classes, one per edge.
+    param maxspeed: Array of maxspeed tags, one per edge.
+    param profile: The speed profile.
+    """
+    return np.asarray(length, dtype=float) / (edge_speeds(highway, maxspeed, profile) * 1000 / 3600)
+
+
+def annotate_travel_times(G, profile=DEFAULT_SPEED_PROFILE):
+    """
+    Add a `travel_time` attribute (s) to every edge of the graph that has a `length`.
+
+    The edge attributes are read once as columns, the speeds computed in bulk and
+    the travel times written back in a single pass.
+
+    param G: The road graph.
+    param profile: The speed profile.
+    """
+    edges = [data for _, _, data in G.edges(data=True) if 'length' in data]
+    travel_times = edge_travel_times(
+        [data['length'] for data in edges],
+        [_first(data.get('highway')) for data in edges],
+        [_first(data.get('maxspeed')) for data in edges],
+        profile
+    )
+    for data, travel_time in zip(edges, travel_times.tolist()):
+        data['travel_time'] = travel_time
+    return G
+
+
+# Time-of-day speed factors per road class: bucket b covers from `bucket_starts[b]` to the next start (the
+# last one runs until midnight) and every speed of the class is multiplied by `factors[b]` during it.
+# Classes are matched in order like `highway_speeds`; unmatched edges use `default_factors`.
+DEFAULT_TIME_PROFILE = {
+    'bucket_starts': ['00:00', '07:00', '09:30', '16:00', '19:00'],
+    'class_factors': [
+        ('motorway', [1.0, 0.55, 0.9, 0.6, 1.0]),
+        ('trunk', [1.0, 0.6, 0.9, 0.65, 1.0]),
+        ('primary', [1.0, 0.7, 0.9, 0.7, 1.0]),
+        ('secondary', [1.0, 0.75, 0.9, 0.75, 1.0]),
+        ('residential', [1.0, 0.9, 1.0, 0.9, 1.0]),
+    ],
+    'default_factors': [1.0, 0.8, 0.95, 0.8, 1.0],
+}
+
+
+def bucket_weights(profile=DEFAULT_TIME_PROFILE):
+    """
+    Return the edge attribute holding the travel times of every time bucket, e.g. 'travel_time_0700'.
+
+    param profile: The time profile, see `DEFAULT_TIME_PROFILE`.
+    """
+    return [f"travel_time_{start.replace(':', '')}" for start in profile['bucket_starts']]
+
+
+def bucket_start_seconds(profile=DEFAULT_TIME_PROFILE):
+    """
+    Return the start of every time bucket in seconds since midnight.
+
+    param profile: The time profile.
+    """
+    hours, minutes = np.array([start.split(':') for start in profile['bucket_starts']], dtype=float).T
+    return hours * 3600 + minutes * 60
+
+
+def edge_time_factors(highway, profile=DEFAULT_TIME_PROFILE):
+    """
+    Compute the speed factor of every edge in every time bucket, shape (buckets, edges).
+
+    param highway: Array of road classes, one per edge ('' if missing).
+    param profile: The time profile.
+    """
+    def class_index(highway_type):
+        highway_type = highway_type.lower()
+        for position, (road_class, _) in enumerate(profile['class_factors']):
+            if road_class in highway_type:
+                return position
+        return len(profile['class_factors'])
+
+    # One row of factors per class, the default last
+    factors = np.array([factors for _, factors in profile['class_factors']] + [profile['default_factors']])
+    return factors[_lookup(highway, class_index).astype(int)].T
+
+
+def bucket_travel_times(travel_time, highway, profile=DEFAULT_TIME_PROFILE):
+    """
+    Compute the travel time (s) of every edge in every time bucket, shape (buckets, edges).
+
+    param travel_time: Array of the edges' static travel times.
+    param highway: Array of road classes, one per edge ('' if missing).
+    param profile: The time profile.
+    """
+    return np.asarray(travel_time, dtype=float) / edge_time_factors(highway, profile)
+
+
+def annotate_time_buckets(G, profile=DEFAULT_TIME_PROFILE):
+    """
+    Add the travel time (s) of every time bucket to every edge that has a `travel_time`, see `bucket_weights`.
+
+    The factors of all buckets are computed as one (buckets, edges) array
+    from the road classes read once, then written back in a single pass.
+
+    param G: The road graph, annotated by `annotate_travel_times`.
+    param profile: The time profile.
+    """
+    edges = [data for _, _, data in G.edges(data=True) if 'travel_time' in data]
+    bucket_times = bucket_travel_times([data['travel_time'] for data in edges],
+                                       [_first(data.get('highway')) for data in edges], profile)
+    names = bucket_weights(profile)
+    for data, times in zip(edges, bucket_times.T.tolist()):
+        data.update(zip(names, times))
+    return G
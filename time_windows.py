@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# Delivery time windows, in seconds after the start of the day (the time the vehicles leave the depot).
+# Manifests give them as optional clock-time columns, e.g. '09:30' and '11:00'; a stop without
+# window can be delivered at any time of the day.
+
+WINDOW_START_COLUMN = 'Window start'
+WINDOW_END_COLUMN = 'Window end'
+SERVICE_COLUMN = 'Service minutes'
+WINDOW_DTYPES = {WINDOW_START_COLUMN: 'string', WINDOW_END_COLUMN: 'string', SERVICE_COLUMN: 'float64'}
+
+DEFAULT_HORIZON = 12 * 3600  # seconds, every vehicle must be back at the depot by then
+DEFAULT_SERVICE_SECONDS = 4 * 60  # Planned service time when the manifest has none, the mean of the drawn ones
+
+
+def clock_seconds(values):
+    """
+    Convert clock times ('9:30', '09:30:00'...) into seconds since midnight, NaN where missing or unreadable.
+
+    param values: Array-like of clock-time strings.
+    """
+    text = pd.Series(values, dtype='string').str.strip()
+    # 'HH:MM' is not a timedelta format, give it seconds
+    text = text.where(text.str.count(':') != 1, text + ':00')
+    return pd.to_timedelta(text, errors='coerce').dt.total_seconds().to_numpy(dtype=float, na_value=np.nan)
+
+
+def manifest_time_windows(columns, num_stops, day_start_seconds, horizon=DEFAULT_HORIZON,
+                          service_seconds=DEFAULT_SERVICE_SECONDS):
+    """
+    Build the time window and planned service time of every stop, depot first, from the manifest columns.
+
+    Returns a (num_stops + 1, 2) array of [open, close] seconds after the day
+    start and the service seconds of every stop, or (None, None) when no
+    package has a window. Missing bounds default to the whole day.
+
+    param columns: The optional columns of the `Manifest` (see WINDOW_DTYPES).
+    param num_stops: The number of packages.
+    param day_start_seconds: The time the vehicles leave the depot, in seconds since midnight.
+    param horizon: The length of the day in seconds.
+    param service_seconds: The service time of packages without a SERVICE_COLUMN value.
+    """
+    opens = np.full(num_stops, np.nan)
+    closes = np.full(num_stops, np.nan)
+    if WINDOW_START_COLUMN in columns:
+        opens = clock_seconds(columns[WINDOW_START_COLUMN]) - day_start_seconds
+    if WINDOW_END_COLUMN in columns:
+        closes = clock_seconds(columns[WINDOW_END_COLUMN]) - day_start_seconds
+    if np.isnan(opens).all() and np.isnan(closes).all():
+        return None, None
+
+    windows = np.empty((num_stops + 1, 2))
+    windows[0] = 0, horizon
+    windows[1:, 0] = np.where(np.isnan(opens), 0, np.maximum(opens, 0))
+    windows[1:, 1] = np.where(np.isnan(closes), horizon, np.minimum(closes, horizon))
+
+    service = np.full(num_stops + 1, float(service_seconds))
+    service[0] = 0
+    if SERVICE_COLUMN in columns:
+        minutes = np.asarray(columns[SERVICE_COLUMN], dtype=float)
+        service[1:] = np.where(np.isnan(minutes), service_seconds, minutes * 60)
+    return windows, service
+
+
+def infeasible_stops(distance_matrix, windows, service_times, depot=0):
+    """
+    Flag the stops no route can deliver within their window, before any search.
+
+    A stop is infeasible when its window is empty, when even the direct trip
+    from the depot arrives after it closes, or when the earliest possible
+    delivery cannot make it back to the depot before the end of the day. These
+    are necessary conditions only: the solver can still fail on the others.
+
+    Returns a boolean mask over the stops (the depot is never flagged).
+
+    param distance_matrix: The travel-time matrix (s), `inf` when unreachable.
+    param windows: The [open, close] of every stop (s after the day start), see `manifest_time_windows`.
+    param service_times: The service time of every stop (s).
+    param depot: The index of the depot.
+    """
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    earliest_arrival = distance_matrix[depot]
+    earliest_start = np.maximum(earliest_arrival, windows[:, 0])
+    back_at_depot = earliest_start + service_times + distance_matrix[:, depot]
+
+    infeasible = (windows[:, 0] > windows[:, 1]) | (earliest_arrival > windows[:, 1]) | \
+        (back_at_depot > windows[depot, 1]) | ~np.isfinite(back_at_depot)
+    infeasible[depot] = False
+    return infeasible
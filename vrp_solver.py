@@ -0,0 +1,537 @@
+import json
+import time
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from tsp_solver.greedy import solve_tsp
+from clustering import balanced_clusters
+from parallel import shared, worker_pool
+
+# Every strategy takes the data model built by project.py (see `create_data_model`):
+#   distance_matrix     travel-time matrix between all stops (numpy array, depot included)
+#   num_vehicles        number of vehicles
+#   depot               index of the depot in the matrix
+#   demands             demand of each stop
+#   vehicle_capacities  capacity of each vehicle
+#   coords              (lat, long) of each stop, only used by the clustering strategy
+# and, for deliveries with time windows ('ortools' only):
+#   time_windows        [open, close] of each stop in seconds after the day start, depot included
+#   service_times       service seconds of each stop
+#   skipped             stops left out of the routes (e.g. rejected by `time_windows.infeasible_stops`)
+# and, for time-dependent travel times (see `solve_time_dependent`):
+#   bucket_matrices     one travel-time matrix per time bucket, shape (buckets, n, n)
+#   bucket_starts       start of every bucket in seconds after the day start
+# plus strategy-specific keyword options, and returns one route per vehicle: a list of stop
+# indices starting and ending at the depot.
+
+COST_SCALE = 100  # OR-Tools costs are integers: travel times are given in hundredths of a second
+UNREACHABLE_COST = 10**9  # Finite penalty for pairs with no path, large enough to never be chosen
+REPLAN_TIME_LIMIT = 0.2  # seconds, upper bound of a warm-started re-plan
+REPLAN_MIN_SHARED = 0.8  # Share of stops both plans must have in common for a warm start to pay off
+
+
+METAHEURISTICS = {
+    'automatic': routing_enums_pb2.LocalSearchMetaheuristic.AUTOMATIC,
+    'greedy_descent': routing_enums_pb2.LocalSearchMetaheuristic.GREEDY_DESCENT,
+    'guided_local_search': routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+    'simulated_annealing': routing_enums_pb2.LocalSearchMetaheuristic.SIMULATED_ANNEALING,
+    'tabu_search': routing_enums_pb2.LocalSearchMetaheuristic.TABU_SEARCH,
+}
+
+
+class SearchProgress:
+    """
+    Records the objective (in seconds of driving) each time the search finds a new solution.
+
+    Pass an instance as `progress` to `solve_ortools` and read `history` afterwards
+    to choose the time budget that meets the dispatch deadline.
+    """
+
+    def __init__(self, verbose=True):
+        """
+        param verbose: Print every new solution as it is found.
+        """
+        self.verbose = verbose
+        self.history = []  # (elapsed seconds, objective seconds)
+        self.start_time = None
+
+    def start(self):
+        self.history = []
+        self.start_time = time.perf_counter()
+
+    def record(self, objective):
+        elapsed = time.perf_counter() - self.start_time
+        self.history.append((elapsed, objective / COST_SCALE))
+        if self.verbose:
+            print(f"  {elapsed:7.2f} s  objective {objective / COST_SCALE / 60:.1f} min")
+
+
+def integer_matrix(distance_matrix, scale=COST_SCALE, unreachable=UNREACHABLE_COST):
+    """
+    Convert a float travel-time matrix (seconds, `inf` when unreachable) into scaled integer costs.
+
+    param distance_matrix: The travel-time matrix.
+    param scale: The number of cost units per second.
+    param unreachable: The cost given to unreachable pairs.
+    """
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    costs = np.rint(np.where(np.isfinite(distance_matrix), distance_matrix * scale, unreachable))
+    return np.minimum(costs, unreachable).astype(np.int64)
+
+
+def get_tsp_paths(data, manager, routing, solution):
+    tsp_paths = []
+    for vehicle_id in range(data['num_vehicles']):
+        index = routing.Start(vehicle_id)
+        route = []
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = solution.Value(routing.NextVar(index))
+        route.append(manager.IndexToNode(index))
+        tsp_paths.append(route)
+    return tsp_paths
+
+
+def search_parameters_for(time_limit=None, metaheuristic=None, solution_limit=None, lns_time_limit=None):
+    """
+    Build the OR-Tools search parameters.
+
+    Without a metaheuristic the search stops at the first local optimum. A metaheuristic keeps
+    improving until a limit is hit, so it needs a time limit or a solution limit.
+
+    param time_limit: Wall-clock budget for the whole search, in seconds.
+    param metaheuristic: One of METAHEURISTICS ('guided_local_search', 'simulated_annealing', 'tabu_search'...).
+    param solution_limit: Maximum number of solutions explored.
+    param lns_time_limit: Time limit of each large neighborhood search sub-solve, in seconds.
+    """
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
+
+    if metaheuristic is not None:
+        if metaheuristic not in METAHEURISTICS:
+            raise ValueError(f"Unknown metaheuristic {metaheuristic!r}, expected one of {list(METAHEURISTICS)}")
+        if time_limit is None and solution_limit is None:
+            raise ValueError("A metaheuristic search needs a time_limit or a solution_limit")
+        search_parameters.local_search_metaheuristic = METAHEURISTICS[metaheuristic]
+    if time_limit is not None:
+        search_parameters.time_limit.FromMilliseconds(int(time_limit * 1000))
+    if solution_limit is not None:
+        search_parameters.solution_limit = solution_limit
+    if lns_time_limit is not None:
+        search_parameters.lns_time_limit.FromMilliseconds(int(lns_time_limit * 1000))
+    return search_parameters
+
+
+def _add_time_dimension(data, manager, routing):
+    # Time along a route: travel plus the service at the stop left, waiting allowed before a window opens
+    windows = np.asarray(data['time_windows'], dtype=float)
+    horizon = int(windows[data['depot'], 1])
+    travel = np.where(np.isfinite(data['distance_matrix']), np.ceil(data['distance_matrix']), horizon + 1)
+    transit = np.minimum(travel + np.asarray(data['service_times'], dtype=float)[:, None], horizon + 1)
+    time_callback_index = routing.RegisterTransitMatrix(transit.astype(np.int64).tolist())
+    routing.AddDimension(
+        time_callback_index,
+        horizon,  # waiting time allowed at a stop
+        horizon,  # every vehicle back by the end of the day
+        True,  # all vehicles leave at the day start
+        'Time')
+    time_dimension = routing.GetDimensionOrDie('Time')
+
+    bounded = (windows[:, 0] > 0) | (windows[:, 1] < horizon)
+    bounded[[data['depot'], *data.get('skipped', [])]] = False
+    empty = np.flatnonzero(bounded & (np.ceil(windows[:, 0]) > windows[:, 1]))
+    if len(empty):
+        raise ValueError(f"Stops {empty.tolist()} have an empty time window, skip them (see `time_windows.infeasible_stops`)")
+    for stop in np.flatnonzero(bounded).tolist():
+        time_dimension.CumulVar(manager.NodeToIndex(stop)).SetRange(int(np.ceil(windows[stop, 0])),
+                                                                    int(windows[stop, 1]))
+    for vehicle_id in range(data['num_vehicles']):
+        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(vehicle_id)))
+
+    # Windows can make every first solution fail: stops may be dropped instead, at a penalty higher than
+    # any detour (a detour is shorter than the day), so the search drops as few stops as it can
+    penalty = COST_SCALE * horizon
+    skipped = set(data.get('skipped', []))
+    for stop in range(len(windows)):
+        if stop != data['depot'] and stop not in skipped:
+            routing.AddDisjunction([manager.NodeToIndex(stop)], penalty)
+
+
+def _build_routing_model(data):
+    # Index manager and routing model with arc costs, the capacity dimension and the optional time dimension
+    distance_matrix = integer_matrix(data['distance_matrix'])
+    manager = pywrapcp.RoutingIndexManager(len(distance_matrix), data['num_vehicles'], data['depot'])
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_callback_index = routing.RegisterTransitMatrix(distance_matrix.tolist())
+
+    # Define cost of each arc
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    # Add capacity constraint
+    demand_callback_index = routing.RegisterUnaryTransitVector([int(demand) for demand in data['demands']])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index,
+        0,  # null capacity slack
+        data['vehicle_capacities'],  # vehicle maximum capacities
+        True,  # start cumul to zero
+        'Capacity')
+
+    if data.get('time_windows') is not None:
+        _add_time_dimension(data, manager, routing)
+    # Skipped stops are optional and inactive: no vehicle visits them
+    for stop in data.get('skipped', []):
+        index = manager.NodeToIndex(int(stop))
+        routing.AddDisjunction([index], 0)
+        routing.ActiveVar(index).SetValue(0)
+    return manager, routing
+
+
+def solve_ortools(data, time_limit=None, metaheuristic=None, solution_limit=None, lns_time_limit=None,
+                  progress=None, **options):
+    """
+    Solve the capacitated VRP over the whole fleet with OR-Tools, with time windows when the data model has some.
+
+    With time windows, stops that cannot be fitted are left out of the
+    routes rather than failing the whole solve.
+
+    Arc costs and demands are handed to OR-Tools as an integer matrix and
+    vector, so the search evaluates them in C++ without calling back into Python.
+    With a `time_limit` the search is anytime: the best solution found within
+    the budget is returned.
+
+    param data: The data model.
+    param time_limit: Wall-clock budget in seconds.
+    param metaheuristic: Local search metaheuristic, see `search_parameters_for`.
+    param solution_limit: Maximum number of solutions explored.
+    param lns_time_limit: Time limit of each large neighborhood search sub-solve, in seconds.
+    param progress: Optional `SearchProgress` recording the objective over time.
+    """
+    manager, routing = _build_routing_model(data)
+    search_parameters = search_parameters_for(time_limit, metaheuristic, solution_limit, lns_time_limit)
+
+    if progress is not None:
+        progress.start()
+        routing.AddAtSolutionCallback(lambda: progress.record(routing.CostVar().Max()))
+
+    solution = routing.SolveWithParameters(search_parameters)
+    if not solution:
+        raise RuntimeError("OR-Tools did not find any solution")
+    return get_tsp_paths(data, manager, routing, solution)
+
+
+def save_plan(file_path, stop_ids, routes):
+    """
+    Save a plan so a later run can re-plan from it.
+
+    param file_path: The JSON file to write.
+    param stop_ids: The id of every stop, by index (depot included).
+    param routes: The routes, as returned by the solver.
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'stop_ids': list(stop_ids), 'routes': [[int(stop) for stop in route] for route in routes]}, f)
+
+
+def load_plan(file_path):
+    """
+    Load a plan saved by `save_plan`, returning (stop_ids, routes).
+
+    param file_path: The JSON file to read.
+    """
+    with open(file_path, encoding='utf-8') as f:
+        plan = json.load(f)
+    return plan['stop_ids'], plan['routes']
+
+
+def remap_routes(previous_routes, previous_ids, current_ids, depot=0):
+    """
+    Express the routes of a previous plan in the stop indices of the current one.
+
+    Stops are matched by id (e.g. package ID). Cancelled stops, absent from
+    `current_ids`, are dropped; new stops are not in any route yet.
+
+    param previous_routes: Routes of the previous plan, as returned by `get_tsp_paths`.
+    param previous_ids: The id of every stop of the previous plan, by index.
+    param current_ids: The id of every stop of the current plan, by index.
+    param depot: The index of the depot in both plans.
+    """
+    position = {stop_id: i for i, stop_id in enumerate(current_ids)}
+    routes = []
+    for route in previous_routes:
+        stops = [position[previous_ids[i]] for i in route if i != depot and previous_ids[i] in position]
+        routes.append([depot] + stops + [depot])
+    return routes
+
+
+def shared_stops(previous_ids, current_ids, depot=0):
+    """
+    Return the share of stops two plans have in common, relative to the larger plan.
+
+    A warm start only pays off when most stops are shared: from an unrelated
+    plan the search starts from a poor solution and ends worse than a cold solve.
+
+    param previous_ids: The id of every stop of the previous plan, by index.
+    param current_ids: The id of every stop of the current plan, by index.
+    param depot: The index of the depot in both plans.
+    """
+    previous = {stop_id for i, stop_id in enumerate(previous_ids) if i != depot}
+    current = {stop_id for i, stop_id in enumerate(current_ids) if i != depot}
+    if not previous or not current:
+        return 0.0
+    return len(previous & current) / max(len(previous), len(current))
+
+
+def insert_stops(data, routes):
+    """
+    Insert every stop missing from `routes` at its cheapest position, respecting vehicle capacities.
+
+    Skipped stops are removed from the routes instead. Time windows are not
+    checked here, the warm-started search enforces them.
+
+    param data: The data model of the current plan.
+    param routes: Routes in current stop indices, depot first and last.
+    """
+    depot = data['depot']
+    distance_matrix = integer_matrix(data['distance_matrix'])
+    demands = np.asarray(data['demands'])
+    skipped = set(data.get('skipped', []))
+    routes = [[stop for stop in route if stop not in skipped] for route in routes]
+    # Like the capacity dimension, count every node the vehicle leaves (start depot included)
+    loads = [int(demands[route[:-1]].sum()) for route in routes]
+
+    routed = np.zeros(len(distance_matrix), dtype=bool)
+    routed[depot] = True
+    routed[list(data.get('skipped', []))] = True
+    for route in routes:
+        routed[route] = True
+
+    for stop in np.flatnonzero(~routed).tolist():
+        best = None
+        for vehicle_id, route in enumerate(routes):
+            if loads[vehicle_id] + demands[stop] > data['vehicle_capacities'][vehicle_id]:
+                continue
+            before, after = np.array(route[:-1]), np.array(route[1:])
+            detours = distance_matrix[before, stop] + distance_matrix[stop, after] - distance_matrix[before, after]
+            position = int(np.argmin(detours))
+            if best is None or detours[position] < best[0]:
+                best = (detours[position], vehicle_id, position + 1)
+        if best is None:
+            raise ValueError(f"Stop {stop} does not fit in any vehicle")
+        _, vehicle_id, position = best
+        routes[vehicle_id].insert(position, stop)
+        loads[vehicle_id] += int(demands[stop])
+    return routes
+
+
+def replan_routes(data, previous_routes, time_limit=REPLAN_TIME_LIMIT, metaheuristic=None, solution_limit=None,
+                  lns_time_limit=None, progress=None):
+    """
+    Re-optimize a plan after stops were added or cancelled, warm-starting OR-Tools from the previous routes.
+
+    New stops are first inserted at their cheapest position, the resulting
+    routes are loaded as the initial assignment and the local search improves
+    them within `time_limit`, instead of a cold solve of the whole day.
+    Without a metaheuristic the search stops at the first local optimum or
+    at `time_limit`, whichever comes first: a few changes to a good plan call
+    for a quick descent, not a long search.
+
+    param data: The data model of the current plan.
+    param previous_routes: The previous routes in current stop indices (see `remap_routes`).
+    param time_limit: Wall-clock budget in seconds.
+    param metaheuristic: Local search metaheuristic, see `search_parameters_for`, None to stop at the first
+        local optimum.
+    param solution_limit: Maximum number of solutions explored.
+    param lns_time_limit: Time limit of each large neighborhood search sub-solve, in seconds.
+    param progress: Optional `SearchProgress` recording the objective over time.
+    """
+    routes = insert_stops(data, previous_routes)
+    manager, routing = _build_routing_model(data)
+    search_parameters = search_parameters_for(time_limit, metaheuristic, solution_limit, lns_time_limit)
+    routing.CloseModelWithParameters(search_parameters)
+
+    # OR-Tools expects the visited stops only, as variable indices
+    initial_routes = [[manager.NodeToIndex(stop) for stop in route[1:-1]] for route in routes]
+    initial_solution = routing.ReadAssignmentFromRoutes(initial_routes, True)
+    if initial_solution is None:
+        raise RuntimeError("The previous routes are not a valid starting point for the current plan")
+
+    if progress is not None:
+        progress.start()
+        routing.AddAtSolutionCallback(lambda: progress.record(routing.CostVar().Max()))
+
+    solution = routing.SolveFromAssignmentWithParameters(initial_solution, search_parameters)
+    if not solution:
+        return routes
+    return get_tsp_paths(data, manager, routing, solution)
+
+
+def time_dependent_matrix(data, routes):
+    """
+    Build the matrix whose row `i` is taken from the time bucket the vehicle leaves stop `i` in.
+
+    Departure times are those of `routes` (travel in the bucket each leg
+    starts in, plus service and waiting for windows); stops outside the
+    routes use the bucket of the day start.
+
+    param data: The data model, with `bucket_matrices` and `bucket_starts`.
+    param routes: The routes the departure times are read from.
+    """
+    from schedule import LegArrays, bucket_index, leg_times
+
+    matrices = np.asarray(data['bucket_matrices'])
+    num_stops = matrices.shape[1]
+    service = np.asarray(data.get('service_times', np.zeros(num_stops)), dtype=float)
+    windows = data.get('time_windows')
+    legs = [[{'from': i, 'to': j, 'duration': 0.0, 'length': 0.0, 'bucket_durations': matrices[:, i, j]}
+             for i, j in zip(route[:-1], route[1:]) if i != j] for route in routes]
+    arrays = LegArrays(legs, data['depot'])
+
+    buckets = np.full(num_stops, bucket_index(0.0, data['bucket_starts']))
+    if len(arrays):
+        opens = None if windows is None else np.asarray(windows)[:, 0]
+        departs, _ = leg_times(arrays, arrays.bucket_durations, service[arrays.stops], opens, data['bucket_starts'])
+        # The depot is left at the day start by every vehicle
+        leaving = arrays.origins != data['depot']
+        buckets[arrays.origins[leaving]] = bucket_index(departs[leaving], data['bucket_starts'])
+    return matrices[buckets, np.arange(num_stops)]
+
+
+def _route_costs(routes, matrix):
+    return sum(float(matrix[route[:-1], route[1:]].sum()) for route in map(np.asarray, routes))
+
+
+def solve_time_dependent(data, routes, passes=2, time_limit=1.0, metaheuristic='guided_local_search',
+                         progress=None):
+    """
+    Re-optimize routes so that every leg is costed in the time bucket it departs in.
+
+    OR-Tools only takes static costs, so each pass builds the matrix of the
+    current routes' departure times (see `time_dependent_matrix`) and
+    warm-starts a short search on it. A pass is kept when it lowers the
+    time-dependent driving time; the loop stops at the first pass that does not.
+
+    param data: The data model, with `bucket_matrices` and `bucket_starts`.
+    param routes: The routes solved on a single matrix.
+    param passes: The maximum number of passes.
+    param time_limit: The search budget of every pass, in seconds.
+    param metaheuristic: Local search metaheuristic, see `search_parameters_for`.
+    param progress: Optional `SearchProgress` recording the objective over time.
+    """
+    matrix = time_dependent_matrix(data, routes)
+    cost = _route_costs(routes, matrix)
+    for _ in range(passes):
+        try:
+            candidate = replan_routes(dict(data, distance_matrix=matrix), routes, time_limit=time_limit,
+                                      metaheuristic=metaheuristic, progress=progress)
+        except RuntimeError:
+            break
+        candidate_matrix = time_dependent_matrix(data, candidate)
+        candidate_cost = _route_costs(candidate, candidate_matrix)
+        if candidate_cost >= cost - 1e-6:
+            break
+        routes, matrix, cost = candidate, candidate_matrix, candidate_cost
+    return routes
+
+
+def _solve_cluster_tour(distance_matrix, stop_indices):
+    # The vehicle's matrix is a slice of the full one, depot first
+    tsp_path = solve_tsp(distance_matrix[np.ix_(stop_indices, stop_indices)])
+
+    # The solver returns an open path: close it so that the depot is the start and end point
+    start = tsp_path.index(0)
+    tsp_path = tsp_path[start:] + tsp_path[:start] + [0]
+
+    return [stop_indices[i] for i in tsp_path]
+
+
+def _solve_cluster_tour_worker(stop_indices):
+    # Runs in a worker process, the full matrix is shared by the pool instead of being sent with each task
+    return _solve_cluster_tour(shared('distance_matrix'), stop_indices)
+
+
+def solve_cluster_tsp(data, workers=1, **options):
+    """
+    Split the stops between vehicles with capacity-constrained clustering, then solve one TSP per cluster.
+
+    Clusters are balanced against the vehicle capacities using the travel
+    times between stops (depot excluded), and each cluster's matrix is a slice
+    of the shared matrix. With `workers` > 1 the per-vehicle TSPs are solved
+    in a process pool; routes are gathered in vehicle order.
+
+    param data: The data model.
+    param workers: The number of processes solving the per-vehicle TSPs.
+    """
+    depot = data['depot']
+    distance_matrix = np.asarray(data['distance_matrix'])
+    stops = np.delete(np.arange(len(distance_matrix)), depot)
+    labels = balanced_clusters(
+        np.asarray(data['coords'])[stops],
+        data['vehicle_capacities'],
+        np.asarray(data['demands'])[stops],
+        travel_times=distance_matrix[np.ix_(stops, stops)]
+    )
+
+    clusters = [[depot] + stops[labels == cluster_id].tolist() for cluster_id in range(data['num_vehicles'])]
+    tours = [cluster for cluster in clusters if len(cluster) > 1]
+
+    if workers > 1 and len(tours) > 1:
+        with worker_pool(min(workers, len(tours)), distance_matrix=distance_matrix) as pool:
+            solved = list(pool.map(_solve_cluster_tour_worker, tours))
+    else:
+        solved = [_solve_cluster_tour(distance_matrix, tour) for tour in tours]
+
+    # Vehicles without any stop keep an empty route
+    solved = iter(solved)
+    return [next(solved) if len(cluster) > 1 else [depot, depot] for cluster in clusters]
+
+
+def solve_greedy(data, **options):
+    """
+    Build routes one vehicle at a time, always driving to the nearest unvisited stop that still fits.
+
+    param data: The data model.
+    """
+    depot = data['depot']
+    distance_matrix = np.asarray(data['distance_matrix'], dtype=float)
+    demands = np.asarray(data['demands'])
+    unvisited = np.ones(len(distance_matrix), dtype=bool)
+    unvisited[depot] = False
+
+    tsp_paths = []
+    for capacity in data['vehicle_capacities']:
+        route, load, current = [depot], 0, depot
+        while True:
+            candidates = np.flatnonzero(unvisited & (load + demands <= capacity))
+            if not len(candidates):
+                break
+            current = int(candidates[np.argmin(distance_matrix[current, candidates])])
+            route.append(current)
+            load += demands[current]
+            unvisited[current] = False
+        route.append(depot)
+        tsp_paths.append(route)
+
+    if unvisited.any():
+        raise ValueError(f"{unvisited.sum()} stops do not fit in the vehicle capacities")
+    return tsp_paths
+
+
+SOLVER_STRATEGIES = {
+    'ortools': solve_ortools,
+    'cluster_tsp': solve_cluster_tsp,
+    'greedy': solve_greedy,
+}
+
+
+def solve_routes(data, strategy='ortools', **options):
+    """
+    Run exactly one routing strategy over the shared matrix.
+
+    param data: The data model.
+    param strategy: One of SOLVER_STRATEGIES ('ortools', 'cluster_tsp', 'greedy').
+    param options: Strategy-specific options (time_limit, metaheuristic... for 'ortools'), ignored by the others.
+    """
+    if strategy not in SOLVER_STRATEGIES:
+        raise ValueError(f"Unknown solver strategy {strategy!r}, expected one of {list(SOLVER_STRATEGIES)}")
+    if strategy != 'ortools' and data.get('time_windows') is not None:
+        raise ValueError(f"Time windows are only supported by the 'ortools' strategy, not {strategy!r}")
+    return SOLVER_STRATEGIES[strategy](data, **options)